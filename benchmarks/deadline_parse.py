@@ -0,0 +1,167 @@
+"""Micro-benchmark for ``parse_deadline`` (fast path + memo) vs plain ``dateparser``.
+
+Runs a corpus of Russian deadline phrases of the kind the digest LLM emits
+(``deadline_raw`` / ``when_raw``) against a spread of reference times and
+reports, as JSON:
+
+- the one-off cost of ``import dateparser`` (paid by the first deadline of
+  a process when the fast path misses);
+- per-call latency of the dateparser-only resolution (the old behaviour);
+- per-call latency of ``parse_deadline`` (memo, fast path, dateparser fallback);
+- the fast-path hit rate, the memo counters of ``parse_deadline`` (each
+  case is timed ``--repeat`` times, so repeats are memo hits) and the
+  number of results that differ (must be 0)::
+
+    python -m benchmarks.deadline_parse --rounds 20 --output deadline.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Importing ``src.*`` builds the OpenAI client and settings eagerly; the
+# benchmark never talks to either, so placeholders are enough.
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+os.environ.setdefault("BOT_TOKEN", "0:bench")
+
+from src.services.digest_service import (
+    OWNER_TZ,
+    _dateparser_deadline,
+    _fast_parse_deadline,
+    _normalize_deadline_phrase,
+    clear_deadline_memo,
+    deadline_memo_stats,
+    parse_deadline,
+)
+
+CORPUS = (
+    "до пятницы",
+    "к понедельнику",
+    "в следующую среду",
+    "пт 15:00",
+    "в четверг 12:30",
+    "в пн утром",
+    "в среду вечером",
+    "сегодня",
+    "завтра",
+    "до завтра",
+    "послезавтра",
+    "завтра 10:00",
+    "до конца дня",
+    "к концу дня",
+    "до конца недели",
+    "к выходным",
+    "до выходных",
+    "eod",
+    "18:00",
+    "в 9:30",
+    "вечером",
+    "до 12.05",
+    "12.05.2026",
+    "2026-05-20 11:30",
+    # Shapes the fast path leaves to dateparser.
+    "до 12 мая",
+    "через неделю",
+    "до конца месяца",
+    "в понедельник в 10:00",
+)
+
+
+def _reference_times(count: int, seed: int) -> List[datetime]:
+    rnd = random.Random(seed)
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    return [start + timedelta(seconds=rnd.randrange(0, 365 * 86400)) for _ in range(count)]
+
+
+def _time_calls(fn, cases) -> float:
+    started = time.perf_counter()
+    for raw, now in cases:
+        fn(raw, now)
+    return time.perf_counter() - started
+
+
+def _dateparser_only(raw: str, now_utc: datetime) -> Optional[datetime]:
+    """Pre-fast-path ``parse_deadline``: normalise, then always dateparser."""
+    normalised = _normalize_deadline_phrase(raw)
+    if normalised is None:
+        return None
+    base = now_utc.astimezone(OWNER_TZ).replace(tzinfo=None)
+    parsed = _dateparser_deadline(normalised, base)
+    return parsed.astimezone(timezone.utc) if parsed is not None else None
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    import_started = time.perf_counter()
+    import dateparser  # noqa: F401 — measured on purpose
+
+    import_seconds = time.perf_counter() - import_started
+    # First real parse also builds dateparser's language caches.
+    _dateparser_only("до пятницы", datetime.now(timezone.utc))
+
+    cases = [
+        (raw, now)
+        for now in _reference_times(args.rounds, args.seed)
+        for raw in CORPUS
+        for _ in range(args.repeat)
+    ]
+
+    fast_hits = 0
+    mismatches: List[Dict[str, str]] = []
+    for raw, now in cases[:: args.repeat]:
+        normalised = _normalize_deadline_phrase(raw)
+        base = now.astimezone(OWNER_TZ).replace(tzinfo=None)
+        if normalised is not None and _fast_parse_deadline(normalised, base) is not None:
+            fast_hits += 1
+        old, new = _dateparser_only(raw, now), parse_deadline(raw, now_utc=now)
+        if old != new:
+            mismatches.append(
+                {"raw": raw, "now": now.isoformat(), "old": str(old), "new": str(new)}
+            )
+
+    old_seconds = _time_calls(_dateparser_only, cases)
+    clear_deadline_memo()
+    new_seconds = _time_calls(lambda raw, now: parse_deadline(raw, now_utc=now), cases)
+    calls = len(cases)
+    return {
+        "calls": calls,
+        "dateparser_import_seconds": round(import_seconds, 4),
+        "dateparser_only_us_per_call": round(old_seconds / calls * 1e6, 1),
+        "parse_deadline_us_per_call": round(new_seconds / calls * 1e6, 1),
+        "speedup": round(old_seconds / new_seconds, 2) if new_seconds else None,
+        "fast_path_hit_rate": round(fast_hits / (calls // args.repeat), 3),
+        "deadline_memo": deadline_memo_stats.snapshot(),
+        "mismatches": len(mismatches),
+        "mismatch_samples": mismatches[:10],
+        "python": sys.version.split()[0],
+    }
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rounds", type=int, default=20, help="reference times to sample")
+    parser.add_argument("--repeat", type=int, default=5, help="timed repetitions per case")
+    parser.add_argument("--seed", type=int, default=42, help="RNG seed for reference times")
+    parser.add_argument("--output", type=Path, help="write JSON here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = _parse_args(argv)
+    report = run(args)
+    payload = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        args.output.write_text(payload + "\n", encoding="utf-8")
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
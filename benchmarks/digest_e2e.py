@@ -0,0 +1,430 @@
+"""End-to-end benchmark for ``DigestService.send_for_day`` on a synthetic day.
+
+Seeds a **throwaway** Postgres database with ``--chats`` chats ×
+``--messages`` messages for one Moscow day (a mix of groups, supergroups,
+Business private chats and plain private chats that the digest must skip),
+then runs the real digest pipeline against:
+
+- a fake ``Bot`` that records every ``send_message`` call;
+- a fake LLM backend (``OpenAIService.complete_json`` is swapped out) with
+  a configurable per-call latency and canned JSON answers.
+
+Reports wall time, per-stage time, SQL statement count, LLM call count and
+peak RSS as JSON, so runs can be diffed between versions::
+
+    python -m benchmarks.digest_e2e \\
+        --database-url postgresql+asyncpg://localhost/superbot_bench \\
+        --chats 50 --messages 200 --llm-latency 0.8 --output bench.json
+
+The target database is DROPPED and recreated — never point it at prod.
+Telegram rate limits of the outbox are disabled unless
+``--telegram-limits`` is passed (they would otherwise dominate wall time).
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import resource
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from itertools import count
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+
+# Importing ``src.*`` builds the OpenAI client and settings eagerly; the
+# benchmark never talks to either, so placeholders are enough.
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+os.environ.setdefault("BOT_TOKEN", "0:bench")
+
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from src.config import settings
+from src.database.base import Base
+from src.database.models import (
+    BusinessConnection,
+    Chat,
+    ChatType,
+    Commitment,
+    DailyDigest,
+    DBMessage,
+    Event,
+    MessageThread,
+)
+from src.services.digest_service import (
+    DigestService,
+    clear_deadline_memo,
+    deadline_memo_stats,
+    period_for_day,
+)
+from src.services.openai_service import OpenAIService
+from src.services.outbox_service import outbox_for
+from src.services.prompts import PromptSpec
+
+OWNER_ID = 1_000_001
+SEED_BATCH = 1000
+# Share of each chat kind in the synthetic population. Plain private chats
+# (owner ↔ bot DM style, no business connection) must be skipped by
+# ``DigestService.collect`` — they measure the filter, not the LLM path.
+CHAT_MIX = (
+    ("group", 0.3),
+    ("supergroup", 0.2),
+    ("business", 0.4),
+    ("private", 0.1),
+)
+CLASSIFICATIONS = ("business", "private", "mixed", None)
+# Only the tables the digest touches — enough to run the pipeline without
+# dragging in the rest of the schema.
+DIGEST_TABLES = [
+    model.__table__
+    for model in (
+        BusinessConnection,
+        Chat,
+        MessageThread,
+        DBMessage,
+        Commitment,
+        Event,
+        DailyDigest,
+    )
+]
+
+_PHRASES = (
+    "Привет, как дела по проекту?",
+    "Пришлю отчёт до пятницы, без вопросов",
+    "Созвон завтра в 18:00 подтверждаю 👍",
+    "Срочно нужен ответ по договору!",
+    "Давай в среду вечером обсудим бюджет",
+    "Я попрошу команду сделать ревью к концу дня",
+    "Встреча с инвесторами 12 мая в 11:30",
+    "ок, понял 🙂",
+    "Можешь скинуть презентацию?",
+    "Кстати, отпуск на выходных — буду без связи 🌴",
+)
+_UUID_RE = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+# Per-chat header of ``FEATURE-010_classify_batch`` (see ``_classification_sample``).
+_BATCH_KEY_RE = re.compile(r"^=== \[([^\]]+)\]", re.MULTILINE)
+
+
+# --------------------------------------------------------------------------- #
+# Fakes                                                                        #
+# --------------------------------------------------------------------------- #
+
+
+@dataclass
+class FakeSentMessage:
+    chat_id: int
+    text: str
+    message_id: int
+
+
+@dataclass(eq=False)  # identity hash: used as a WeakKeyDictionary key by ``outbox_for``
+class FakeBot:
+    """Records sends instead of talking to Telegram."""
+
+    latency: float = 0.0
+    sent: List[FakeSentMessage] = field(default_factory=list)
+    _ids: Any = field(default_factory=lambda: count(1))
+
+    async def send_message(self, chat_id: int, text: str, **_: Any) -> FakeSentMessage:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        msg = FakeSentMessage(chat_id=chat_id, text=text, message_id=next(self._ids))
+        self.sent.append(msg)
+        return msg
+
+
+class FakeLLM:
+    """Stand-in for ``OpenAIService.complete_json`` with fixed latency."""
+
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.calls: Counter[str] = Counter()
+        self.seconds = 0.0
+
+    async def complete_json(self, prompt: PromptSpec, rendered: str, *, system: str = "") -> dict:
+        started = time.perf_counter()
+        self.calls[prompt.name] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        try:
+            if prompt.name == "FEATURE-010_classify":
+                return {"classification": "business", "confidence": 0.8, "reason": "бенчмарк"}
+            if prompt.name == "FEATURE-010_classify_batch":
+                return {
+                    "results": [
+                        {"key": key, "classification": "business", "confidence": 0.8}
+                        | {"reason": "бенчмарк"}
+                        for key in _BATCH_KEY_RE.findall(rendered)
+                    ]
+                }
+            # Close the first open commitment we were shown, so the closure
+            # UPDATE path is exercised too.
+            open_ids = _UUID_RE.findall(rendered)[:1]
+            return {
+                "summary_md": "Обсудили проект, договорились о созвоне.",
+                "commitments": [
+                    {
+                        "direction": "from_me",
+                        "text": "Пришлю отчёт по проекту",
+                        "deadline_raw": "до пятницы",
+                        "is_urgent": False,
+                    },
+                    {
+                        "direction": "to_me",
+                        "text": "Команда сделает ревью кода",
+                        "deadline_raw": "к концу дня",
+                        "is_urgent": False,
+                    },
+                ],
+                "events": [
+                    {"description": "Созвон по проекту", "when_raw": "завтра в 18:00"},
+                    {"description": "Встреча с инвесторами", "when_raw": "12 мая в 11:30"},
+                ],
+                "open_questions": [{"direction": "to_me", "text": "Можешь скинуть презентацию?"}],
+                "closed_commitments": [{"id": cid, "reason": "completed"} for cid in open_ids],
+            }
+        finally:
+            self.seconds += time.perf_counter() - started
+
+
+class StageTimer:
+    """Accumulates wall time of wrapped coroutine methods by stage name."""
+
+    def __init__(self) -> None:
+        self.seconds: Dict[str, float] = defaultdict(float)
+        self.calls: Counter[str] = Counter()
+
+    def wrap(self, obj: Any, attr: str, stage: str) -> None:
+        original = getattr(obj, attr)
+
+        async def timed(*args: Any, **kwargs: Any) -> Any:
+            started = time.perf_counter()
+            try:
+                return await original(*args, **kwargs)
+            finally:
+                self.seconds[stage] += time.perf_counter() - started
+                self.calls[stage] += 1
+
+        setattr(obj, attr, timed)
+
+
+# --------------------------------------------------------------------------- #
+# Seeding                                                                      #
+# --------------------------------------------------------------------------- #
+
+
+def _pick_kind(rng: random.Random) -> str:
+    roll = rng.random()
+    acc = 0.0
+    for kind, share in CHAT_MIX:
+        acc += share
+        if roll < acc:
+            return kind
+    return CHAT_MIX[-1][0]
+
+
+async def seed(
+    session: AsyncSession, *, day: date, chats: int, messages: int, rng: random.Random
+) -> Dict[str, int]:
+    """Insert ``chats`` chats with ``messages`` messages each on ``day``."""
+    connection_id = "bench-conn"
+    await session.execute(
+        insert(BusinessConnection).values(
+            id=connection_id, user_id=OWNER_ID, user_chat_id=OWNER_ID, is_enabled=True
+        )
+    )
+
+    start_utc, _ = period_for_day(day)
+    kinds: Counter[str] = Counter()
+    message_rows: List[Dict[str, Any]] = []
+    for idx in range(chats):
+        kind = _pick_kind(rng)
+        kinds[kind] += 1
+        chat_id = uuid4()
+        is_group = kind in ("group", "supergroup")
+        await session.execute(
+            insert(Chat).values(
+                id=chat_id,
+                telegram_id=(-1_000_000_000 - idx) if is_group else (10_000_000 + idx),
+                name=f"Bench {kind} {idx}",
+                type=ChatType.MIXED.value.upper(),
+                tg_type="private" if kind in ("business", "private") else kind,
+                business_connection_id=connection_id if kind == "business" else None,
+                classification=rng.choice(CLASSIFICATIONS),
+                is_silent=True,
+            )
+        )
+        participants = [OWNER_ID] + [
+            2_000_000 + rng.randrange(50) for _ in range(4 if is_group else 1)
+        ]
+        for n in range(messages):
+            created = start_utc + timedelta(seconds=rng.randrange(24 * 3600))
+            message_rows.append(
+                {
+                    "id": uuid4(),
+                    "message_id": n + 1,
+                    "chat_id": chat_id,
+                    "user_id": rng.choice(participants),
+                    "text": rng.choice(_PHRASES),
+                    "created_at": created,
+                    "updated_at": created,
+                    "was_responded": False,
+                }
+            )
+            if len(message_rows) >= SEED_BATCH:
+                await session.execute(insert(DBMessage).values(message_rows))
+                message_rows = []
+    if message_rows:
+        await session.execute(insert(DBMessage).values(message_rows))
+    await session.commit()
+    return dict(kinds)
+
+
+# --------------------------------------------------------------------------- #
+# Runner                                                                       #
+# --------------------------------------------------------------------------- #
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).resolve().parents[1],
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(peak / divisor, 1)
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    day = date.fromisoformat(args.day)
+    engine = create_async_engine(args.database_url, echo=False)
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all, tables=DIGEST_TABLES)
+        await conn.run_sync(Base.metadata.create_all, tables=DIGEST_TABLES)
+
+    async with sessions() as session:
+        seed_started = time.perf_counter()
+        kinds = await seed(session, day=day, chats=args.chats, messages=args.messages, rng=rng)
+        seed_seconds = time.perf_counter() - seed_started
+
+    statements = Counter()
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _count_sql(conn, cursor, statement, parameters, context, executemany):  # noqa: ANN001
+        statements[statement.split(None, 1)[0].upper()] += 1
+
+    bot = FakeBot(latency=args.send_latency)
+    outbox_for(bot, throttle=args.telegram_limits)  # type: ignore[arg-type]
+    llm = FakeLLM(args.llm_latency)
+    original_complete_json = OpenAIService.complete_json
+    original_owner = settings.OWNER_ID
+    OpenAIService.complete_json = staticmethod(llm.complete_json)  # type: ignore[method-assign]
+    settings.OWNER_ID = OWNER_ID
+    timer = StageTimer()
+    clear_deadline_memo()
+    try:
+        async with sessions() as session:
+            service = DigestService(session, bot)  # type: ignore[arg-type]
+            timer.wrap(service, "collect", "collect")
+            timer.wrap(service, "_extract", "extract")
+            timer.wrap(service, "_persist", "persist")
+            timer.wrap(service, "_send_md", "send")
+            timer.wrap(service, "_suggest_classifications", "classify")
+            started = time.perf_counter()
+            summarised = await service.send_for_day(day, record=True)
+            total_seconds = time.perf_counter() - started
+    finally:
+        OpenAIService.complete_json = original_complete_json  # type: ignore[method-assign]
+        settings.OWNER_ID = original_owner
+        await engine.dispose()
+
+    stages = {name: round(secs, 4) for name, secs in sorted(timer.seconds.items())}
+    stages["llm"] = round(llm.seconds, 4)
+    return {
+        "benchmark": "digest_e2e",
+        "revision": _git_revision(),
+        "run_at": datetime.now().isoformat(timespec="seconds"),
+        "params": {
+            "chats": args.chats,
+            "messages_per_chat": args.messages,
+            "day": args.day,
+            "llm_latency": args.llm_latency,
+            "send_latency": args.send_latency,
+            "telegram_limits": args.telegram_limits,
+            "seed": args.seed,
+        },
+        "seeded": {"chat_kinds": kinds, "seconds": round(seed_seconds, 3)},
+        "result": {
+            "chats_summarised": summarised,
+            "total_seconds": round(total_seconds, 4),
+            "stages": stages,
+            "stage_calls": dict(timer.calls),
+            "sql_statements": sum(statements.values()),
+            "sql_by_verb": dict(statements),
+            "llm_calls": sum(llm.calls.values()),
+            "llm_calls_by_prompt": dict(llm.calls),
+            "deadline_memo": deadline_memo_stats.snapshot(),
+            "telegram_sends": len(bot.sent),
+            "peak_rss_mb": _peak_rss_mb(),
+        },
+    }
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--database-url",
+        required=True,
+        help="async SQLAlchemy URL of a THROWAWAY database (it is dropped and recreated)",
+    )
+    parser.add_argument("--chats", type=int, default=20, help="number of chats to seed")
+    parser.add_argument("--messages", type=int, default=100, help="messages per chat per day")
+    parser.add_argument("--day", default="2026-05-08", help="Moscow calendar day (ISO)")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds per LLM call")
+    parser.add_argument("--send-latency", type=float, default=0.0, help="seconds per TG send")
+    parser.add_argument(
+        "--telegram-limits",
+        action="store_true",
+        help="keep the outbox's Telegram rate limits (off by default)",
+    )
+    parser.add_argument("--seed", type=int, default=42, help="RNG seed for synthetic data")
+    parser.add_argument("--output", type=Path, help="write JSON here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = _parse_args(argv)
+    report = asyncio.run(run(args))
+    payload = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        args.output.write_text(payload + "\n", encoding="utf-8")
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Micro-benchmark for the stats tokenizer kernel vs the previous multi-pass code.
+
+Generates ``--messages`` synthetic Russian chat messages (words, stop words,
+emoji, mixed case, punctuation) spread over a week and times the hourly
+emoji/word counters (``_hourly_text_counters``) against the per-character
+``emoji.is_emoji`` scan + ``re.findall`` loop it replaced. Outputs are
+compared (must be identical) and reported as JSON::
+
+    python -m benchmarks.stats_kernel --messages 100000 --output stats.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# Importing ``src.*`` builds the OpenAI client, settings and the DB engine
+# eagerly; the benchmark never talks to any of them, so placeholders are
+# enough (the engine does not connect until first use).
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+os.environ.setdefault("BOT_TOKEN", "0:bench")
+os.environ.setdefault("DATABASE_URL", "postgresql+asyncpg://localhost/bench")
+
+import emoji
+
+from src.services.stats_service import (
+    RUSSIAN_STOP_WORDS,
+    _hourly_text_counters,
+)
+
+WORDS = (
+    "привет проект задача дедлайн созвон релиз отчёт клиент договор бюджет "
+    "встреча завтра сегодня неделя ревью баг фича тест деплой сервер база "
+    "данные письмо презентация макет дизайн код ветка мердж спасибо отлично "
+    "Москва Питер офис удалёнка кофе обед вечер утро понедельник пятница"
+).split()
+STOP = sorted(RUSSIAN_STOP_WORDS)
+EMOJI = ["🙂", "😂", "👍", "🔥", "🙏", "❤", "🎉", "🤔", "✅", "ℹ", "🐱"]
+PUNCT = ["", "", ",", ".", "!", "?", "...", ":)"]
+
+
+def synthetic_rows(count: int, seed: int, now: datetime) -> List[Tuple[datetime, str]]:
+    """``(created_at, text)`` rows over the week before ``now``."""
+    rnd = random.Random(seed)
+    rows = []
+    for _ in range(count):
+        parts = []
+        for _ in range(rnd.randint(1, 18)):
+            roll = rnd.random()
+            if roll < 0.3:
+                parts.append(rnd.choice(STOP))
+            elif roll < 0.9:
+                word = rnd.choice(WORDS)
+                parts.append(word.upper() if rnd.random() < 0.05 else word)
+            else:
+                parts.append(rnd.choice(EMOJI) * rnd.randint(1, 3))
+            parts[-1] += rnd.choice(PUNCT)
+        created_at = now - timedelta(seconds=rnd.randrange(0, 7 * 86400))
+        rows.append((created_at, " ".join(parts)))
+    return rows
+
+
+def _reference_text_counters(texts) -> Tuple[int, Counter, Counter]:
+    emoji_counter: Counter = Counter()
+    emoji_total = 0
+    for text in texts:
+        chars = [c for c in text if emoji.is_emoji(c)]
+        emoji_total += len(chars)
+        emoji_counter.update(chars)
+    word_counter: Counter = Counter()
+    for text in texts:
+        words = [
+            w.lower()
+            for w in re.findall(r"\b\w+\b", text)
+            if w.lower() not in RUSSIAN_STOP_WORDS and len(w) > 1
+        ]
+        word_counter.update(words)
+    return emoji_total, emoji_counter, word_counter
+
+
+def reference_hourly_text_counters(rows) -> Dict[datetime, Tuple[int, Dict, Dict]]:
+    by_hour: Dict[datetime, List[str]] = defaultdict(list)
+    for created_at, text in rows:
+        hour = created_at.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        by_hour[hour].append(text)
+    out = {}
+    for hour_start, texts in by_hour.items():
+        emoji_total, emojis, words = _reference_text_counters(texts)
+        out[hour_start] = (emoji_total, dict(emojis), dict(words))
+    return out
+
+
+def _timed(fn, *args) -> Tuple[float, Any]:
+    started = time.perf_counter()
+    out = fn(*args)
+    return time.perf_counter() - started, out
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    now = datetime(2026, 5, 10, 12, 30, tzinfo=timezone.utc)
+    rows = synthetic_rows(args.messages, args.seed, now)
+
+    old_tok_s, old_counters = _timed(reference_hourly_text_counters, rows)
+    new_tok_s, new_counters = _timed(_hourly_text_counters, rows)
+
+    return {
+        "messages": len(rows),
+        "hours": len(new_counters),
+        "chars": sum(len(text) for _, text in rows),
+        "tokenize_reference_seconds": round(old_tok_s, 4),
+        "tokenize_kernel_seconds": round(new_tok_s, 4),
+        "tokenize_speedup": round(old_tok_s / new_tok_s, 2) if new_tok_s else None,
+        "counters_identical": old_counters == new_counters,
+        "python": sys.version.split()[0],
+    }
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--messages", type=int, default=100_000, help="synthetic messages")
+    parser.add_argument("--seed", type=int, default=42, help="RNG seed for the corpus")
+    parser.add_argument("--output", type=Path, help="write JSON here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = _parse_args(argv)
+    report = run(args)
+    payload = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        args.output.write_text(payload + "\n", encoding="utf-8")
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
@@ -39,6 +39,12 @@ class Settings(BaseSettings):
     # purged daily by `CleanupService`. 30 days = balance between digest
     # usefulness and personal-data retention.
     MESSAGE_TTL_DAYS: int = int(os.getenv("MESSAGE_TTL_DAYS", "30"))
+    # Optional cold archive: expiring messages are written here (gzip JSONL
+    # per day) before the purge. Empty = no archive.
+    MESSAGE_ARCHIVE_DIR: str = os.getenv("MESSAGE_ARCHIVE_DIR", "")
+    # Retention of the daily stats snapshots (`message_stats_daily`);
+    # 0 turns the history off.
+    STATS_HISTORY_DAYS: int = int(os.getenv("STATS_HISTORY_DAYS", "90"))
 
     # Global state
     is_shutdown: bool = False
@@ -0,0 +1,55 @@
+"""chat_hourly_stats — почасовые роллапы для недельной статистики
+
+Revision ID: 20260510_0900_f1a3c5e7b9d1
+Revises: 20260509_0420_e7f9a1c3b5d7
+Create Date: 2026-05-10 09:00:00.000000
+
+StatsService каждые 5 минут перечитывал все сообщения чата за неделю, чтобы
+пересчитать MessageStats с нуля. Теперь он поддерживает инкрементальные
+роллапы: одна строка на (chat_id, hour_start) с числом сообщений, суммарной
+длиной, точным множеством авторов, счётчиками эмодзи и слов. Недельная
+картина собирается из ~168 строк.
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+
+revision: str = "20260510_0900_f1a3c5e7b9d1"
+down_revision: Union[str, None] = "20260509_0420_e7f9a1c3b5d7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "chat_hourly_stats",
+        sa.Column(
+            "chat_id",
+            UUID(as_uuid=True),
+            sa.ForeignKey("chats.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("hour_start", sa.DateTime(timezone=True), primary_key=True),
+        sa.Column("message_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("total_length", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("user_ids", JSONB(), nullable=False, server_default=sa.text("'[]'::jsonb")),
+        sa.Column("emoji_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("emojis", JSONB(), nullable=False, server_default=sa.text("'{}'::jsonb")),
+        sa.Column("words", JSONB(), nullable=False, server_default=sa.text("'{}'::jsonb")),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.text("CURRENT_TIMESTAMP"),
+        ),
+    )
+    # Retention sweep (CleanupService) filters on hour_start alone.
+    op.create_index("ix_chat_hourly_stats_hour_start", "chat_hourly_stats", ["hour_start"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_chat_hourly_stats_hour_start", table_name="chat_hourly_stats")
+    op.drop_table("chat_hourly_stats")
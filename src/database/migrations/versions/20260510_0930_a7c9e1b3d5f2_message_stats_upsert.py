@@ -0,0 +1,90 @@
+"""message_stats — одна строка на (chat_id, period) + дневная история
+
+Revision ID: 20260510_0930_a7c9e1b3d5f2
+Revises: 20260510_0900_f1a3c5e7b9d1
+Create Date: 2026-05-10 09:30:00.000000
+
+StatsService добавлял новую строку message_stats на каждый проход (~288 в
+сутки на чат), и таблица росла без ограничений. Теперь строка одна на
+(chat_id, period) и обновляется upsert'ом, а компактный дневной снимок
+пишется в message_stats_daily (хранится STATS_HISTORY_DAYS дней).
+
+Перед созданием уникального ограничения последний снимок каждого дня
+переносится в историю, а дубликаты удаляются — остаётся самая свежая строка.
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+
+revision: str = "20260510_0930_a7c9e1b3d5f2"
+down_revision: Union[str, None] = "20260510_0900_f1a3c5e7b9d1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "message_stats_daily",
+        sa.Column(
+            "chat_id",
+            UUID(as_uuid=True),
+            sa.ForeignKey("chats.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("day", sa.Date(), primary_key=True),
+        sa.Column("message_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("user_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("avg_length", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("emoji_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("top_topics", JSONB(), nullable=False, server_default=sa.text("'[]'::jsonb")),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.text("CURRENT_TIMESTAMP"),
+        ),
+    )
+    # Retention sweep (CleanupService) filters on day alone.
+    op.create_index("ix_message_stats_daily_day", "message_stats_daily", ["day"])
+
+    op.execute("""
+        INSERT INTO message_stats_daily
+            (chat_id, day, message_count, user_count, avg_length, emoji_count, top_topics)
+        SELECT DISTINCT ON (s.chat_id, s.timestamp::date)
+            s.chat_id,
+            s.timestamp::date,
+            COALESCE(s.message_count, 0),
+            COALESCE(s.user_count, 0),
+            COALESCE(s.avg_length, 0),
+            COALESCE(s.emoji_count, 0),
+            COALESCE(s.top_topics::jsonb, '[]'::jsonb)
+        FROM message_stats s
+        JOIN chats c ON c.id = s.chat_id
+        WHERE s.period = 'week'
+          AND s.timestamp >= CURRENT_DATE - INTERVAL '90 days'
+        ORDER BY s.chat_id, s.timestamp::date, s.timestamp DESC, s.id DESC
+        """)
+    op.execute("""
+        DELETE FROM message_stats
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY chat_id, period ORDER BY timestamp DESC, id DESC
+                ) AS rn
+                FROM message_stats
+            ) ranked
+            WHERE ranked.rn > 1
+        )
+        """)
+    op.create_unique_constraint(
+        "uq_message_stats_chat_period", "message_stats", ["chat_id", "period"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint("uq_message_stats_chat_period", "message_stats", type_="unique")
+    op.drop_index("ix_message_stats_daily_day", table_name="message_stats_daily")
+    op.drop_table("message_stats_daily")
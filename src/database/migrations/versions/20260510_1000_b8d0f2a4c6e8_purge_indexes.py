@@ -0,0 +1,31 @@
+"""индексы для пакетной TTL-чистки messages
+
+Revision ID: 20260510_1000_b8d0f2a4c6e8
+Revises: 20260510_0930_a7c9e1b3d5f2
+Create Date: 2026-05-10 10:00:00.000000
+
+CleanupService удаляет старые сообщения пачками: выбирает N id по
+created_at, затем чистит зависимые message_tags / message_contexts и сами
+messages. Без индексов каждая пачка — полный проход по таблицам.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "20260510_1000_b8d0f2a4c6e8"
+down_revision: Union[str, None] = "20260510_0930_a7c9e1b3d5f2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_messages_created_at", "messages", ["created_at"])
+    op.create_index("ix_message_tags_message_id", "message_tags", ["message_id"])
+    op.create_index("ix_message_contexts_message_id", "message_contexts", ["message_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_message_contexts_message_id", table_name="message_contexts")
+    op.drop_index("ix_message_tags_message_id", table_name="message_tags")
+    op.drop_index("ix_messages_created_at", table_name="messages")
@@ -0,0 +1,122 @@
+"""messages — секционирование по дням (RANGE по created_at)
+
+Revision ID: 20260510_1100_c9e1a3b5d7f0
+Revises: 20260510_1000_b8d0f2a4c6e8
+Create Date: 2026-05-10 11:00:00.000000
+
+TTL сообщений жёсткий (MESSAGE_TTL_DAYS), поэтому вместо DELETE по строкам
+CleanupService теперь отцепляет и удаляет целые дневные секции, а будущие
+секции создаёт заранее. Границы секций — полночь по Москве, как и сутки
+дайджеста, так что дневные запросы дайджеста читают одну секцию.
+
+Что меняется:
+- messages пересоздаётся как секционированная таблица (данные копируются);
+  первичный ключ становится (id, created_at) — ключ секционирования обязан
+  в него входить;
+- внешние ключи message_tags / message_contexts → messages снимаются:
+  на секционированную таблицу нельзя сослаться по одному id. Зависимые
+  строки чистит CleanupService перед удалением секции;
+- секции messages_pYYYYMMDD создаются от самого старого сообщения до
+  сегодня + 7 дней, плюс messages_default для всего, что не попало в них.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "20260510_1100_c9e1a3b5d7f0"
+down_revision: Union[str, None] = "20260510_1000_b8d0f2a4c6e8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PARTITION_AHEAD_DAYS = 7
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE message_tags DROP CONSTRAINT IF EXISTS message_tags_message_id_fkey")
+    op.execute(
+        "ALTER TABLE message_contexts DROP CONSTRAINT IF EXISTS message_contexts_message_id_fkey"
+    )
+
+    op.execute("ALTER TABLE messages RENAME TO messages_legacy")
+    op.execute(
+        "ALTER TABLE messages_legacy RENAME CONSTRAINT messages_pkey TO messages_legacy_pkey"
+    )
+    op.execute("ALTER INDEX ix_messages_created_at RENAME TO ix_messages_legacy_created_at")
+
+    op.execute(
+        "CREATE TABLE messages (LIKE messages_legacy INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        "PARTITION BY RANGE (created_at)"
+    )
+    op.execute("ALTER TABLE messages ADD CONSTRAINT messages_pkey PRIMARY KEY (id, created_at)")
+    op.create_foreign_key("messages_chat_id_fkey", "messages", "chats", ["chat_id"], ["id"])
+    op.create_foreign_key(
+        "messages_thread_id_fkey", "messages", "message_threads", ["thread_id"], ["id"]
+    )
+    op.create_index("ix_messages_created_at", "messages", ["created_at"])
+
+    op.execute(f"""
+        DO $$
+        DECLARE
+            d date;
+            last_day date := (now() AT TIME ZONE 'Europe/Moscow')::date + {PARTITION_AHEAD_DAYS};
+        BEGIN
+            SELECT COALESCE(
+                min((created_at AT TIME ZONE 'Europe/Moscow')::date),
+                (now() AT TIME ZONE 'Europe/Moscow')::date
+            ) INTO d FROM messages_legacy;
+            WHILE d <= last_day LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF messages FOR VALUES FROM (%L) TO (%L)',
+                    'messages_p' || to_char(d, 'YYYYMMDD'),
+                    d::timestamp AT TIME ZONE 'Europe/Moscow',
+                    (d + 1)::timestamp AT TIME ZONE 'Europe/Moscow'
+                );
+                d := d + 1;
+            END LOOP;
+        END $$;
+        """)
+    op.execute("CREATE TABLE messages_default PARTITION OF messages DEFAULT")
+
+    op.execute("INSERT INTO messages SELECT * FROM messages_legacy")
+    op.execute("DROP TABLE messages_legacy")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE messages RENAME TO messages_partitioned")
+    op.execute(
+        "ALTER TABLE messages_partitioned RENAME CONSTRAINT messages_pkey "
+        "TO messages_partitioned_pkey"
+    )
+    op.execute("ALTER INDEX ix_messages_created_at RENAME TO ix_messages_partitioned_created_at")
+    op.execute(
+        "ALTER TABLE messages_partitioned RENAME CONSTRAINT messages_chat_id_fkey "
+        "TO messages_partitioned_chat_id_fkey"
+    )
+    op.execute(
+        "ALTER TABLE messages_partitioned RENAME CONSTRAINT messages_thread_id_fkey "
+        "TO messages_partitioned_thread_id_fkey"
+    )
+
+    op.execute(
+        "CREATE TABLE messages "
+        "(LIKE messages_partitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+    )
+    op.execute("ALTER TABLE messages ADD CONSTRAINT messages_pkey PRIMARY KEY (id)")
+    op.create_foreign_key("messages_chat_id_fkey", "messages", "chats", ["chat_id"], ["id"])
+    op.create_foreign_key(
+        "messages_thread_id_fkey", "messages", "message_threads", ["thread_id"], ["id"]
+    )
+    op.create_index("ix_messages_created_at", "messages", ["created_at"])
+    op.execute("INSERT INTO messages SELECT * FROM messages_partitioned")
+    op.execute("DROP TABLE messages_partitioned")
+
+    # Rows whose message is gone (dropped partitions) can't satisfy the FKs.
+    op.execute("DELETE FROM message_tags WHERE message_id NOT IN (SELECT id FROM messages)")
+    op.execute("DELETE FROM message_contexts WHERE message_id NOT IN (SELECT id FROM messages)")
+    op.create_foreign_key(
+        "message_tags_message_id_fkey", "message_tags", "messages", ["message_id"], ["id"]
+    )
+    op.create_foreign_key(
+        "message_contexts_message_id_fkey", "message_contexts", "messages", ["message_id"], ["id"]
+    )
@@ -0,0 +1,33 @@
+"""водяной знак инкрементального саммари треда
+
+Revision ID: 20260511_0900_d2f4a6c8e0b1
+Revises: 20260510_1100_c9e1a3b5d7f0
+Create Date: 2026-05-11 09:00:00.000000
+
+Фоновый суммаризатор обновляет message_contexts.context_summary по дельте:
+прошлое саммари + сообщения треда новее summary_through. Индекс по
+(thread_id, created_at) — для выборки дельты и агрегатов по тредам.
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "20260511_0900_d2f4a6c8e0b1"
+down_revision: Union[str, None] = "20260510_1100_c9e1a3b5d7f0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "message_contexts",
+        sa.Column("summary_through", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index("ix_messages_thread_id_created_at", "messages", ["thread_id", "created_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_messages_thread_id_created_at", table_name="messages")
+    op.drop_column("message_contexts", "summary_through")
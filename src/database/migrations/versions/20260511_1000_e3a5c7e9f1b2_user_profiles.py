@@ -0,0 +1,42 @@
+"""user_profiles — кэш имён участников по (чат, пользователь)
+
+Revision ID: 20260511_1000_e3a5c7e9f1b2
+Revises: 20260511_0900_d2f4a6c8e0b1
+Create Date: 2026-05-11 10:00:00.000000
+
+/summ запрашивал get_chat_member для каждого автора последовательно —
+40 участников = 40 запросов к Telegram до вызова LLM. Имена теперь
+сохраняются при приёме сообщений (message.from_user) и живут в таблице
+с TTL; промахи добираются параллельно с ограничением.
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "20260511_1000_e3a5c7e9f1b2"
+down_revision: Union[str, None] = "20260511_0900_d2f4a6c8e0b1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "user_profiles",
+        sa.Column("chat_telegram_id", sa.BigInteger(), primary_key=True),
+        sa.Column("user_id", sa.BigInteger(), primary_key=True),
+        sa.Column("first_name", sa.String(), nullable=True),
+        sa.Column("last_name", sa.String(), nullable=True),
+        sa.Column("username", sa.String(), nullable=True),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.text("CURRENT_TIMESTAMP"),
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("user_profiles")
@@ -0,0 +1,29 @@
+"""chats.title_checked_at — свежесть названия чата
+
+Revision ID: 20260511_1100_f4b6d8a0c2e3
+Revises: 20260511_1000_e3a5c7e9f1b2
+Create Date: 2026-05-11 11:00:00.000000
+
+/status, /summ и /test перед ответом дёргали bot.get_chat для каждого
+чата. Теперь названия обновляет фоновая задача (TTL + ограничение
+параллелизма), а команды читают их из БД. title_checked_at — время
+последней успешной проверки; NULL = ещё не проверялось.
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "20260511_1100_f4b6d8a0c2e3"
+down_revision: Union[str, None] = "20260511_1000_e3a5c7e9f1b2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("chats", sa.Column("title_checked_at", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("chats", "title_checked_at")
@@ -16,6 +16,7 @@ from sqlalchemy import (
     String,
     Table,
     Text,
+    UniqueConstraint,
     select,
 )
 from sqlalchemy.dialects.postgresql import JSONB, UUID
@@ -61,6 +62,8 @@ class Chat(Base):
     response_probability = Column(Float, default=0.5)
     importance_threshold = Column(Float, default=0.5)
     last_summary_timestamp = Column(DateTime, nullable=True)
+    # Last successful ``bot.get_chat`` title check (chat_titles refresher).
+    title_checked_at = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -123,7 +126,14 @@ class MessageThread(Base):
 
 
 class DBMessage(Base):
-    """Message from a chat."""
+    """Message from a chat.
+
+    In Postgres the table is range-partitioned by ``created_at``, one
+    partition per Moscow day (``messages_pYYYYMMDD``), with primary key
+    ``(id, created_at)``. ``CleanupService`` creates partitions ahead and
+    drops expired ones. A ``create_all`` database gets a plain table with the
+    same key; ``CleanupService`` purges it row by row instead.
+    """
 
     __tablename__ = "messages"
 
@@ -132,7 +142,14 @@ class DBMessage(Base):
     chat_id = Column(UUID(as_uuid=True), ForeignKey("chats.id"))
     user_id = Column(BigInteger, nullable=False)
     text = Column(String, nullable=True)
-    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    # Partition key, so part of the primary key (NULL would land in
+    # ``messages_default`` and outlive the TTL).
+    created_at = Column(
+        DateTime(timezone=True),
+        primary_key=True,
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+    )
     updated_at = Column(
         DateTime(timezone=True),
         default=lambda: datetime.now(timezone.utc),
@@ -143,12 +160,16 @@ class DBMessage(Base):
 
     chat = relationship("Chat", back_populates="messages")
     thread = relationship("MessageThread", back_populates="messages")
-    tags = relationship("MessageTag", back_populates="message")
+    tags = relationship(
+        "MessageTag",
+        back_populates="message",
+        primaryjoin="DBMessage.id == foreign(MessageTag.message_id)",
+    )
     context = relationship(
         "MessageContext",
         back_populates="message",
         uselist=False,
-        primaryjoin="DBMessage.id==MessageContext.message_id",
+        primaryjoin="DBMessage.id == foreign(MessageContext.message_id)",
     )
 
     @property
@@ -173,16 +194,23 @@ class MessageContext(Base):
     __tablename__ = "message_contexts"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
-    message_id = Column(Integer, ForeignKey("messages.id"), nullable=True)
+    # No FK: a partitioned ``messages`` can't be referenced by id alone.
+    message_id = Column(UUID(as_uuid=True), nullable=True)
     thread_id = Column(UUID(as_uuid=True), ForeignKey("message_threads.id"))
     context_summary = Column(String)
+    # Thread summaries: ``created_at`` of the newest message folded in.
+    summary_through = Column(DateTime(timezone=True), nullable=True)
     importance_score = Column(Float, default=0.0)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationships
     thread = relationship("MessageThread", back_populates="context_entries")
-    message = relationship("DBMessage", back_populates="context")
+    message = relationship(
+        "DBMessage",
+        back_populates="context",
+        primaryjoin="DBMessage.id == foreign(MessageContext.message_id)",
+    )
 
 
 class Tag(Base):
@@ -206,14 +234,19 @@ class MessageTag(Base):
     __tablename__ = "message_tags"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
-    message_id = Column(Integer, ForeignKey("messages.id"))
+    # No FK: a partitioned ``messages`` can't be referenced by id alone.
+    message_id = Column(UUID(as_uuid=True))
     tag_id = Column(UUID(as_uuid=True), ForeignKey("tags.id"))
     is_auto = Column(Boolean, default=False)
     confidence = Column(Float, default=1.0)  # For auto-tagged messages
     created_at = Column(DateTime, default=datetime.utcnow)
 
     # Relationships
-    message = relationship("DBMessage", back_populates="tags")
+    message = relationship(
+        "DBMessage",
+        back_populates="tags",
+        primaryjoin="DBMessage.id == foreign(MessageTag.message_id)",
+    )
     tag = relationship("Tag", back_populates="message_tags")
 
 
@@ -357,9 +390,14 @@ class Event(Base):
 
 
 class MessageStats(Base):
-    """Statistics for messages in a chat."""
+    """Statistics for messages in a chat.
+
+    One current row per ``(chat_id, period)`` (unique), updated in place by
+    ``StatsService``; day-by-day history lives in ``MessageStatsDaily``.
+    """
 
     __tablename__ = "message_stats"
+    __table_args__ = (UniqueConstraint("chat_id", "period", name="uq_message_stats_chat_period"),)
 
     id = Column(Integer, primary_key=True)
     chat_id = Column(UUID(as_uuid=True), ForeignKey("chats.id"))
@@ -386,3 +424,96 @@ class MessageStats(Base):
 
     def __repr__(self):
         return f"<MessageStats(chat_id={self.chat_id}, period={self.period})>"
+
+
+class ChatHourlyStats(Base):
+    """Per-chat, per-hour rollup of message metrics.
+
+    Maintained incrementally by ``StatsService`` (only the latest rolled hour
+    and newer are recomputed each pass) so the weekly ``MessageStats`` view
+    is assembled from ~168 rows instead of a full week of messages. Each row
+    is one hour, so the hour-of-day histogram is ``hour_start.hour`` →
+    ``message_count``.
+    """
+
+    __tablename__ = "chat_hourly_stats"
+
+    chat_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("chats.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    hour_start = Column(DateTime(timezone=True), primary_key=True)  # UTC, truncated to the hour
+    message_count = Column(Integer, nullable=False, default=0)
+    total_length = Column(BigInteger, nullable=False, default=0)  # sum of len(text)
+    user_ids = Column(JSONB, nullable=False, default=list)  # exact distinct authors
+    emoji_count = Column(Integer, nullable=False, default=0)
+    emojis = Column(JSONB, nullable=False, default=dict)  # emoji → count
+    words = Column(JSONB, nullable=False, default=dict)  # word → count, top-N per hour
+    updated_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+    )
+
+    def __repr__(self) -> str:
+        return f"<ChatHourlyStats(chat_id={self.chat_id}, hour={self.hour_start:%Y-%m-%d %H})>"
+
+
+class MessageStatsDaily(Base):
+    """Compact daily snapshot of a chat's weekly stats.
+
+    One row per ``(chat_id, day)``, overwritten by every stats pass of that
+    day, so the last pass wins. Kept for ``settings.STATS_HISTORY_DAYS``
+    (``CleanupService``).
+    """
+
+    __tablename__ = "message_stats_daily"
+
+    chat_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("chats.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    day = Column(Date, primary_key=True)  # UTC date of the snapshot
+    message_count = Column(Integer, nullable=False, default=0)
+    user_count = Column(Integer, nullable=False, default=0)
+    avg_length = Column(Float, nullable=False, default=0.0)
+    emoji_count = Column(Integer, nullable=False, default=0)
+    top_topics = Column(JSONB, nullable=False, default=list)
+    updated_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+    )
+
+    def __repr__(self) -> str:
+        return f"<MessageStatsDaily(chat_id={self.chat_id}, day={self.day})>"
+
+
+class UserProfile(Base):
+    """Display name of a Telegram user as seen in one chat.
+
+    Keyed by ``(chat_telegram_id, user_id)``; refreshed from
+    ``message.from_user`` on ingest and from ``get_chat_member`` when a
+    summary needs a name older than ``user_profiles.PROFILE_TTL``.
+    """
+
+    __tablename__ = "user_profiles"
+
+    chat_telegram_id = Column(BigInteger, primary_key=True)
+    user_id = Column(BigInteger, primary_key=True)
+    first_name = Column(String, nullable=True)
+    last_name = Column(String, nullable=True)
+    username = Column(String, nullable=True)
+    updated_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+    )
+
+    def __repr__(self) -> str:
+        return f"<UserProfile(chat={self.chat_telegram_id}, user={self.user_id})>"
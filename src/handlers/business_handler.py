@@ -26,6 +26,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from ..config import settings
 from ..database.models import BusinessConnection as DBBusinessConnection
 from ..database.models import Chat, ChatType, DBMessage
+from ..services.stats_service import mark_chat_dirty
+from ..services.user_profiles import mark_user_written, remember_user
 
 router = Router()
 logger = logging.getLogger(__name__)
@@ -243,4 +245,8 @@ async def handle_business_message(message: Message, session: AsyncSession) -> No
         was_responded=False,
     )
     session.add(db_message)
+    profile_staged = await remember_user(session, message.chat.id, message.from_user)
     await session.commit()
+    mark_chat_dirty(chat.id)
+    if profile_staged:
+        mark_user_written(message.chat.id, message.from_user)
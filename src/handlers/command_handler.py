@@ -8,7 +8,6 @@
 
 from __future__ import annotations
 
-import asyncio
 import json
 import logging
 import re
@@ -43,8 +42,11 @@ from ..database.models import (
     Style,
     Tag,
 )
+from ..services.chat_titles import refresh_chat_title
 from ..services.context_service import ContextService
+from ..services.executors import run_in_process
 from ..services.openai_service import OpenAIService
+from ..services.outbox_service import outbox_for
 from ..services.stats_service import StatsService
 
 router = Router()
@@ -83,35 +85,16 @@ async def _get_all_chats(session: AsyncSession) -> List[Chat]:
 
 
 async def update_chat_title(message: Message, chat_id: UUID, session: AsyncSession) -> None:
-    """Refresh ``Chat.name`` from Telegram. Safe to call best-effort."""
+    """Refresh ``Chat.name`` from Telegram now. Safe to call best-effort.
+
+    Chat lists don't need this: titles are kept fresh in the background
+    (``chat_titles.run_title_refresher``).
+    """
     chat = await session.get(Chat, chat_id)
     if chat is None:
         logger.info("Chat %s not in DB, skipping title update", chat_id)
         return
-
-    try:
-        chat_info = await message.bot.get_chat(chat.telegram_id)
-    except TelegramForbiddenError:
-        logger.warning("Bot was kicked from chat %s, removing record", chat.telegram_id)
-        await session.delete(chat)
-        await session.commit()
-        return
-    except Exception as exc:  # noqa: BLE001 — Telegram errors vary
-        text = str(exc).lower()
-        if "chat not found" in text:
-            logger.info("Chat %s not found in Telegram, skipping title update", chat.telegram_id)
-            return
-        logger.error("Error fetching chat info for %s: %s", chat.telegram_id, exc)
-        return
-
-    new_title = getattr(chat_info, "title", None) or chat.name
-    if new_title and chat.name != new_title:
-        chat.name = new_title
-        # NB: do NOT assign a tz-aware datetime to chat.updated_at — the column
-        # is DateTime (naive) and asyncpg rejects aware values. SQLAlchemy will
-        # auto-touch updated_at via the model-level ``onupdate=datetime.utcnow``.
-        await session.commit()
-        logger.info("Updated chat title for %s -> %s", chat.telegram_id, new_title)
+    await refresh_chat_title(message.bot, session, chat)
 
 
 def _format_chat_name(chat: Chat) -> str:
@@ -165,7 +148,8 @@ async def help_command(message: Message, session: AsyncSession) -> None:
         "/digest — за вчера (00:00–23:59 МСК) — дефолт\n"
         "/digest today — за сегодня (с начала дня до сейчас)\n"
         "/digest yesterday — явно за вчера\n"
-        "/digest 2026-05-08 — за конкретную дату (ISO)\n"
+        "/digest 2026-05-08 — за конкретную дату (ISO; прошлые дни — из архива)\n"
+        "/digest 2026-05-08 rebuild — пересобрать прошлый день заново через LLM\n"
         "/today — то же, что /digest today\n"
         "ℹ️ Авто-дайджест уходит каждый день в 23:50 МСК.\n\n"
         "🗂 Глоссарий чатов (классификация)\n"
@@ -224,8 +208,6 @@ async def status_command(message: Message, session: AsyncSession) -> None:
         return
 
     chats = await _get_all_chats(session)
-    for chat in chats:
-        await update_chat_title(message, chat.id, session)
 
     text = "🤖 Bot Status:\n\n"
     text += (
@@ -729,9 +711,6 @@ async def summarize_chat_command(message: Message, session: AsyncSession) -> Non
         await message.answer("No chats found in database.")
         return
 
-    for chat in chats:
-        await update_chat_title(message, chat.id, session)
-
     await message.answer(
         "Select chat to generate summary:",
         reply_markup=_chat_keyboard(chats, prefix="summchat"),
@@ -850,7 +829,9 @@ async def _send_summary(
         await sink.answer("❌ Нет сообщений за выбранный период")
         return
 
-    summary = await ContextService(session).generate_chat_summary(messages)
+    summary = await ContextService(session).generate_chat_summary(
+        messages, bot=sink.bot, chat_telegram_id=chat.telegram_id
+    )
     chat.last_summary_timestamp = datetime.now(timezone.utc)
     await session.commit()
     await sink.answer(f"📊 Суммаризация для {_format_chat_name(chat)}:\n\n{summary}")
@@ -935,7 +916,12 @@ async def process_dump_upload(
         await message.answer("❌ Не удалось получить содержимое дампа. Проверьте формат.")
         return
 
-    parsed = _parse_dump(text_content, message.from_user.first_name if message.from_user else None)
+    parsed = await run_in_process(
+        _parse_dump,
+        text_content,
+        message.from_user.first_name if message.from_user else None,
+        size_hint=len(text_content),
+    )
     if not parsed:
         await message.answer("❌ Не удалось извлечь сообщения из дампа. Проверьте формат.")
         return
@@ -977,8 +963,12 @@ async def _read_dump(message: Message) -> str:
     raw = buf.read().decode("utf-8")
 
     if message.document.mime_type == "application/json":
-        return _json_dump_to_text(
-            raw, owner_name=(message.from_user.first_name if message.from_user else None)
+        # Multi-megabyte exports: json.loads + the walk would stall the loop.
+        return await run_in_process(
+            _json_dump_to_text,
+            raw,
+            owner_name=(message.from_user.first_name if message.from_user else None),
+            size_hint=len(raw),
         )
     return raw
 
@@ -1145,9 +1135,6 @@ async def test_command(message: Message, session: AsyncSession) -> None:
         await message.answer("No chats found in database.")
         return
 
-    for chat in chats:
-        await update_chat_title(message, chat.id, session)
-
     await message.answer(
         "Select chat to test bot functionality:",
         reply_markup=_chat_keyboard(chats, prefix="testchat"),
@@ -1250,8 +1237,8 @@ async def tag_command(
 
     if action == "add" and len(args) >= 3:
         tag_name = args[2].strip("#")
-        tags = await context_service.get_or_create_tags([tag_name])
-        await context_service.add_tags_to_message(target_msg, tags, is_auto=False)
+        tag_ids = await context_service.resolve_tag_ids([tag_name])
+        await context_service.add_tags_to_message(target_msg, tag_ids, is_auto=False)
         await message.answer(f"Added tag #{tag_name} to message {target_msg_id}")
         return
 
@@ -1326,8 +1313,9 @@ async def thread_command(
             await message.answer("No active threads")
             return
         lines = ["🧵 Active Threads:\n"]
+        all_stats = await context_service.get_threads_stats([t.id for t in threads])
         for thread in threads:
-            stats = await context_service.get_thread_stats(thread)
+            stats = all_stats.get(thread.id)
             lines.append(f"📌 {thread.topic}")
             if stats:
                 lines.append(f"Messages: {stats['message_count']}")
@@ -1562,21 +1550,45 @@ async def digest_command(message: Message, command: CommandObject, session: Asyn
     """Send a chat digest to the owner.
 
     Usage:
-        /digest                 — yesterday (default)
-        /digest today           — today so far
-        /digest 2026-05-08      — explicit date
+        /digest                      — yesterday (default)
+        /digest today                — today so far
+        /digest 2026-05-08           — explicit date
+        /digest 2026-05-08 rebuild   — re-run extraction even if the day is archived
+
+    Past days that were delivered by the nightly run are served from
+    ``daily_digests.body_md`` as-is; only today (or ``rebuild``) hits the LLM.
     """
     if not _is_owner_private(message):
         return
 
-    day = _parse_digest_arg(command.args)
-    if day is None:
-        await message.answer("Не понял дату. Примеры: /digest, /digest today, /digest 2026-05-08")
+    tokens = (command.args or "").split()
+    rebuild = bool(tokens) and tokens[-1].lower() == "rebuild"
+    if rebuild:
+        tokens = tokens[:-1]
+    day = _parse_digest_arg(" ".join(tokens))
+    if day is None or len(tokens) > 1:
+        await message.answer(
+            "Не понял дату. Примеры: /digest, /digest today, /digest 2026-05-08, "
+            "/digest 2026-05-08 rebuild"
+        )
         return
 
-    from ..services.digest_service import DigestService
+    from ..services.digest_service import DigestService, today_in_moscow
 
     service = DigestService(session, message.bot)
+    if not rebuild and day < today_in_moscow():
+        try:
+            archived = await service.send_stored(day)
+        except Exception as exc:  # noqa: BLE001 — упадём в пересборку ниже
+            logger.error("Stored digest lookup failed for %s: %s", day, exc, exc_info=True)
+            archived = None
+        if archived is not None:
+            await message.answer(
+                f"✅ Из архива: {archived} чат(ов). "
+                f"Пересобрать: /digest {day.isoformat()} rebuild"
+            )
+            return
+
     await message.answer(f"⏳ Готовлю дайджест за {day.strftime('%d.%m.%Y')}…")
     try:
         sent = await service.send_for_day(day, record=False)
@@ -1977,7 +1989,7 @@ async def _glossary_suggest(message: Message, session: AsyncSession) -> None:
     """
     from datetime import timedelta
 
-    from ..services.digest_service import suggest_classification_for_chat
+    from ..services.digest_service import suggest_classifications_for_chats
 
     cutoff = datetime.now(timezone.utc) - timedelta(days=7)
 
@@ -2021,21 +2033,8 @@ async def _glossary_suggest(message: Message, session: AsyncSession) -> None:
     )
     await message.answer(intro)
 
-    sent = 0
-    failed = 0
-    for chat, messages in chat_messages:
-        try:
-            await suggest_classification_for_chat(
-                message.bot, session, chat=chat, messages=messages
-            )
-            sent += 1
-            # Tiny delay to be polite to OpenAI rate limits.
-            await asyncio.sleep(0.3)
-        except Exception as exc:  # noqa: BLE001 — owner-only, лучше досчитать остальное
-            logger.error(
-                "Suggest classify failed for chat %s: %s", chat.telegram_id, exc, exc_info=True
-            )
-            failed += 1
+    # Batched LLM calls with bounded concurrency; cards arrive as batches finish.
+    sent, failed = await suggest_classifications_for_chats(message.bot, session, chat_messages)
 
     summary = [f"✅ Карточек отправлено: {sent}"]
     if failed:
@@ -2121,6 +2120,7 @@ async def commits_command(message: Message, session: AsyncSession) -> None:
         return
 
     await message.answer(f"🤝 Открытых коммитов: {len(rows)}")
+    outbox = outbox_for(message.bot)
     for commitment, chat in rows:
         direction = "→ от меня" if commitment.direction == "from_me" else "← мне"
         urgent = "⚠️ " if commitment.is_urgent else ""
@@ -2141,7 +2141,7 @@ async def commits_command(message: Message, session: AsyncSession) -> None:
                 ]
             ]
         )
-        await message.answer(body, reply_markup=keyboard)
+        await outbox.send(message.chat.id, body, reply_markup=keyboard)
 
 
 @router.callback_query(F.data.startswith("commit|"))
@@ -2199,6 +2199,7 @@ async def events_command(message: Message, session: AsyncSession) -> None:
         return
 
     await message.answer(f"📅 Запланированных событий: {len(rows)}")
+    outbox = outbox_for(message.bot)
     for event, chat in rows:
         urgent = "⚠️ " if event.is_urgent else ""
         when = f" — {event.when_raw}" if event.when_raw else ""
@@ -2216,7 +2217,7 @@ async def events_command(message: Message, session: AsyncSession) -> None:
                 ]
             ]
         )
-        await message.answer(body, reply_markup=keyboard)
+        await outbox.send(message.chat.id, body, reply_markup=keyboard)
 
 
 @router.callback_query(F.data.startswith("event|"))
@@ -5,6 +5,7 @@ from __future__ import annotations
 import logging
 import random
 from typing import Optional
+from uuid import UUID
 
 from aiogram import F, Router
 from aiogram.types import ChatMemberUpdated, Message
@@ -13,6 +14,10 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..config import settings
 from ..database.models import Chat, ChatType, DBMessage
+from ..services.context_service import ContextService, note_thread_message
+from ..services.message_analysis import message_analyzer
+from ..services.stats_service import mark_chat_dirty
+from ..services.user_profiles import mark_user_written, remember_user
 
 router = Router()
 logger = logging.getLogger(__name__)
@@ -120,7 +125,9 @@ async def handle_message(message: Message, session: AsyncSession) -> None:
     await _process_and_respond(message, chat, session)
 
 
-async def _save_message(message: Message, chat: Chat, session: AsyncSession) -> DBMessage:
+async def _save_message(
+    message: Message, chat: Chat, session: AsyncSession, thread_id: Optional[UUID] = None
+) -> DBMessage:
     db_message = DBMessage(
         message_id=message.message_id,
         chat_id=chat.id,
@@ -129,20 +136,28 @@ async def _save_message(message: Message, chat: Chat, session: AsyncSession) ->
         created_at=message.date,
         updated_at=message.date,
         was_responded=False,
+        thread_id=thread_id,
     )
     session.add(db_message)
+    profile_staged = await remember_user(session, chat.telegram_id, message.from_user)
     await session.commit()
+    mark_chat_dirty(chat.id)
+    if profile_staged:
+        mark_user_written(chat.telegram_id, message.from_user)
+    if thread_id is not None:
+        note_thread_message(thread_id)
     return db_message
 
 
-async def _process_for_learning(message: Message, chat: Chat, session: AsyncSession) -> None:
-    """Silent mode: save the message and ensure an active thread exists."""
-    await _save_message(message, chat, session)
+async def _save_to_thread(message: Message, chat: Chat, session: AsyncSession) -> DBMessage:
+    """Save the message into the chat's active thread (created if needed)."""
+    thread = await ContextService(session).get_or_create_thread(chat.id)
+    return await _save_message(message, chat, session, thread_id=thread.id)
 
-    from ..services.context_service import ContextService  # avoid circular import
 
-    context_service = ContextService(session)
-    await context_service.get_or_create_thread(chat.id)
+async def _process_for_learning(message: Message, chat: Chat, session: AsyncSession) -> None:
+    """Silent mode: save the message into the chat's active thread."""
+    await _save_to_thread(message, chat, session)
 
 
 async def _process_and_respond(message: Message, chat: Chat, session: AsyncSession) -> None:
@@ -152,14 +167,10 @@ async def _process_and_respond(message: Message, chat: Chat, session: AsyncSessi
         await _save_message(message, chat, session)
         return
 
-    db_message = await _save_message(message, chat, session)
+    db_message = await _save_to_thread(message, chat, session)
 
-    from ..services.context_service import ContextService
     from ..services.openai_service import OpenAIService
 
-    context_service = ContextService(session)
-    await context_service.get_or_create_thread(chat.id)
-
     result = await session.execute(
         select(DBMessage)
         .where(DBMessage.chat_id == chat.id)
@@ -174,7 +185,7 @@ async def _process_and_respond(message: Message, chat: Chat, session: AsyncSessi
 
     try:
         if chat.smart_mode:
-            importance = await openai_service.analyze_message_importance(message.text or "")
+            _, importance = await message_analyzer.analyze(chat.id, message.text or "")
             if importance < chat.importance_threshold:
                 return
         else:
@@ -15,8 +15,11 @@ from dotenv import load_dotenv
 from .config import settings
 from .handlers import business_handler, command_handler, message_handler
 from .middleware import DatabaseMiddleware
+from .services.chat_titles import run_title_refresher
 from .services.cleanup_service import run_cleanup_scheduler
+from .services.context_service import run_thread_summarizer
 from .services.digest_service import run_digest_scheduler
+from .services.executors import shutdown_executors
 from .services.notification_service import NotificationService
 from .services.stats_service import StatsService
 
@@ -58,7 +61,9 @@ async def main() -> None:
     stats_task = asyncio.create_task(stats_service.start_periodic_update())
     digest_task = asyncio.create_task(run_digest_scheduler(bot))
     cleanup_task = asyncio.create_task(run_cleanup_scheduler())
-    background_tasks = (stats_task, digest_task, cleanup_task)
+    summarizer_task = asyncio.create_task(run_thread_summarizer())
+    titles_task = asyncio.create_task(run_title_refresher(bot))
+    background_tasks = (stats_task, digest_task, cleanup_task, summarizer_task, titles_task)
 
     logger.info("Starting bot...")
     try:
@@ -71,6 +76,7 @@ async def main() -> None:
                 await task
             except (asyncio.CancelledError, Exception):  # noqa: BLE001 — игнорируем при выходе
                 pass
+        shutdown_executors(wait=False)
         await bot.session.close()
 
 
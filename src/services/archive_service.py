@@ -0,0 +1,110 @@
+"""Cold archive of expired messages (gzip JSONL, one file per Moscow day).
+
+``CleanupService`` drops messages past ``MESSAGE_TTL_DAYS``. When
+``settings.MESSAGE_ARCHIVE_DIR`` is set, every expiring row is first
+appended to ``<dir>/<YYYY>/messages-<YYYY-MM-DD>.jsonl.gz`` (the Moscow day
+of ``created_at``, same as the ``messages`` partitions), so long-range jobs
+— style refreshes, stats over months — can still read the history without
+it living in Postgres.
+
+- Each write appends a new gzip member; ``gzip`` readers see the
+  concatenation as one stream, so a day can be archived in several passes
+  (whole partition, then batch purge leftovers).
+- Archiving happens before the delete commits. A crash in between
+  archives the rows again on the next run; :func:`iter_archived_messages`
+  skips repeated ids within a day.
+- Reading memory-maps each day file and decompresses it as a stream, one
+  record at a time, so months of history never sit in memory.
+
+Both sides are plain blocking I/O — call them via ``run_in_thread``.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import logging
+import mmap
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional
+from uuid import UUID
+from zoneinfo import ZoneInfo
+
+logger = logging.getLogger(__name__)
+
+OWNER_TZ = ZoneInfo("Europe/Moscow")
+# ``messages`` columns kept in the archive.
+ARCHIVE_COLUMNS = ("id", "chat_id", "message_id", "user_id", "text", "created_at", "thread_id")
+
+
+def archive_path(root: Path, day: date) -> Path:
+    return root / f"{day:%Y}" / f"messages-{day:%Y-%m-%d}.jsonl.gz"
+
+
+def _record(row: Mapping[str, Any]) -> Dict[str, Any]:
+    record = {}
+    for column in ARCHIVE_COLUMNS:
+        value = row[column]
+        if isinstance(value, UUID):
+            value = str(value)
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        record[column] = value
+    return record
+
+
+def write_archive(root: Path, rows: Iterable[Mapping[str, Any]]) -> Dict[date, int]:
+    """Append ``rows`` (``messages`` columns) to their day files.
+
+    Returns the number of rows written per Moscow day.
+    """
+    by_day: Dict[date, List[Dict[str, Any]]] = defaultdict(list)
+    for row in rows:
+        by_day[row["created_at"].astimezone(OWNER_TZ).date()].append(_record(row))
+
+    for day, records in by_day.items():
+        path = archive_path(root, day)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+        with open(path, "ab") as raw, gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as gz:
+            gz.write(payload.encode("utf-8"))
+    return {day: len(records) for day, records in by_day.items()}
+
+
+def iter_archived_messages(
+    root: Path,
+    start: date,
+    end: date,
+    *,
+    chat_id: Optional[UUID] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Stream archived messages of Moscow days ``start..end`` (inclusive).
+
+    Records come back in day order with ``created_at`` as an aware
+    ``datetime`` and ids as ``UUID``; ``chat_id`` filters to one chat.
+    """
+    wanted = str(chat_id) if chat_id is not None else None
+    day = start
+    while day <= end:
+        path = archive_path(root, day)
+        day += timedelta(days=1)
+        if not path.exists() or path.stat().st_size == 0:
+            continue
+        seen: set[str] = set()
+        with open(path, "rb") as raw, mmap.mmap(raw.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with gzip.GzipFile(fileobj=mm, mode="rb") as gz:
+                for line in gz:
+                    record = json.loads(line)
+                    if wanted is not None and record["chat_id"] != wanted:
+                        continue
+                    if record["id"] in seen:
+                        continue
+                    seen.add(record["id"])
+                    record["id"] = UUID(record["id"])
+                    record["chat_id"] = UUID(record["chat_id"]) if record["chat_id"] else None
+                    if record["thread_id"]:
+                        record["thread_id"] = UUID(record["thread_id"])
+                    record["created_at"] = datetime.fromisoformat(record["created_at"])
+                    yield record
@@ -0,0 +1,123 @@
+"""Chat titles kept fresh in the background, so chat pickers render from the DB.
+
+``/status``, ``/summ`` and ``/test`` used to call ``bot.get_chat`` for
+every chat before answering — N serial Telegram round trips. Now they read
+``Chat.name`` as stored; :func:`run_title_refresher` re-checks titles whose
+``title_checked_at`` is older than ``TITLE_TTL``, ``TITLE_CONCURRENCY``
+chats at a time, each in its own session.
+
+A chat the bot was removed from (``TelegramForbiddenError``) is deleted, as
+the on-demand refresh always did. A chat Telegram can't find (e.g. a
+Business contact the bot can't ``get_chat``) waits a full ``TITLE_TTL``;
+other errors are retried after ``TITLE_ERROR_RETRY``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from uuid import UUID
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database.database import async_session
+from ..database.models import Chat
+
+logger = logging.getLogger(__name__)
+
+TITLE_TTL = timedelta(hours=6)
+TITLE_ERROR_RETRY = timedelta(hours=1)
+TITLE_CONCURRENCY = 4
+TITLE_REFRESH_INTERVAL_SECONDS = 900
+
+
+async def refresh_chat_title(bot: Bot, session: AsyncSession, chat: Chat) -> bool:
+    """Re-read ``chat``'s title from Telegram; ``True`` if the check succeeded.
+
+    A chat Telegram can't find is not asked again for ``TITLE_TTL``; after
+    any other error it is retried in ``TITLE_ERROR_RETRY``.
+    """
+    now = datetime.now(timezone.utc)
+    try:
+        chat_info = await bot.get_chat(chat.telegram_id)
+    except TelegramForbiddenError:
+        logger.warning("Bot was kicked from chat %s, removing record", chat.telegram_id)
+        await session.delete(chat)
+        await session.commit()
+        return False
+    except Exception as exc:  # noqa: BLE001 — Telegram errors vary
+        text = str(exc).lower()
+        if "chat not found" in text:
+            logger.info("Chat %s not found in Telegram, skipping title update", chat.telegram_id)
+            chat.title_checked_at = now
+        else:
+            logger.error("Error fetching chat info for %s: %s", chat.telegram_id, exc)
+            # Back-date the check so the chat is due again after TITLE_ERROR_RETRY.
+            chat.title_checked_at = now - TITLE_TTL + TITLE_ERROR_RETRY
+        await session.commit()
+        return False
+
+    new_title = getattr(chat_info, "title", None) or chat.name
+    if new_title and chat.name != new_title:
+        chat.name = new_title
+        logger.info("Updated chat title for %s -> %s", chat.telegram_id, new_title)
+    # NB: do NOT assign a tz-aware datetime to chat.updated_at — the column
+    # is DateTime (naive) and asyncpg rejects aware values. title_checked_at
+    # is timezone-aware.
+    chat.title_checked_at = now
+    await session.commit()
+    return True
+
+
+async def refresh_stale_titles(bot: Bot, *, now: Optional[datetime] = None) -> int:
+    """Refresh every chat whose title is older than ``TITLE_TTL``.
+
+    Returns the number of chats checked successfully.
+    """
+    now = now or datetime.now(timezone.utc)
+    async with async_session() as session:
+        result = await session.execute(
+            select(Chat.id).where(
+                or_(Chat.title_checked_at.is_(None), Chat.title_checked_at < now - TITLE_TTL)
+            )
+        )
+        chat_ids = list(result.scalars().all())
+    if not chat_ids:
+        return 0
+    semaphore = asyncio.Semaphore(TITLE_CONCURRENCY)
+
+    async def _refresh(chat_id: UUID) -> bool:
+        async with semaphore, async_session() as session:
+            chat = await session.get(Chat, chat_id)
+            if chat is None:
+                return False
+            try:
+                return await refresh_chat_title(bot, session, chat)
+            except Exception as exc:  # noqa: BLE001 — продолжаем по другим чатам
+                logger.warning("Title refresh failed for chat %s: %s", chat_id, exc)
+                await session.rollback()
+                return False
+
+    results = await asyncio.gather(*(_refresh(chat_id) for chat_id in chat_ids))
+    return sum(results)
+
+
+async def run_title_refresher(bot: Bot) -> None:
+    """Background loop: refresh stale chat titles every 15 minutes."""
+    logger.info("Chat title refresher started")
+    while True:
+        try:
+            refreshed = await refresh_stale_titles(bot)
+            if refreshed:
+                logger.debug("Chat titles refreshed: %s", refreshed)
+        except asyncio.CancelledError:
+            logger.info("Chat title refresher cancelled")
+            raise
+        except Exception as exc:  # noqa: BLE001
+            logger.error("Chat title refresher error: %s", exc, exc_info=True)
+        await asyncio.sleep(TITLE_REFRESH_INTERVAL_SECONDS)
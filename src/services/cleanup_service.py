@@ -1,6 +1,13 @@
 """Background message TTL cleanup (TECH-009).
 
 Hard 30-day retention for ``messages.text``: anything older is purged daily.
+``messages`` is partitioned by Moscow day, so whole expired partitions are
+detached and dropped (and upcoming ones created); leftovers are deleted in
+short batches (dependent tags/contexts first) under a time budget. With
+``MESSAGE_ARCHIVE_DIR`` set, expiring rows are written to the cold archive
+(``archive_service``) before they are deleted.
+Hourly stats rollups (``chat_hourly_stats``) and the daily stats history
+(``message_stats_daily``) are trimmed in the same pass.
 
 The schedule is intentionally offset from the digest (23:50 MSK) — we run at
 04:00 MSK so the previous day's digest is already built before we drop its
@@ -11,21 +18,44 @@ from __future__ import annotations
 
 import asyncio
 import logging
-from datetime import datetime, time, timedelta, timezone
-from typing import Optional
+import re
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional
 from zoneinfo import ZoneInfo
 
-from sqlalchemy import delete, update
+from sqlalchemy import delete, select, text, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..config import settings
-from ..database.models import DBMessage, Event
+from ..database.models import (
+    ChatHourlyStats,
+    DBMessage,
+    Event,
+    MessageContext,
+    MessageStatsDaily,
+    MessageTag,
+)
+from .archive_service import ARCHIVE_COLUMNS, write_archive
+from .executors import run_in_thread
+from .stats_service import ROLLUP_RETENTION
 
 logger = logging.getLogger(__name__)
 
 OWNER_TZ = ZoneInfo("Europe/Moscow")
 CLEANUP_HOUR = 4
 CLEANUP_MINUTE = 0
+# Purge in short transactions: ids per batch, wall-clock budget per run and
+# a pause between batches so ingest and other queries get the table back.
+PURGE_BATCH_SIZE = 5000
+PURGE_TIME_BUDGET_SECONDS = 600.0
+PURGE_PAUSE_SECONDS = 0.5
+# ``messages`` is partitioned by Moscow day; this many days ahead always exist.
+PARTITION_AHEAD_DAYS = 7
+# Rows per chunk when archiving a whole partition.
+ARCHIVE_CHUNK = 5000
+_PARTITION_NAME_RE = re.compile(r"messages_p(\d{8})")
 
 
 def seconds_until_next_cleanup(now_utc: Optional[datetime] = None) -> float:
@@ -38,18 +68,237 @@ def seconds_until_next_cleanup(now_utc: Optional[datetime] = None) -> float:
     return (target - now_msk).total_seconds()
 
 
+@dataclass
+class PurgeProgress:
+    """Progress of one ``purge_old_messages`` run."""
+
+    batches: int = 0
+    messages: int = 0
+    tags: int = 0
+    contexts: int = 0
+    archived: int = 0  # rows written to the cold archive first
+    seconds: float = 0.0
+    finished: bool = False  # False: time budget ran out, the rest waits for the next run
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "messages": self.messages,
+            "tags": self.tags,
+            "contexts": self.contexts,
+            "archived": self.archived,
+            "seconds": round(self.seconds, 2),
+            "finished": self.finished,
+        }
+
+
+def _partition_name(day: date) -> str:
+    return f"messages_p{day:%Y%m%d}"
+
+
+def _partition_bounds(day: date) -> tuple[datetime, datetime]:
+    """``[00:00, next 00:00)`` Moscow time — the digest's notion of a day."""
+    lower = datetime.combine(day, time(0), tzinfo=OWNER_TZ)
+    return lower, datetime.combine(day + timedelta(days=1), time(0), tzinfo=OWNER_TZ)
+
+
+def _archive_root() -> Optional[Path]:
+    return Path(settings.MESSAGE_ARCHIVE_DIR) if settings.MESSAGE_ARCHIVE_DIR else None
+
+
 class CleanupService:
     """Drop messages older than ``settings.MESSAGE_TTL_DAYS``."""
 
     def __init__(self, session: AsyncSession) -> None:
         self.session = session
+        self.last_purge = PurgeProgress()
+        # Set by ``maintain_partitions``; ``None`` until it has looked.
+        self.partitioned: Optional[bool] = None
+
+    async def purge_old_messages(
+        self,
+        *,
+        now_utc: Optional[datetime] = None,
+        batch_size: int = PURGE_BATCH_SIZE,
+        time_budget: float = PURGE_TIME_BUDGET_SECONDS,
+        pause: float = PURGE_PAUSE_SECONDS,
+    ) -> int:
+        """Delete expired messages oldest-first, ``batch_size`` ids at a time.
 
-    async def purge_old_messages(self, *, now_utc: Optional[datetime] = None) -> int:
+        Each batch drops the dependent ``message_tags`` / ``message_contexts``
+        rows first and commits on its own, so locks stay short and ingest
+        keeps flowing. After ``time_budget`` seconds the run stops; whatever
+        is left goes on the next pass. Progress lands in ``last_purge``.
+        Returns the number of messages deleted.
+        """
         ttl_days = max(1, int(settings.MESSAGE_TTL_DAYS))
         threshold = (now_utc or datetime.now(timezone.utc)) - timedelta(days=ttl_days)
-        # `messages.created_at` is timezone-aware (DateTime(timezone=True)).
+        progress = self.last_purge = PurgeProgress()
+        archive_root = _archive_root()
+        clock = asyncio.get_running_loop().time
+        started = clock()
+        while True:
+            # `messages.created_at` is timezone-aware (DateTime(timezone=True)).
+            columns = (
+                [getattr(DBMessage, c) for c in ARCHIVE_COLUMNS] if archive_root else [DBMessage.id]
+            )
+            result = await self.session.execute(
+                select(*columns)
+                .where(DBMessage.created_at < threshold)
+                .order_by(DBMessage.created_at)
+                .limit(batch_size)
+            )
+            if archive_root is None:
+                ids = list(result.scalars().all())
+            else:
+                rows = list(result.mappings().all())
+                ids = [row["id"] for row in rows]
+                if rows:
+                    await run_in_thread(write_archive, archive_root, rows)
+                    progress.archived += len(rows)
+            if ids:
+                tags = await self.session.execute(
+                    delete(MessageTag).where(MessageTag.message_id.in_(ids))
+                )
+                contexts = await self.session.execute(
+                    delete(MessageContext).where(MessageContext.message_id.in_(ids))
+                )
+                messages = await self.session.execute(
+                    delete(DBMessage).where(DBMessage.id.in_(ids))
+                )
+                await self.session.commit()
+                progress.batches += 1
+                progress.tags += int(tags.rowcount or 0)
+                progress.contexts += int(contexts.rowcount or 0)
+                progress.messages += int(messages.rowcount or 0)
+            progress.seconds = clock() - started
+            if len(ids) < batch_size:
+                progress.finished = True
+                break
+            logger.debug("Purge progress: %s", progress.snapshot())
+            if progress.seconds >= time_budget:
+                logger.warning(
+                    "Purge stopped after %.0f s budget, rest left for the next run: %s",
+                    time_budget,
+                    progress.snapshot(),
+                )
+                break
+            await asyncio.sleep(pause)
+        return progress.messages
+
+    async def maintain_partitions(self, *, now_utc: Optional[datetime] = None) -> tuple[int, int]:
+        """Create upcoming day partitions of ``messages`` and drop expired ones.
+
+        A partition is dropped once its whole Moscow day is older than the
+        TTL; its ``message_tags`` / ``message_contexts`` rows are deleted
+        first (there are no FKs to cascade). Rows past the TTL that remain
+        (the partition straddling the cutoff, ``messages_default``) are left
+        to :meth:`purge_old_messages`. When ``messages`` isn't partitioned
+        (e.g. a dev DB built by ``create_all``) there is nothing to drop, so
+        expired rows go through :meth:`purge_old_messages` right here.
+        Returns ``(created, dropped)``.
+        """
+        now_utc = now_utc or datetime.now(timezone.utc)
+        self.partitioned = bool(
+            await self.session.scalar(
+                text(
+                    "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+                    "WHERE partrelid = to_regclass('messages'))"
+                )
+            )
+        )
+        if not self.partitioned:
+            purged = await self.purge_old_messages(now_utc=now_utc)
+            logger.info("messages is not partitioned; purged %s expired rows in batches", purged)
+            return 0, 0
+
+        result = await self.session.execute(
+            text(
+                "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = to_regclass('messages')"
+            )
+        )
+        existing = {}
+        for name in result.scalars().all():
+            match = _PARTITION_NAME_RE.fullmatch(name)
+            if match:
+                existing[datetime.strptime(match.group(1), "%Y%m%d").date()] = name
+
+        created = 0
+        today = now_utc.astimezone(OWNER_TZ).date()
+        for offset in range(PARTITION_AHEAD_DAYS + 1):
+            day = today + timedelta(days=offset)
+            if day in existing:
+                continue
+            lower, upper = _partition_bounds(day)
+            try:
+                await self.session.execute(
+                    text(
+                        f'CREATE TABLE IF NOT EXISTS "{_partition_name(day)}" '
+                        f"PARTITION OF messages FOR VALUES FROM ('{lower.isoformat()}') "
+                        f"TO ('{upper.isoformat()}')"
+                    )
+                )
+                await self.session.commit()
+                created += 1
+            except Exception as exc:  # noqa: BLE001 — e.g. rows for that day already in default
+                await self.session.rollback()
+                logger.warning("Could not create partition for %s: %s", day, exc)
+
+        ttl_days = max(1, int(settings.MESSAGE_TTL_DAYS))
+        threshold = now_utc - timedelta(days=ttl_days)
+        archive_root = _archive_root()
+        dropped = 0
+        for day, name in sorted(existing.items()):
+            if _partition_bounds(day)[1] > threshold:
+                break
+            if archive_root is not None:
+                archived = await self._archive_partition(name, archive_root)
+                logger.info("Archived %s messages of %s", archived, name)
+            ids = f'SELECT id FROM "{name}"'
+            await self.session.execute(
+                text(f"DELETE FROM message_tags WHERE message_id IN ({ids})")
+            )
+            await self.session.execute(
+                text(f"DELETE FROM message_contexts WHERE message_id IN ({ids})")
+            )
+            await self.session.execute(text(f'ALTER TABLE messages DETACH PARTITION "{name}"'))
+            await self.session.execute(text(f'DROP TABLE "{name}"'))
+            await self.session.commit()
+            dropped += 1
+        return created, dropped
+
+    async def _archive_partition(self, name: str, root: Path) -> int:
+        """Stream every row of partition ``name`` into the cold archive."""
+        result = await self.session.stream(
+            text(f'SELECT {", ".join(ARCHIVE_COLUMNS)} FROM "{name}"').execution_options(
+                yield_per=ARCHIVE_CHUNK
+            )
+        )
+        archived = 0
+        async for chunk in result.mappings().partitions():
+            await run_in_thread(write_archive, root, chunk)
+            archived += len(chunk)
+        return archived
+
+    async def purge_old_rollups(self, *, now_utc: Optional[datetime] = None) -> int:
+        """Drop hourly stats rollups older than ``ROLLUP_RETENTION``."""
+        threshold = (now_utc or datetime.now(timezone.utc)) - ROLLUP_RETENTION
+        result = await self.session.execute(
+            delete(ChatHourlyStats).where(ChatHourlyStats.hour_start < threshold)
+        )
+        await self.session.commit()
+        return int(result.rowcount or 0)
+
+    async def purge_old_stats_history(self, *, now_utc: Optional[datetime] = None) -> int:
+        """Drop daily stats snapshots older than ``settings.STATS_HISTORY_DAYS``.
+
+        With the history turned off (``0``) every past snapshot is dropped.
+        """
+        keep_days = max(0, int(settings.STATS_HISTORY_DAYS))
+        threshold = (now_utc or datetime.now(timezone.utc)).date() - timedelta(days=keep_days)
         result = await self.session.execute(
-            delete(DBMessage).where(DBMessage.created_at < threshold)
+            delete(MessageStatsDaily).where(MessageStatsDaily.day < threshold)
         )
         await self.session.commit()
         return int(result.rowcount or 0)
@@ -76,29 +325,61 @@ class CleanupService:
         return int(result.rowcount or 0)
 
 
-async def _run_cleanup_pass() -> tuple[int, int]:
+async def _run_cleanup_pass() -> Dict[str, int]:
     from ..database.database import async_session  # local: avoid import cycle
 
     async with async_session() as session:
         service = CleanupService(session)
-        purged = await service.purge_old_messages()
-        marked = await service.mark_past_events()
-    return purged, marked
+        created, dropped = await service.maintain_partitions()
+        # Unpartitioned ``messages``: maintain_partitions already purged.
+        purged = (
+            await service.purge_old_messages()
+            if service.partitioned
+            else service.last_purge.messages
+        )
+        logger.info("Message purge: %s", service.last_purge.snapshot())
+        return {
+            "partitions_created": created,
+            "partitions_dropped": dropped,
+            "purged": purged,
+            "rollups": await service.purge_old_rollups(),
+            "history": await service.purge_old_stats_history(),
+            "marked": await service.mark_past_events(),
+        }
+
+
+async def _ensure_partitions() -> None:
+    """Create missing upcoming partitions right away (the bot may have been down)."""
+    from ..database.database import async_session  # local: avoid import cycle
+
+    try:
+        async with async_session() as session:
+            created, _ = await CleanupService(session).maintain_partitions()
+        if created:
+            logger.info("Created %s upcoming messages partitions", created)
+    except Exception as exc:  # noqa: BLE001 — никогда не валим бота из-за чистки
+        logger.error("Partition maintenance failed: %s", exc, exc_info=True)
 
 
 async def run_cleanup_scheduler() -> None:
     """Background loop: every day at 04:00 MSK run a cleanup pass."""
+    await _ensure_partitions()
     while True:
         try:
             sleep_for = seconds_until_next_cleanup()
             logger.info("Cleanup: sleeping %.0f s until next 04:00 MSK", sleep_for)
             await asyncio.sleep(sleep_for)
-            purged, marked = await _run_cleanup_pass()
+            done = await _run_cleanup_pass()
             logger.info(
-                "Cleanup pass done: purged %s old messages (TTL=%s d), marked %s events as past",
-                purged,
+                "Cleanup pass done (TTL=%s d): +%s/-%s messages partitions, purged %s old "
+                "messages, %s hourly rollups, %s daily stats snapshots, marked %s events as past",
                 settings.MESSAGE_TTL_DAYS,
-                marked,
+                done["partitions_created"],
+                done["partitions_dropped"],
+                done["purged"],
+                done["rollups"],
+                done["history"],
+                done["marked"],
             )
         except asyncio.CancelledError:
             logger.info("Cleanup scheduler cancelled")
@@ -2,20 +2,137 @@
 
 from __future__ import annotations
 
+import asyncio
 import logging
-from collections import Counter
-from typing import Any, Dict, List, Optional, Tuple
-from uuid import UUID
-
-from sqlalchemy import select
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from uuid import UUID, uuid4
+
+from aiogram import Bot
+from sqlalchemy import String, any_, bindparam, distinct, func, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from ..database.database import async_session
 from ..database.models import DBMessage, MessageContext, MessageTag, MessageThread, Tag
+from .message_analysis import message_analyzer
 from .openai_service import OpenAIService
 from .prompts import load_prompt
+from .user_profiles import resolve_user_names
 
 logger = logging.getLogger(__name__)
 
+# Tags listed per thread in ``get_threads_stats``.
+THREAD_TOP_TAGS = 5
+
+# Tag names → ids, shared by every ContextService in the process. Tags are
+# never renamed or deleted, so entries never go stale; the cap only bounds
+# memory if auto-tagging invents names without end.
+TAG_CACHE_SIZE = 10_000
+_tag_ids: Dict[str, UUID] = {}
+
+
+def _remember_tag_ids(resolved: Dict[str, UUID]) -> None:
+    """Cache ``resolved``; on overflow only the entries just used survive."""
+    if len(_tag_ids.keys() | resolved.keys()) > TAG_CACHE_SIZE:
+        _tag_ids.clear()
+    _tag_ids.update(resolved)
+
+
+# --------------------------------------------------------------------------- #
+# Debounced thread summaries                                                  #
+# --------------------------------------------------------------------------- #
+
+# A thread is re-summarized after this many new messages...
+SUMMARY_MIN_MESSAGES = 20
+# ...or once it has been quiet this long after its last new message.
+SUMMARY_QUIET = timedelta(minutes=10)
+# Threads summarized at once across the process (each is one LLM call).
+SUMMARY_CONCURRENCY = 2
+SUMMARY_POLL_SECONDS = 60
+# Newest new messages sent per update; older ones only live on in the summary.
+SUMMARY_DELTA_LIMIT = 50
+
+
+@dataclass
+class _PendingThread:
+    new_messages: int = 0
+    last_at: float = 0.0  # monotonic
+
+
+_pending_threads: Dict[UUID, _PendingThread] = {}
+
+
+def note_thread_message(thread_id: UUID, *, count: int = 1) -> None:
+    """Record new messages in ``thread_id`` for the summarizer (called on ingest)."""
+    pending = _pending_threads.setdefault(thread_id, _PendingThread())
+    pending.new_messages += count
+    pending.last_at = time.monotonic()
+
+
+def take_due_threads(now: Optional[float] = None) -> Dict[UUID, int]:
+    """Pop the threads due for a summary → their count of new messages.
+
+    Due means ``SUMMARY_MIN_MESSAGES`` new messages, or any new messages and
+    ``SUMMARY_QUIET`` without another one.
+    """
+    now = time.monotonic() if now is None else now
+    quiet = SUMMARY_QUIET.total_seconds()
+    due = {
+        thread_id: pending.new_messages
+        for thread_id, pending in _pending_threads.items()
+        if pending.new_messages >= SUMMARY_MIN_MESSAGES or now - pending.last_at >= quiet
+    }
+    for thread_id in due:
+        del _pending_threads[thread_id]
+    return due
+
+
+async def summarize_due_threads() -> int:
+    """Update the summaries of all due threads, ``SUMMARY_CONCURRENCY`` at a time.
+
+    Each thread gets its own session. A thread that fails goes back to the
+    pending set. Returns the number of summaries written.
+    """
+    due = take_due_threads()
+    if not due:
+        return 0
+    semaphore = asyncio.Semaphore(SUMMARY_CONCURRENCY)
+
+    async def _summarize(thread_id: UUID, new_messages: int) -> bool:
+        async with semaphore, async_session() as session:
+            try:
+                return await ContextService(session).update_thread_context(thread_id)
+            except Exception as exc:  # noqa: BLE001 — продолжаем по другим тредам
+                logger.warning("Thread summary failed for %s: %s", thread_id, exc)
+                await session.rollback()
+                note_thread_message(thread_id, count=new_messages)
+                return False
+
+    results = await asyncio.gather(*(_summarize(t, n) for t, n in due.items()))
+    return sum(results)
+
+
+async def run_thread_summarizer() -> None:
+    """Background loop: every minute summarize the threads that are due."""
+    logger.info("Thread summarizer started")
+    while True:
+        await asyncio.sleep(SUMMARY_POLL_SECONDS)
+        try:
+            updated = await summarize_due_threads()
+            if updated:
+                logger.debug("Thread summaries updated: %s", updated)
+        except asyncio.CancelledError:
+            logger.info("Thread summarizer cancelled")
+            raise
+        except Exception as exc:  # noqa: BLE001
+            logger.error("Thread summarizer error: %s", exc, exc_info=True)
+
 
 class ContextService:
     """Threads, contexts and tags around the message stream."""
@@ -55,63 +172,110 @@ class ContextService:
         return new_thread
 
     async def analyze_message(self, message: DBMessage) -> Tuple[List[str], float]:
-        """Use the LLM to suggest tags and an importance score."""
-        prompt = load_prompt("TECH-001_message_analysis")
-        response = await self.openai.chat_completion(prompt.format(message=message.text or ""))
-        return _parse_message_analysis(response)
-
-    async def get_or_create_tags(self, tag_names: List[str]) -> List[Tag]:
-        """Resolve a list of tag names to ``Tag`` rows, creating missing ones."""
-        tags: List[Tag] = []
-        for name in tag_names:
-            clean = name.strip().lstrip("#")
-            if not clean:
-                continue
-            result = await self.session.execute(select(Tag).where(Tag.name == clean))
-            tag = result.scalar_one_or_none()
-            if tag is None:
-                tag = Tag(name=clean)
-                self.session.add(tag)
+        """Use the LLM to suggest tags and an importance score.
+
+        Goes through the shared micro-batcher: messages of the same chat
+        arriving together are analyzed in one request.
+        """
+        return await message_analyzer.analyze(message.chat_id, message.text or "")
+
+    async def resolve_tag_ids(self, tag_names: Iterable[str]) -> List[UUID]:
+        """Resolve tag names to ids, creating missing tags.
+
+        Names are stripped of ``#`` and de-duplicated (order kept). Cached
+        names cost nothing; the rest take one ``SELECT ... WHERE name =
+        ANY(...)`` and, for names still unknown, one ``INSERT ... ON CONFLICT
+        DO NOTHING RETURNING`` committed once. A conflicting insert (another
+        worker created the tag meanwhile) is picked up by a second SELECT.
+        """
+        names = list(dict.fromkeys(n.strip().lstrip("#") for n in tag_names))
+        names = [n for n in names if n]
+        resolved = {n: _tag_ids[n] for n in names if n in _tag_ids}
+        missing = [n for n in names if n not in resolved]
+        if missing:
+            found = await self._select_tag_ids(missing)
+            new = [n for n in missing if n not in found]
+            if new:
+                now = datetime.utcnow()
+                result = await self.session.execute(
+                    pg_insert(Tag)
+                    .values([{"id": uuid4(), "name": n, "created_at": now} for n in new])
+                    .on_conflict_do_nothing(index_elements=[Tag.name])
+                    .returning(Tag.name, Tag.id)
+                )
+                found.update({name: tag_id for name, tag_id in result.all()})
                 await self.session.commit()
-            tags.append(tag)
-        return tags
+                raced = [n for n in new if n not in found]
+                if raced:
+                    found.update(await self._select_tag_ids(raced))
+            resolved.update(found)
+            _remember_tag_ids(resolved)
+        return [resolved[n] for n in names if n in resolved]
+
+    async def _select_tag_ids(self, names: List[str]) -> Dict[str, UUID]:
+        result = await self.session.execute(
+            select(Tag.name, Tag.id).where(
+                Tag.name == any_(bindparam("names", names, type_=ARRAY(String)))
+            )
+        )
+        return {name: tag_id for name, tag_id in result.all()}
 
     async def add_tags_to_message(
         self,
         message: DBMessage,
-        tags: List[Tag],
+        tag_ids: Iterable[UUID],
         is_auto: bool = True,
     ) -> None:
-        """Attach a list of tags to a message."""
-        for tag in tags:
-            self.session.add(MessageTag(message_id=message.id, tag_id=tag.id, is_auto=is_auto))
+        """Attach tags (by id, see :meth:`resolve_tag_ids`) to a message."""
+        for tag_id in tag_ids:
+            self.session.add(MessageTag(message_id=message.id, tag_id=tag_id, is_auto=is_auto))
         await self.session.commit()
 
-    async def update_thread_context(self, thread: MessageThread) -> None:
-        """Refresh the rolling context summary of a thread from its last messages."""
+    async def update_thread_context(self, thread_id: UUID) -> bool:
+        """Fold the thread's new messages into its rolling context summary.
+
+        Only messages newer than ``summary_through`` are sent, together with
+        the previous summary (at most ``SUMMARY_DELTA_LIMIT``, the newest).
+        A thread without a summary yet is summarized from scratch. Returns
+        ``False`` when there was nothing new.
+        """
         result = await self.session.execute(
-            select(DBMessage)
-            .where(DBMessage.thread_id == thread.id)
-            .order_by(DBMessage.created_at.desc())
-            .limit(10)
+            select(MessageContext).where(
+                MessageContext.thread_id == thread_id,
+                MessageContext.message_id.is_(None),
+            )
         )
-        messages = list(result.scalars().all())
-        if not messages:
-            return
-
-        prompt = load_prompt("TECH-001_thread_summary")
-        messages_text = "\n".join(f"- {msg.text}" for msg in messages if msg.text)
-        summary = await self.openai.chat_completion(prompt.format(messages_text=messages_text))
+        context = result.scalar_one_or_none()
 
+        query = select(DBMessage).where(
+            DBMessage.thread_id == thread_id, DBMessage.text.is_not(None)
+        )
+        if context is not None and context.summary_through is not None:
+            query = query.where(DBMessage.created_at > context.summary_through)
         result = await self.session.execute(
-            select(MessageContext).where(MessageContext.thread_id == thread.id)
+            query.order_by(DBMessage.created_at.desc()).limit(SUMMARY_DELTA_LIMIT)
         )
-        context = result.scalar_one_or_none()
-        if context is not None:
-            context.context_summary = summary
+        messages = list(reversed(result.scalars().all()))
+        if not messages:
+            return False
+
+        messages_text = "\n".join(f"- {msg.text}" for msg in messages)
+        previous = context.context_summary if context is not None else None
+        if previous:
+            prompt = load_prompt("TECH-001_thread_summary_update").format(
+                previous_summary=previous, messages_text=messages_text
+            )
         else:
-            self.session.add(MessageContext(thread_id=thread.id, context_summary=summary))
+            prompt = load_prompt("TECH-001_thread_summary").format(messages_text=messages_text)
+        summary = await self.openai.chat_completion(prompt)
+
+        if context is None:
+            context = MessageContext(thread_id=thread_id)
+            self.session.add(context)
+        context.context_summary = summary
+        context.summary_through = messages[-1].created_at
         await self.session.commit()
+        return True
 
     async def find_related_threads(self, thread: MessageThread) -> List[MessageThread]:
         """Find threads with semantically similar context summaries."""
@@ -151,44 +315,56 @@ class ContextService:
 
     async def get_thread_stats(self, thread: MessageThread) -> Dict[str, Any]:
         """Return a small dict with thread statistics, or ``{}`` if empty."""
-        result = await self.session.execute(
-            select(DBMessage).where(DBMessage.thread_id == thread.id)
-        )
-        messages = list(result.scalars().all())
-        if not messages:
+        stats = await self.get_threads_stats([thread.id])
+        return stats.get(thread.id, {})
+
+    async def get_threads_stats(self, thread_ids: Sequence[UUID]) -> Dict[UUID, Dict[str, Any]]:
+        """Statistics for several threads in one aggregate query.
+
+        Counts, distinct users, first/last time and average length come from
+        a ``GROUP BY thread_id`` over ``messages``; the top tags per thread
+        from a ranked tag-count CTE folded in as an array. Nothing is loaded
+        into the ORM. Threads without messages are absent from the result.
+        """
+        if not thread_ids:
             return {}
-
-        message_count = len(messages)
-        unique_users = len({msg.user_id for msg in messages})
-
-        first_msg = min(messages, key=lambda m: m.created_at)
-        last_msg = max(messages, key=lambda m: m.created_at)
-        duration_hours = max(
-            0.0,
-            (last_msg.created_at - first_msg.created_at).total_seconds() / 3600.0,
+        ids = bindparam("thread_ids", list(thread_ids), type_=ARRAY(PG_UUID(as_uuid=True)))
+        ranked = (
+            select(
+                DBMessage.thread_id,
+                Tag.name,
+                func.row_number()
+                .over(
+                    partition_by=DBMessage.thread_id,
+                    order_by=(func.count().desc(), Tag.name),
+                )
+                .label("rank"),
+            )
+            .join(MessageTag, MessageTag.message_id == DBMessage.id)
+            .join(Tag, Tag.id == MessageTag.tag_id)
+            .where(DBMessage.thread_id == any_(ids))
+            .group_by(DBMessage.thread_id, Tag.name)
+            .cte("tag_ranks")
         )
-
-        avg_message_length = sum(len(m.text or "") for m in messages) / message_count
-        messages_per_hour = (
-            message_count / duration_hours if duration_hours else float(message_count)
+        top_tags = (
+            select(func.array_agg(aggregate_order_by(ranked.c.name, ranked.c.rank)))
+            .where(ranked.c.thread_id == DBMessage.thread_id, ranked.c.rank <= THREAD_TOP_TAGS)
+            .scalar_subquery()
         )
-
-        tag_counter: Counter[str] = Counter()
-        for msg in messages:
-            for mt in msg.tags or []:
-                if mt.tag is not None:
-                    tag_counter[mt.tag.name] += 1
-        top_tags = [name for name, _ in tag_counter.most_common(5)]
-
-        return {
-            "message_count": message_count,
-            "total_messages": message_count,  # backwards-compatible alias
-            "unique_users": unique_users,
-            "duration_hours": duration_hours,
-            "avg_message_length": avg_message_length,
-            "messages_per_hour": messages_per_hour,
-            "top_tags": top_tags,
-        }
+        result = await self.session.execute(
+            select(
+                DBMessage.thread_id,
+                func.count(),
+                func.count(distinct(DBMessage.user_id)),
+                func.min(DBMessage.created_at),
+                func.max(DBMessage.created_at),
+                func.avg(func.length(func.coalesce(DBMessage.text, ""))),
+                top_tags,
+            )
+            .where(DBMessage.thread_id == any_(ids))
+            .group_by(DBMessage.thread_id)
+        )
+        return {row[0]: _thread_stats(*row[1:]) for row in result.all()}
 
     async def get_context_for_summary(self, chat_id: UUID) -> str:
         """Return a brief context summary for a chat (latest active thread)."""
@@ -199,30 +375,16 @@ class ContextService:
         context = result.scalar_one_or_none()
         return context.context_summary if context and context.context_summary else ""
 
-    async def generate_chat_summary(self, messages: List[DBMessage]) -> str:
+    async def generate_chat_summary(
+        self, messages: List[DBMessage], *, bot: Bot, chat_telegram_id: int
+    ) -> str:
         """Generate a friendly retelling of the given messages."""
         if not messages:
             return "No messages to summarize."
 
-        first_msg = messages[0]
-        chat = first_msg.chat
-        user_ids = {msg.user_id for msg in messages}
-        user_names: Dict[int, str] = {}
-
-        for user_id in user_ids:
-            try:
-                member = await first_msg.bot.get_chat_member(chat.telegram_id, user_id)
-                if member and member.user:
-                    full = member.user.first_name or ""
-                    if member.user.last_name:
-                        full = f"{full} {member.user.last_name}".strip()
-                    user_names[user_id] = full or f"User {user_id}"
-                else:
-                    user_names[user_id] = f"User {user_id}"
-            except Exception as exc:  # noqa: BLE001 — TG API может отдать что угодно
-                logger.warning("Could not resolve user %s: %s", user_id, exc)
-                user_names[user_id] = f"User {user_id}"
-
+        user_names = await resolve_user_names(
+            self.session, bot, chat_telegram_id, (msg.user_id for msg in messages)
+        )
         messages_text = "\n".join(
             f"{msg.created_at.strftime('%Y-%m-%d %H:%M')} - "
             f"{user_names.get(msg.user_id, f'User {msg.user_id}')}: {msg.text}"
@@ -233,19 +395,23 @@ class ContextService:
         return await self.openai.chat_completion(prompt.format(messages_text=messages_text))
 
 
-def _parse_message_analysis(response: str) -> Tuple[List[str], float]:
-    """Parse the ``tags: ...`` / ``importance: 0.X`` response from the LLM."""
-    tags: List[str] = []
-    importance = 0.5
-    for line in response.splitlines():
-        line = line.strip()
-        if line.lower().startswith("tags:"):
-            _, _, raw = line.partition(":")
-            tags = [t.strip() for t in raw.split(",") if t.strip()]
-        elif line.lower().startswith("importance:"):
-            _, _, raw = line.partition(":")
-            try:
-                importance = float(raw.strip())
-            except ValueError:
-                importance = 0.5
-    return tags, max(0.0, min(1.0, importance))
+def _thread_stats(
+    message_count: int,
+    unique_users: int,
+    first_at: datetime,
+    last_at: datetime,
+    avg_length: Any,
+    top_tags: Optional[List[str]],
+) -> Dict[str, Any]:
+    duration_hours = max(0.0, (last_at - first_at).total_seconds() / 3600.0)
+    return {
+        "message_count": message_count,
+        "total_messages": message_count,  # backwards-compatible alias
+        "unique_users": unique_users,
+        "duration_hours": duration_hours,
+        "avg_message_length": float(avg_length or 0),
+        "messages_per_hour": (
+            message_count / duration_hours if duration_hours else float(message_count)
+        ),
+        "top_tags": list(top_tags or []),
+    }
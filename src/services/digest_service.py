@@ -8,16 +8,21 @@ service:
 3. Calls OpenAI in JSON mode with a classification-specific prompt
    (``business`` / ``private`` / ``mixed``; defaults to ``business``);
 4. Persists new commits/events, marks any closed commits as done/cancelled,
-   auto-flags urgency for ≤24h deadlines;
-5. Renders a MarkdownV2 block per chat and sends it to ``OWNER_ID``.
+   auto-flags urgency for ≤24h deadlines (bulk INSERT/UPDATE per chat, one
+   transaction for the whole run);
+5. Renders a MarkdownV2 block per chat and sends it to ``OWNER_ID`` via the
+   shared rate-aware outbox (``outbox_service``).
 
 After all chats are processed it runs a classifier on every
-``classification IS NULL`` chat that had messages today and posts a
-suggestion message with inline buttons. The owner taps a button to commit
+``classification IS NULL`` chat that had messages today (several chats per
+LLM request, see ``classify_and_send_cards``) and posts a suggestion
+message with inline buttons. The owner taps a button to commit
 the bucket; from the next day onwards, the chat-specific prompt is used.
 
 Idempotency: every successful automatic send is recorded in
-``daily_digests``; manual ``/digest`` runs do not record.
+``daily_digests``; manual ``/digest`` runs do not record. Past days that
+have a recorded body are re-sent from ``daily_digests.body_md`` instead of
+being rebuilt (see ``send_stored``).
 """
 
 from __future__ import annotations
@@ -26,22 +31,28 @@ import asyncio
 import json
 import logging
 import re
-from dataclasses import dataclass
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from datetime import date, datetime, time, timedelta, timezone
-from typing import Any, Dict, List, Optional, Sequence
-from uuid import UUID
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from uuid import UUID, uuid4
 from zoneinfo import ZoneInfo
 
 from aiogram import Bot
-from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
-from sqlalchemy import or_, select
+from sqlalchemy import any_, bindparam, case, insert, or_, select, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..config import settings
 from ..database.models import Chat, Commitment, DailyDigest, DBMessage, Event
-from .md import SAFE_LIMIT, chunk_md, md_escape
+from .executors import run_in_thread
+from .md import md_escape
 from .openai_service import OpenAIService
+from .outbox_service import outbox_for
 from .prompts import load_prompt
 
 logger = logging.getLogger(__name__)
@@ -60,11 +71,22 @@ PROMPT_BY_CLASSIFICATION: Dict[str, str] = {
 }
 DEFAULT_PROMPT_NAME = PROMPT_BY_CLASSIFICATION["business"]
 
+# Classification suggestions: several chats share one JSON-mode request.
+# A batch is closed by whichever limit is hit first; each chat's sample is
+# truncated so one chatty contact can't crowd the others out.
+CLASSIFY_BATCH_SIZE = 8
+CLASSIFY_BATCH_MAX_CHARS = 24000
+CLASSIFY_SAMPLE_MAX_CHARS = 3000
+# Max in-flight classifier requests (batches and single-chat fallbacks).
+CLASSIFY_CONCURRENCY = 3
+
 
 @dataclass
 class _ChatDigestItem:
     chat: Chat
     messages: List[DBMessage]
+    # Built by ``_extract`` from the formatted transcript; reused by ``_persist``.
+    index: Optional["_MessageIndex"] = field(default=None, repr=False)
 
 
 # --------------------------------------------------------------------------- #
@@ -327,35 +349,97 @@ def _normalize_deadline_phrase(raw: str) -> Optional[str]:
     return text
 
 
-def parse_deadline(raw: Optional[str], *, now_utc: Optional[datetime] = None) -> Optional[datetime]:
-    """Best-effort NL → tz-aware datetime parser.
+# Fast path (most normalised phrases have one of a handful of shapes).
+# ``dateparser`` costs milliseconds per call plus a heavy first import; the
+# shapes below are resolved arithmetically with **exactly** dateparser's
+# semantics for them (see ``tests/test_digest_service.py`` corpus test):
+#
+# - ``<weekday> HH:MM`` — next such weekday, strictly after today;
+# - ``сегодня|завтра|послезавтра HH:MM`` — that day, time as-is;
+# - ``YYYY-MM-DD [HH:MM]`` — that date, 00:00 when no time;
+# - ``HH:MM`` — today, or tomorrow when already past (dateparser quirk
+#   reproduced: it compares the naive Moscow "now" with the candidate
+#   shifted by the Moscow UTC offset; a roll-over into the next month is
+#   left to dateparser).
+#
+# An optional leading "в" is accepted ("в пн утром" → "в понедельник 09:00").
+# Anything else — and any out-of-range value — goes to dateparser.
+_WEEKDAY_INDEX = {
+    "понедельник": 0,
+    "вторник": 1,
+    "среда": 2,
+    "четверг": 3,
+    "пятница": 4,
+    "суббота": 5,
+    "воскресенье": 6,
+}
+_RELATIVE_DAY_OFFSET = {"сегодня": 0, "завтра": 1, "послезавтра": 2}
+_FAST_DEADLINE_RE = re.compile(
+    r"^(?:в\s+)?"
+    r"(?:(?P<word>" + "|".join((*_WEEKDAY_INDEX, *_RELATIVE_DAY_OFFSET)) + r")"
+    r"|(?P<y>\d{4})-(?P<mo>\d{2})-(?P<d>\d{2}))?"
+    r"(?:\s*(?<![^\s])(?P<h>\d{1,2}):(?P<mi>\d{2}))?$"
+)
 
-    Uses ``dateparser`` with Russian locale and Europe/Moscow as the base
-    timezone. Returns ``None`` if parsing fails or input is empty. Always
-    returns a tz-aware UTC datetime to keep DB writes consistent.
 
-    Russian phrasing (cases, prepositions, "выходные"/"конец дня") is
-    pre-normalised — see ``_normalize_deadline_phrase``.
+def _fast_parse_deadline(normalised: str, relative_base: datetime) -> Optional[datetime]:
+    """Resolve the common normalised shapes without dateparser.
+
+    ``relative_base`` is naive Moscow wall-clock "now". Returns an aware
+    Moscow datetime, or ``None`` if the phrase needs the full parser.
     """
-    if not raw:
+    m = _FAST_DEADLINE_RE.match(normalised)
+    if m is None:
+        return None
+    word, year, hour = m.group("word"), m.group("y"), m.group("h")
+    if hour is None and word is None and year is None:
         return None
     try:
-        import dateparser  # local import — heavy module
-    except ImportError:  # pragma: no cover — dependency is required at runtime
+        hh, mm = (int(hour), int(m.group("mi"))) if hour is not None else (0, 0)
+        if hour is not None and not (0 <= hh <= 23 and 0 <= mm <= 59):
+            return None
+        if year is not None:
+            day = date(int(year), int(m.group("mo")), int(m.group("d")))
+        elif word is None:
+            day = relative_base.date()
+        elif word in _RELATIVE_DAY_OFFSET:
+            if hour is None:
+                return None  # bare "завтра" keeps dateparser's clock-time semantics
+            day = relative_base.date() + timedelta(days=_RELATIVE_DAY_OFFSET[word])
+        else:
+            if hour is None:
+                return None
+            ahead = (_WEEKDAY_INDEX[word] - relative_base.weekday()) % 7 or 7
+            day = relative_base.date() + timedelta(days=ahead)
+    except ValueError:  # e.g. "2026-02-30" — let dateparser decide
         return None
 
-    normalised = _normalize_deadline_phrase(raw)
-    if normalised is None:
+    candidate = datetime.combine(day, time(hh, mm))
+    if word is None and year is None:
+        offset = OWNER_TZ.utcoffset(candidate) or timedelta(0)
+        if relative_base > candidate - offset:
+            candidate += timedelta(days=1)
+            if candidate.month != relative_base.month:
+                # dateparser re-applies the current month/year after the
+                # roll-over ("18:00" on 31 Jul → 1 Jul). Keep its answer.
+                return None
+    return candidate.replace(tzinfo=OWNER_TZ)
+
+
+def _dateparser_deadline(normalised: str, relative_base: datetime) -> Optional[datetime]:
+    """Full ``dateparser`` resolution; aware datetime (Moscow) or ``None``."""
+    try:
+        import dateparser  # local import — heavy module
+    except ImportError:  # pragma: no cover — dependency is required at runtime
         return None
 
-    relative_base = (now_utc or datetime.now(timezone.utc)).astimezone(OWNER_TZ)
     parsed = dateparser.parse(
         normalised,
         languages=["ru", "en"],
         settings={
             "TIMEZONE": "Europe/Moscow",
             "RETURN_AS_TIMEZONE_AWARE": True,
-            "RELATIVE_BASE": relative_base.replace(tzinfo=None),
+            "RELATIVE_BASE": relative_base,
             "PREFER_DATES_FROM": "future",
         },
     )
@@ -363,6 +447,122 @@ def parse_deadline(raw: Optional[str], *, now_utc: Optional[datetime] = None) ->
         return None
     if parsed.tzinfo is None:
         parsed = parsed.replace(tzinfo=OWNER_TZ)
+    return parsed
+
+
+# Memo for resolved deadlines. One digest run sees the same handful of
+# phrases ("до пятницы", "завтра", "до конца дня") over and over; a hit
+# skips dateparser entirely. Key: (normalised phrase, Moscow reference date,
+# reference hour or ``None``):
+#
+# - phrases the fast path resolves are date-anchored → no hour;
+# - dateparser fallbacks ("через 2 часа", "12 мая", a bare weekday the fast
+#   regex matches but can't resolve) may depend on the clock → per hour;
+# - bare "HH:MM" rolls to tomorrow at minute precision and is cheap anyway
+#   → never cached (counted as ``bypassed``).
+#
+# Normalisation itself is memoised separately on the raw phrase.
+DEADLINE_MEMO_SIZE = 2048
+
+
+@dataclass
+class DeadlineMemoStats:
+    hits: int = 0
+    misses: int = 0
+    bypassed: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "size": len(_deadline_memo),
+            "hit_rate": round(self.hit_rate, 3),
+        }
+
+
+_deadline_memo: "OrderedDict[Tuple[str, date, Optional[int]], Optional[datetime]]" = OrderedDict()
+deadline_memo_stats = DeadlineMemoStats()
+# ``_persist`` resolves deadlines on the shared thread pool (see executors).
+_deadline_memo_lock = threading.Lock()
+
+
+@lru_cache(maxsize=DEADLINE_MEMO_SIZE)
+def _normalize_cached(phrase: str, year: int) -> Optional[str]:
+    # ``year`` is only part of the key: "12.05" is completed with the
+    # current year, so the cache must not outlive New Year.
+    return _normalize_deadline_phrase(phrase)
+
+
+def clear_deadline_memo() -> None:
+    """Drop memoised deadlines and reset counters (tests, benchmarks)."""
+    _deadline_memo.clear()
+    _normalize_cached.cache_clear()
+    deadline_memo_stats.hits = deadline_memo_stats.misses = deadline_memo_stats.bypassed = 0
+
+
+def parse_deadline(raw: Optional[str], *, now_utc: Optional[datetime] = None) -> Optional[datetime]:
+    """Best-effort NL → tz-aware datetime parser.
+
+    Uses ``dateparser`` with Russian locale and Europe/Moscow as the base
+    timezone. Returns ``None`` if parsing fails or input is empty. Always
+    returns a tz-aware UTC datetime to keep DB writes consistent.
+
+    Russian phrasing (cases, prepositions, "выходные"/"конец дня") is
+    pre-normalised — see ``_normalize_deadline_phrase``. Common normalised
+    shapes are resolved by ``_fast_parse_deadline`` without dateparser, and
+    results are memoised per reference day (see ``DEADLINE_MEMO_SIZE``).
+    """
+    if not raw:
+        return None
+
+    normalised = _normalize_cached(raw.strip().lower(), datetime.now().year)
+    if normalised is None:
+        return None
+
+    relative_base = (now_utc or datetime.now(timezone.utc)).astimezone(OWNER_TZ)
+    relative_base = relative_base.replace(tzinfo=None)
+    match = _FAST_DEADLINE_RE.match(normalised)
+    if match is not None and not (match.group("word") or match.group("y")):
+        deadline_memo_stats.bypassed += 1
+        return _resolve_deadline(normalised, relative_base)
+
+    # Only a fast-path answer is date-anchored; a shape that matches the fast
+    # regex but still needs dateparser (e.g. bare "пятница") keys on the hour.
+    day_key = (normalised, relative_base.date(), None)
+    hour_key = (normalised, relative_base.date(), relative_base.hour)
+    with _deadline_memo_lock:
+        for key in (day_key, hour_key) if match is not None else (hour_key,):
+            if key in _deadline_memo:
+                _deadline_memo.move_to_end(key)
+                deadline_memo_stats.hits += 1
+                return _deadline_memo[key]
+        deadline_memo_stats.misses += 1
+
+    fast = _fast_parse_deadline(normalised, relative_base) if match is not None else None
+    if fast is not None:
+        key, parsed = day_key, fast.astimezone(timezone.utc)
+    else:
+        key, parsed = hour_key, _resolve_deadline(normalised, relative_base)
+    with _deadline_memo_lock:
+        _deadline_memo[key] = parsed
+        if len(_deadline_memo) > DEADLINE_MEMO_SIZE:
+            _deadline_memo.popitem(last=False)
+    return parsed
+
+
+def _resolve_deadline(normalised: str, relative_base: datetime) -> Optional[datetime]:
+    """Fast path, then dateparser; UTC-aware result or ``None``."""
+    parsed = _fast_parse_deadline(normalised, relative_base)
+    if parsed is None:
+        parsed = _dateparser_deadline(normalised, relative_base)
+    if parsed is None:
+        return None
     return parsed.astimezone(timezone.utc)
 
 
@@ -450,7 +650,82 @@ def _normalize_for_match(s: Optional[str]) -> str:
     return " ".join((s or "").lower().strip().split())
 
 
-def _sanitize_extracted(extracted: Dict[str, Any], messages_text: str) -> Dict[str, Any]:
+_DIGIT_RUN_RE = re.compile(r"\d+")
+# Digits right before a ":" that is followed by two more digits ("18:00").
+_CLOCK_RE = re.compile(r"(\d+):(?=(\d{2}))")
+_SENTENCE_SPLIT_RE = re.compile(r"[.!?…]+\s*")
+
+
+@dataclass
+class _MessageIndex:
+    """Per-chat lookup tables built in one pass over the formatted transcript.
+
+    The sanitizer used to substring-scan the whole transcript for every
+    event time/date; the index answers the same questions with set lookups.
+    Semantics are unchanged on purpose: ``times`` / ``day_numbers`` hold
+    every string those substring checks could have matched ("8:00" is
+    "in" "18:00", "2" is "in" "12"), not just whole tokens.
+    """
+
+    times: set[str] = field(default_factory=set)  # "H:MM" and "HH:MM" forms
+    day_numbers: set[str] = field(default_factory=set)  # 1–2 digit substrings
+    # Normalised source sentence → urgency flag; extended lazily by
+    # ``is_urgent`` so repeated item texts cost one dict lookup.
+    sentences: Dict[str, bool] = field(default_factory=dict)
+    _keys: Dict[str, str] = field(default_factory=dict, repr=False)
+
+    def has_time(self, hh: str, mm: str) -> bool:
+        return f"{hh}:{mm}" in self.times or f"{int(hh):02d}:{mm}" in self.times
+
+    def has_day(self, day: str) -> bool:
+        return day in self.day_numbers
+
+    def key(self, text: Optional[str]) -> str:
+        """Memoised ``_normalize_for_match`` (dedupe keys repeat a lot)."""
+        raw = text or ""
+        cached = self._keys.get(raw)
+        if cached is None:
+            cached = self._keys[raw] = _normalize_for_match(raw)
+        return cached
+
+    def is_urgent(self, text: Optional[str]) -> bool:
+        """``has_urgency_keyword`` with per-chat memo over normalised text."""
+        if not text:
+            return False
+        k = self.key(text)
+        hit = self.sentences.get(k)
+        if hit is None:
+            hit = self.sentences[k] = has_urgency_keyword(text)
+        return hit
+
+
+def _build_message_index(messages_text: str) -> _MessageIndex:
+    """Scan the transcript once (line by line) and fill a :class:`_MessageIndex`."""
+    index = _MessageIndex()
+    for line in (messages_text or "").lower().splitlines():
+        for m in _DIGIT_RUN_RE.finditer(line):
+            run = m.group(0)
+            index.day_numbers.update(
+                run[i : i + n] for n in (1, 2) for i in range(len(run) - n + 1)
+            )
+        for m in _CLOCK_RE.finditer(line):
+            before, after = m.group(1), m.group(2)
+            index.times.update(f"{before[-n:]}:{after}" for n in (1, 2))
+        # Drop the "Я: " / "Маша: " speaker label, keep the utterance.
+        _, sep, body = line.partition(": ")
+        for sentence in _SENTENCE_SPLIT_RE.split(body if sep else line):
+            key = _normalize_for_match(sentence)
+            if key and key not in index.sentences:
+                index.sentences[key] = bool(_URGENCY_RE.search(sentence))
+    return index
+
+
+def _sanitize_extracted(
+    extracted: Dict[str, Any],
+    messages_text: str,
+    *,
+    index: Optional[_MessageIndex] = None,
+) -> Dict[str, Any]:
     """Apply defensive filters on top of the LLM JSON before persisting.
 
     The LLM is greedy: it cheerfully creates events with fake "12 May 18:00"
@@ -471,8 +746,12 @@ def _sanitize_extracted(extracted: Dict[str, Any], messages_text: str) -> Dict[s
        the event itself, just without a fake anchor.
     6. Cross-bucket: the same text in commit & event is collapsed —
        event wins iff it has a ``when_raw``, else commit wins.
+
+    Source lookups go through ``index`` (built from ``messages_text`` when
+    not supplied).
     """
-    haystack = (messages_text or "").lower()
+    if index is None:
+        index = _build_message_index(messages_text)
     commitments = list(extracted.get("commitments") or [])
     events = list(extracted.get("events") or [])
     questions = list(extracted.get("open_questions") or [])
@@ -509,7 +788,7 @@ def _sanitize_extracted(extracted: Dict[str, Any], messages_text: str) -> Dict[s
             continue
         when_raw_orig = (e.get("when_raw") or "").strip() or None
 
-        key = (_normalize_for_match(desc), _normalize_for_match(when_raw_orig or ""))
+        key = (index.key(desc), index.key(when_raw_orig))
         if key in seen_keys:
             continue
         seen_keys.add(key)
@@ -517,16 +796,12 @@ def _sanitize_extracted(extracted: Dict[str, Any], messages_text: str) -> Dict[s
         when_raw = when_raw_orig
         if when_raw:
             time_match = _TIME_HHMM_RE.search(when_raw)
-            if time_match:
-                hh, mm = time_match.group(1), time_match.group(2)
-                # Both literal and zero-padded forms.
-                literal = f"{hh}:{mm}"
-                padded = f"{int(hh):02d}:{mm}"
-                if literal not in haystack and padded not in haystack:
-                    when_raw = None
+            # Both literal and zero-padded forms count (``has_time``).
+            if time_match and not index.has_time(time_match.group(1), time_match.group(2)):
+                when_raw = None
             if when_raw:
                 dm = _DAY_MONTH_RE.search(when_raw)
-                if dm and dm.group(1) not in haystack:
+                if dm and not index.has_day(dm.group(1)):
                     when_raw = None
 
         e["when_raw"] = when_raw
@@ -540,13 +815,13 @@ def _sanitize_extracted(extracted: Dict[str, Any], messages_text: str) -> Dict[s
     # 6: cross-bucket overlap.
     event_by_key: Dict[str, int] = {}
     for idx, e in enumerate(kept_events):
-        ekey = _normalize_for_match(e.get("description"))
+        ekey = index.key(e.get("description"))
         event_by_key.setdefault(ekey, idx)
 
     drop_commit_idx: set[int] = set()
     drop_event_idx: set[int] = set()
     for ci, c in enumerate(kept_commits):
-        ckey = _normalize_for_match(c.get("text"))
+        ckey = index.key(c.get("text"))
         if ckey in event_by_key:
             ei = event_by_key[ckey]
             if kept_events[ei].get("when_raw"):
@@ -560,6 +835,177 @@ def _sanitize_extracted(extracted: Dict[str, Any], messages_text: str) -> Dict[s
     return extracted
 
 
+# --------------------------------------------------------------------------- #
+# Helpers: bulk persistence of extracted items                                 #
+# --------------------------------------------------------------------------- #
+
+
+def _commitment_rows(
+    chat_id: UUID,
+    extracted: Dict[str, Any],
+    *,
+    now_utc: datetime,
+    index: Optional[_MessageIndex] = None,
+) -> List[Dict[str, Any]]:
+    """Turn ``extracted["commitments"]`` into column dicts for a multi-row INSERT.
+
+    Every row carries the same set of keys (multi-VALUES inserts require
+    it), including explicit ``id`` / timestamps instead of relying on
+    per-row Python defaults. ``index`` (the chat's :class:`_MessageIndex`)
+    memoises keyword-urgency checks across items.
+    """
+    urgent = index.is_urgent if index is not None else has_urgency_keyword
+    rows: List[Dict[str, Any]] = []
+    for raw in extracted.get("commitments") or []:
+        direction = raw.get("direction")
+        text = (raw.get("text") or "").strip()
+        if direction not in ("from_me", "to_me") or not text:
+            continue
+        deadline_raw = raw.get("deadline_raw")
+        deadline_at = parse_deadline(deadline_raw, now_utc=now_utc)
+        llm_urgent = bool(raw.get("is_urgent"))
+        # Urgency comes from any of: explicit LLM flag, parsed
+        # deadline within 24h, or an urgency keyword anywhere in
+        # ``deadline_raw`` / ``text`` (covers "срочно"/"asap"/"eod"
+        # even when the deadline itself is unparseable).
+        keyword_urgent = urgent(deadline_raw) or urgent(text)
+        rows.append(
+            {
+                "id": uuid4(),
+                "chat_id": chat_id,
+                "direction": direction,
+                "text": text,
+                "deadline_raw": deadline_raw,
+                "deadline_at": deadline_at,
+                "is_urgent": (
+                    llm_urgent or is_within_24h(deadline_at, now_utc=now_utc) or keyword_urgent
+                ),
+                "status": "open",
+                "source_message_id": raw.get("source_message_id"),
+                "created_at": now_utc,
+                "updated_at": now_utc,
+            }
+        )
+    return rows
+
+
+def _event_rows(
+    chat_id: UUID,
+    extracted: Dict[str, Any],
+    *,
+    now_utc: datetime,
+    index: Optional[_MessageIndex] = None,
+) -> List[Dict[str, Any]]:
+    """Turn ``extracted["events"]`` into column dicts for a multi-row INSERT."""
+    urgent = index.is_urgent if index is not None else has_urgency_keyword
+    rows: List[Dict[str, Any]] = []
+    for raw in extracted.get("events") or []:
+        description = (raw.get("description") or "").strip()
+        if not description:
+            continue
+        when_raw = raw.get("when_raw")
+        when_at = parse_deadline(when_raw, now_utc=now_utc)
+        llm_urgent = bool(raw.get("is_urgent"))
+        keyword_urgent = urgent(when_raw) or urgent(description)
+        rows.append(
+            {
+                "id": uuid4(),
+                "chat_id": chat_id,
+                "description": description,
+                "when_raw": when_raw,
+                "when_at": when_at,
+                "is_urgent": llm_urgent
+                or is_within_24h(when_at, now_utc=now_utc)
+                or keyword_urgent,
+                "status": "upcoming",
+                "source_message_id": raw.get("source_message_id"),
+                "created_at": now_utc,
+                "updated_at": now_utc,
+            }
+        )
+    return rows
+
+
+def _closure_statuses(extracted: Dict[str, Any]) -> Dict[UUID, str]:
+    """Map commitment id → new status from ``extracted["closed_commitments"]``.
+
+    Malformed ids and unknown reasons are skipped; a later entry for the
+    same id wins.
+    """
+    out: Dict[UUID, str] = {}
+    for raw in extracted.get("closed_commitments") or []:
+        cid = raw.get("id")
+        reason = raw.get("reason")
+        if not cid or reason not in ("completed", "cancelled"):
+            continue
+        try:
+            cid_uuid = UUID(str(cid))
+        except (ValueError, TypeError):
+            continue
+        out[cid_uuid] = "done" if reason == "completed" else "cancelled"
+    return out
+
+
+def _closure_update(chat_id: UUID, closures: Dict[UUID, str], *, now_utc: datetime):
+    """Single ``UPDATE ... WHERE id = ANY(:ids) AND chat_id = :chat`` for all closures.
+
+    The ``chat_id`` guard keeps the LLM from closing another chat's
+    commitment by echoing a foreign id.
+    """
+    ids = bindparam("ids", list(closures), type_=ARRAY(PG_UUID(as_uuid=True)))
+    return (
+        update(Commitment)
+        .where(Commitment.id == any_(ids), Commitment.chat_id == chat_id)
+        .values(
+            status=case(closures, value=Commitment.id, else_=Commitment.status),
+            completed_at=now_utc,
+            updated_at=now_utc,
+        )
+    )
+
+
+# --------------------------------------------------------------------------- #
+# Helpers: batched classification                                              #
+# --------------------------------------------------------------------------- #
+
+
+def _classification_sample(key: str, item: _ChatDigestItem) -> str:
+    """Render one chat for ``FEATURE-010_classify_batch`` (header + truncated transcript)."""
+    partner_label = _partner_label_for(item.chat)
+    formatted = _format_messages(
+        item.messages,
+        owner_id=settings.OWNER_ID,
+        partner_label=partner_label,
+        is_group=False,
+    )
+    if len(formatted) > CLASSIFY_SAMPLE_MAX_CHARS:
+        formatted = formatted[:CLASSIFY_SAMPLE_MAX_CHARS].rsplit("\n", 1)[0]
+    header = f"=== [{key}] Контакт: {partner_label} — сообщений: {len(item.messages)}"
+    return f"{header}\n{formatted or '(нет текстовых сообщений)'}"
+
+
+def _classification_batches(
+    items: Sequence[_ChatDigestItem],
+    *,
+    size: int = CLASSIFY_BATCH_SIZE,
+    max_chars: int = CLASSIFY_BATCH_MAX_CHARS,
+) -> List[List[Tuple[str, _ChatDigestItem]]]:
+    """Split ``items`` into keyed batches bounded by chat count and sample size."""
+    batches: List[List[Tuple[str, _ChatDigestItem]]] = []
+    current: List[Tuple[str, _ChatDigestItem]] = []
+    current_chars = 0
+    for idx, item in enumerate(items, start=1):
+        approx = min(CLASSIFY_SAMPLE_MAX_CHARS, sum(len(m.text or "") + 16 for m in item.messages))
+        if current and (len(current) >= size or current_chars + approx > max_chars):
+            batches.append(current)
+            current, current_chars = [], 0
+        current.append((f"c{idx}", item))
+        current_chars += approx
+    if current:
+        batches.append(current)
+    return batches
+
+
 # --------------------------------------------------------------------------- #
 # DigestService                                                                #
 # --------------------------------------------------------------------------- #
@@ -580,6 +1026,23 @@ class DigestService:
         )
         return result.scalar_one_or_none() is not None
 
+    async def send_stored(self, day: date) -> Optional[int]:
+        """Re-send the recorded ``daily_digests.body_md`` for ``day``.
+
+        Returns the recorded chat count, or ``None`` when there is no stored
+        body (no automatic run that day, or a pre-TECH-010 row) — the caller
+        should then rebuild. No LLM calls, no commit/event writes: the owner
+        gets exactly what was sent that night, even after the TTL purge.
+        """
+        result = await self.session.execute(
+            select(DailyDigest).where(DailyDigest.digest_date == day)
+        )
+        entry = result.scalar_one_or_none()
+        if entry is None or not entry.body_md:
+            return None
+        await self._send_md(entry.body_md)
+        return int(entry.chat_count or 0)
+
     async def collect(self, day: date) -> List[_ChatDigestItem]:
         """Eligible chats with messages on ``day``.
 
@@ -617,7 +1080,12 @@ class DigestService:
         return items
 
     async def send_for_day(self, day: date, *, record: bool = True) -> int:
-        """Build and send the digest. Returns the number of chats summarised."""
+        """Build and send the digest. Returns the number of chats summarised.
+
+        Raises ``RuntimeError`` (after rolling back) when not a single
+        message reached the owner, so the day is not recorded as sent and
+        the catch-up retries it.
+        """
         if record and await self.already_sent(day):
             logger.info("Digest for %s already sent, skipping", day)
             return -1
@@ -625,24 +1093,32 @@ class DigestService:
         items = await self.collect(day)
         date_str = day.strftime("%d.%m.%Y")
         body_parts: List[str] = []  # captured for daily_digests.body_md
+        delivered = 0  # messages that actually reached the owner
 
         if not items:
             quiet = f"📊 Дайджест за {date_str}\n" "Тихий день — ни в одном чате не было сообщений."
-            await self.bot.send_message(settings.OWNER_ID, quiet)
+            if await outbox_for(self.bot).send(settings.OWNER_ID, quiet) is not None:
+                delivered += 1
             body_parts.append(quiet)
         else:
             header = self._render_header(items, date_str)
-            await self._send_md(header)
+            delivered += await self._send_md(header)
             body_parts.append(header)
 
             for item in items:
-                block = await self._process_and_send_chat(item, day)
+                block, block_delivered = await self._process_and_send_chat(item, day)
+                delivered += block_delivered
                 body_parts.append(block)
 
             # Classification suggestions only after the day's prose is done
             # so the owner sees the digest first, then the meta-questions.
             await self._suggest_classifications(items)
 
+        if not delivered:
+            # The outbox logs and swallows send failures; without this the
+            # day would be recorded (and never retried) with nothing sent.
+            await self.session.rollback()
+            raise RuntimeError(f"Digest for {day} was not delivered to the owner")
         if record:
             entry = DailyDigest(
                 digest_date=day,
@@ -652,7 +1128,11 @@ class DigestService:
                 body_md="\n\n".join(body_parts) if body_parts else None,
             )
             self.session.add(entry)
-            await self.session.commit()
+        # One transaction per digest run: per-chat commits/events/closures
+        # were written inside SAVEPOINTs by ``_persist`` and land together
+        # with the ``daily_digests`` row (if any).
+        await self.session.commit()
+        logger.info("Digest for %s: deadline memo %s", day, deadline_memo_stats.snapshot())
         return len(items)
 
     # ---- internals ---- #
@@ -665,11 +1145,14 @@ class DigestService:
             f"_групповых: {groups}, личных: {privates}_"
         )
 
-    async def _process_and_send_chat(self, item: _ChatDigestItem, day: date) -> str:
-        """Render and send a single chat block; return the rendered MarkdownV2."""
+    async def _process_and_send_chat(self, item: _ChatDigestItem, day: date) -> Tuple[str, int]:
+        """Render and send a single chat block.
+
+        Returns the rendered MarkdownV2 and the number of chunks delivered.
+        """
         try:
             extracted = await self._extract(item, day)
-            await self._persist(item.chat, extracted)
+            await self._persist(item.chat, extracted, index=item.index)
             block = self._render_block(item, extracted)
         except Exception as exc:  # noqa: BLE001 — не валим весь дайджест из-за одного чата
             logger.error(
@@ -680,8 +1163,7 @@ class DigestService:
             )
             title = md_escape(item.chat.name or f"Chat {item.chat.telegram_id}")
             block = f"*{title}*\n_не удалось получить саммари — см\\. логи_"
-        await self._send_md(block)
-        return block
+        return block, await self._send_md(block)
 
     async def _extract(self, item: _ChatDigestItem, day: date) -> Dict[str, Any]:
         """Run the per-chat extraction prompt and return the parsed JSON."""
@@ -747,7 +1229,8 @@ class DigestService:
         # questions don't belong in commits, halluciated 18:00 is dropped,
         # cross-bucket duplicates collapse. ``messages_text`` is the same
         # source the LLM saw, so haystack-based time/date checks are fair.
-        return _sanitize_extracted(extracted, formatted or "")
+        item.index = _build_message_index(formatted or "")
+        return _sanitize_extracted(extracted, formatted or "", index=item.index)
 
     async def _open_commitments(self, chat_id: UUID) -> List[Commitment]:
         result = await self.session.execute(
@@ -765,77 +1248,41 @@ class DigestService:
         )
         return list(result.scalars().all())
 
-    async def _persist(self, chat: Chat, extracted: Dict[str, Any]) -> None:
-        """Save new commits/events; mark closed commits as done/cancelled."""
-        now_utc = datetime.now(timezone.utc)
-
-        for raw in extracted.get("commitments") or []:
-            direction = raw.get("direction")
-            text = (raw.get("text") or "").strip()
-            if direction not in ("from_me", "to_me") or not text:
-                continue
-            deadline_raw = raw.get("deadline_raw")
-            deadline_at = parse_deadline(deadline_raw, now_utc=now_utc)
-            llm_urgent = bool(raw.get("is_urgent"))
-            # Urgency comes from any of: explicit LLM flag, parsed
-            # deadline within 24h, or an urgency keyword anywhere in
-            # ``deadline_raw`` / ``text`` (covers "срочно"/"asap"/"eod"
-            # even when the deadline itself is unparseable).
-            keyword_urgent = has_urgency_keyword(deadline_raw) or has_urgency_keyword(text)
-            self.session.add(
-                Commitment(
-                    chat_id=chat.id,
-                    direction=direction,
-                    text=text,
-                    deadline_raw=deadline_raw,
-                    deadline_at=deadline_at,
-                    is_urgent=(
-                        llm_urgent or is_within_24h(deadline_at, now_utc=now_utc) or keyword_urgent
-                    ),
-                    status="open",
-                    source_message_id=raw.get("source_message_id"),
-                )
-            )
-
-        for raw in extracted.get("closed_commitments") or []:
-            cid = raw.get("id")
-            reason = raw.get("reason")
-            if not cid or reason not in ("completed", "cancelled"):
-                continue
-            try:
-                cid_uuid = UUID(str(cid))
-            except (ValueError, TypeError):
-                continue
-            commitment = await self.session.get(Commitment, cid_uuid)
-            if commitment is None or commitment.chat_id != chat.id:
-                continue
-            commitment.status = "done" if reason == "completed" else "cancelled"
-            commitment.completed_at = now_utc
-            commitment.updated_at = now_utc
+    async def _persist(
+        self,
+        chat: Chat,
+        extracted: Dict[str, Any],
+        *,
+        index: Optional[_MessageIndex] = None,
+    ) -> None:
+        """Save new commits/events; mark closed commits as done/cancelled.
 
-        for raw in extracted.get("events") or []:
-            description = (raw.get("description") or "").strip()
-            if not description:
-                continue
-            when_raw = raw.get("when_raw")
-            when_at = parse_deadline(when_raw, now_utc=now_utc)
-            llm_urgent = bool(raw.get("is_urgent"))
-            keyword_urgent = has_urgency_keyword(when_raw) or has_urgency_keyword(description)
-            self.session.add(
-                Event(
-                    chat_id=chat.id,
-                    description=description,
-                    when_raw=when_raw,
-                    when_at=when_at,
-                    is_urgent=(
-                        llm_urgent or is_within_24h(when_at, now_utc=now_utc) or keyword_urgent
-                    ),
-                    status="upcoming",
-                    source_message_id=raw.get("source_message_id"),
-                )
-            )
+        Bulk path: one multi-row ``INSERT`` per table and a single ``UPDATE``
+        for all closures of the chat. Runs inside a SAVEPOINT so a failure
+        in one chat rolls back only that chat's writes; the outer
+        transaction is committed once per digest run by ``send_for_day``.
+        """
+        now_utc = datetime.now(timezone.utc)
+        # Deadline parsing (dateparser on fast-path misses) is CPU work; keep
+        # it off the loop. Threads, not processes: the deadline memo is
+        # in-process state.
+        commitment_rows = await run_in_thread(
+            _commitment_rows, chat.id, extracted, now_utc=now_utc, index=index
+        )
+        event_rows = await run_in_thread(
+            _event_rows, chat.id, extracted, now_utc=now_utc, index=index
+        )
+        closures = _closure_statuses(extracted)
+        if not (commitment_rows or event_rows or closures):
+            return
 
-        await self.session.commit()
+        async with self.session.begin_nested():
+            if commitment_rows:
+                await self.session.execute(insert(Commitment).values(commitment_rows))
+            if event_rows:
+                await self.session.execute(insert(Event).values(event_rows))
+            if closures:
+                await self.session.execute(_closure_update(chat.id, closures, now_utc=now_utc))
 
     # ---- rendering ---- #
 
@@ -938,23 +1385,12 @@ class DigestService:
                 out.append(f"• событие: {desc}")
         return out
 
-    async def _send_md(self, text: str) -> None:
-        """Send a MarkdownV2 message; chunk on overflow; fall back to plain text on parse error."""
-        for chunk in chunk_md(text, limit=SAFE_LIMIT):
-            try:
-                await self.bot.send_message(
-                    settings.OWNER_ID,
-                    chunk,
-                    parse_mode="MarkdownV2",
-                    disable_web_page_preview=True,
-                )
-            except TelegramBadRequest as exc:
-                logger.warning("MarkdownV2 send failed (%s); retrying as plain text", exc)
-                await self.bot.send_message(
-                    settings.OWNER_ID,
-                    chunk,
-                    disable_web_page_preview=True,
-                )
+    async def _send_md(self, text: str) -> int:
+        """Send a MarkdownV2 message through the outbox (chunked, throttled, plain fallback).
+
+        Returns the number of chunks delivered.
+        """
+        return await outbox_for(self.bot).send_md(settings.OWNER_ID, text)
 
     # ---- classification suggestions ---- #
 
@@ -965,20 +1401,88 @@ class DigestService:
         ]
         if not candidates:
             return
+        await self.classify_and_send_cards(candidates)
 
-        for item in candidates:
-            try:
-                suggestion = await self._classify_chat(item)
-            except Exception as exc:  # noqa: BLE001
-                logger.error(
-                    "Classification failed for chat %s: %s",
-                    item.chat.telegram_id,
-                    exc,
-                    exc_info=True,
-                )
-                continue
+    async def classify_and_send_cards(self, items: Sequence[_ChatDigestItem]) -> Tuple[int, int]:
+        """Classify ``items`` in batched LLM calls and post a card per chat.
 
+        Chats are packed into ``FEATURE-010_classify_batch`` requests
+        (``CLASSIFY_BATCH_SIZE`` / ``CLASSIFY_BATCH_MAX_CHARS``), at most
+        ``CLASSIFY_CONCURRENCY`` in flight. Cards go out as soon as their
+        batch returns. Chats a batch failed on or omitted from its answer
+        are retried one-by-one with the single-chat prompt under the same
+        concurrency cap. Returns ``(cards_sent, failed)``.
+        """
+        if not items:
+            return 0, 0
+        semaphore = asyncio.Semaphore(CLASSIFY_CONCURRENCY)
+
+        async def run_batch(batch: List[Tuple[str, _ChatDigestItem]]):
+            async with semaphore:
+                try:
+                    if len(batch) == 1:
+                        key, item = batch[0]
+                        return batch, {key: await self._classify_chat(item)}
+                    return batch, await self._classify_batch(batch)
+                except Exception as exc:  # noqa: BLE001 — досчитаем по одному ниже
+                    logger.warning("Batched classification of %s chats failed: %s", len(batch), exc)
+                    return batch, {}
+
+        async def run_single(item: _ChatDigestItem):
+            async with semaphore:
+                try:
+                    return item, await self._classify_chat(item)
+                except Exception as exc:  # noqa: BLE001
+                    logger.error(
+                        "Classification failed for chat %s: %s",
+                        item.chat.telegram_id,
+                        exc,
+                        exc_info=True,
+                    )
+                    return item, None
+
+        sent = failed = 0
+        leftovers: List[_ChatDigestItem] = []
+        batches = _classification_batches(items)
+        for next_done in asyncio.as_completed([run_batch(b) for b in batches]):
+            batch, results = await next_done
+            for key, item in batch:
+                suggestion = results.get(key)
+                if suggestion is None:
+                    leftovers.append(item)
+                    continue
+                await self._send_classification_card(item, suggestion)
+                sent += 1
+
+        for next_done in asyncio.as_completed([run_single(i) for i in leftovers]):
+            item, suggestion = await next_done
+            if suggestion is None:
+                failed += 1
+                continue
             await self._send_classification_card(item, suggestion)
+            sent += 1
+        return sent, failed
+
+    async def _classify_batch(
+        self, batch: Sequence[Tuple[str, _ChatDigestItem]]
+    ) -> Dict[str, Dict[str, Any]]:
+        """One JSON-mode request for several chats; return suggestions by batch key."""
+        prompt = load_prompt("FEATURE-010_classify_batch")
+        rendered = prompt.format(
+            chat_count=len(batch),
+            chats_text="\n\n".join(_classification_sample(key, item) for key, item in batch),
+        )
+        parsed = await OpenAIService.complete_json(
+            prompt,
+            rendered,
+            system="Ты строгий классификатор. Возвращай только JSON.",
+        )
+        keys = {key for key, _ in batch}
+        out: Dict[str, Dict[str, Any]] = {}
+        for row in parsed.get("results") or []:
+            if isinstance(row, dict) and row.get("key") in keys:
+                out[row["key"]] = row
+        return out
 
     async def _classify_chat(self, item: _ChatDigestItem) -> Dict[str, Any]:
         prompt = load_prompt("FEATURE-010_classify")
@@ -1039,20 +1543,17 @@ class DigestService:
                 ],
             ]
         )
-        try:
-            await self.bot.send_message(
-                settings.OWNER_ID,
-                body,
-                parse_mode="MarkdownV2",
-                reply_markup=keyboard,
-            )
-        except TelegramBadRequest as exc:
-            logger.warning("Classification card MarkdownV2 send failed (%s); falling back", exc)
-            plain = (
-                f"🗂 Классификация чата\n{title} — модель предлагает: "
-                f"{_classification_label(suggested)} (уверенность {confidence_pct}%)\n{reason}"
-            )
-            await self.bot.send_message(settings.OWNER_ID, plain, reply_markup=keyboard)
+        plain = (
+            f"🗂 Классификация чата\n{title} — модель предлагает: "
+            f"{_classification_label(suggested)} (уверенность {confidence_pct}%)\n{reason}"
+        )
+        await outbox_for(self.bot).send(
+            settings.OWNER_ID,
+            body,
+            parse_mode="MarkdownV2",
+            plain_text=plain,
+            reply_markup=keyboard,
+        )
 
 
 def _classification_label(value: str) -> str:
@@ -1077,10 +1578,9 @@ async def suggest_classification_for_chat(
 ) -> None:
     """Run the classifier on ``chat``'s ``messages`` and post a suggestion card.
 
-    Public entry point for ad-hoc usage from owner commands (e.g.
-    ``/glossary suggest``). Reuses the same prompt + card rendering as the
-    daily digest so the UX is identical: model proposes, owner taps a button.
-    Empty ``messages`` lists are no-ops.
+    Public entry point for ad-hoc usage from owner commands. Reuses the same
+    prompt + card rendering as the daily digest so the UX is identical:
+    model proposes, owner taps a button. Empty ``messages`` lists are no-ops.
     """
     if not messages:
         return
@@ -1090,6 +1590,20 @@ async def suggest_classification_for_chat(
     await svc._send_classification_card(item, suggestion)
 
 
+async def suggest_classifications_for_chats(
+    bot: Bot,
+    session: AsyncSession,
+    chat_messages: Sequence[Tuple[Chat, List[DBMessage]]],
+) -> Tuple[int, int]:
+    """Batched variant for many chats (``/glossary suggest``).
+
+    Cards are posted as batches complete; returns ``(cards_sent, failed)``.
+    Chats with no messages are skipped.
+    """
+    items = [_ChatDigestItem(chat=c, messages=m) for c, m in chat_messages if m]
+    return await DigestService(session, bot).classify_and_send_cards(items)
+
+
 async def _send_with_fresh_session(bot: Bot, day: date) -> None:
     """Open a one-shot session, build a service and send a recorded digest."""
     from ..database.database import async_session  # local to avoid import cycle
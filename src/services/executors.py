@@ -0,0 +1,122 @@
+"""Executor layer: run CPU-heavy work without blocking the event loop.
+
+The bot polls Telegram, serves handlers and runs its background jobs on a
+single asyncio loop. A few steps are pure CPU and used to run inline —
+dateparser in the digest, the emoji/word scan in ``StatsService``, parsing
+multi-megabyte ``/upload`` dumps — stalling every update while they ran.
+
+Two shared pools, created lazily:
+
+- :func:`run_in_thread` — a small thread pool. Right for work that releases
+  the GIL (I/O, C extensions) and for code that must share in-process state
+  (e.g. the deadline memo). Pure-Python code still holds the GIL here, but
+  the interpreter switches back to the loop every few milliseconds instead
+  of blocking it for the whole call.
+- :func:`run_in_process` — a process pool for pure-Python hot loops. The
+  callable and its arguments must be picklable (module-level functions,
+  plain data). Inputs below ``PROCESS_MIN_SIZE`` (per ``size_hint``) go to
+  the thread pool instead: pickling + IPC would cost more than it saves.
+  If the process pool is unavailable, breaks, can't start its workers or
+  can't pickle the call, work falls back to the thread pool so callers
+  never see pool errors.
+
+Call :func:`shutdown_executors` on exit.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+import pickle
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+THREAD_WORKERS = 4
+PROCESS_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+# Rough input size (chars / items) below which a process hop isn't worth it.
+PROCESS_MIN_SIZE = 200_000
+
+_thread_pool: Optional[ThreadPoolExecutor] = None
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_disabled = False
+
+
+def _threads() -> ThreadPoolExecutor:
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(max_workers=THREAD_WORKERS, thread_name_prefix="cpu")
+    return _thread_pool
+
+
+def _processes() -> Optional[ProcessPoolExecutor]:
+    global _process_pool, _process_pool_disabled
+    if _process_pool is None and not _process_pool_disabled:
+        try:
+            # ``spawn``: forking a process that already runs threads (aiohttp,
+            # the thread pool above) is unsafe.
+            _process_pool = ProcessPoolExecutor(
+                max_workers=PROCESS_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        except (OSError, NotImplementedError, ValueError) as exc:
+            logger.warning("Process pool unavailable, using threads: %s", exc)
+            _process_pool_disabled = True
+    return _process_pool
+
+
+async def _submit(pool: Executor, fn: Callable[..., T], args: Any, kwargs: Any) -> T:
+    call = functools.partial(fn, *args, **kwargs) if kwargs else functools.partial(fn, *args)
+    return await asyncio.get_running_loop().run_in_executor(pool, call)
+
+
+async def run_in_thread(fn: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+    """Run ``fn(*args, **kwargs)`` on the shared thread pool."""
+    return await _submit(_threads(), fn, args, kwargs)
+
+
+async def run_in_process(
+    fn: Callable[..., T], /, *args: Any, size_hint: Optional[int] = None, **kwargs: Any
+) -> T:
+    """Run ``fn(*args, **kwargs)`` on the shared process pool.
+
+    ``size_hint`` (e.g. total characters) below ``PROCESS_MIN_SIZE`` keeps
+    the call on the thread pool. Exceptions raised by ``fn`` propagate (an
+    ``OSError`` / ``AttributeError`` from ``fn`` is indistinguishable from a
+    pool failure, so it surfaces from the thread-pool retry).
+    """
+    global _process_pool
+    pool = None if size_hint is not None and size_hint < PROCESS_MIN_SIZE else _processes()
+    if pool is None:
+        return await run_in_thread(fn, *args, **kwargs)
+    try:
+        return await _submit(pool, fn, args, kwargs)
+    except (BrokenProcessPool, OSError) as exc:
+        # OSError: ``spawn`` could not start a worker (fd / process limits).
+        logger.error("Process pool broke (%s); retrying %s in a thread", exc, fn.__name__)
+        if _process_pool is pool:
+            _process_pool = None  # recreated on next use
+        pool.shutdown(wait=False, cancel_futures=True)
+        return await run_in_thread(fn, *args, **kwargs)
+    except (pickle.PicklingError, AttributeError) as exc:
+        # The call can't cross the process boundary (e.g. a local function);
+        # the pool itself is fine.
+        logger.warning("Can't send %s to a worker process (%s); using a thread", fn.__name__, exc)
+        return await run_in_thread(fn, *args, **kwargs)
+
+
+def shutdown_executors(*, wait: bool = True) -> None:
+    """Stop both pools (idempotent; they are recreated on next use)."""
+    global _thread_pool, _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=wait, cancel_futures=True)
+        _process_pool = None
+    if _thread_pool is not None:
+        _thread_pool.shutdown(wait=wait, cancel_futures=True)
+        _thread_pool = None
@@ -0,0 +1,135 @@
+"""Micro-batched message analysis: tags + importance for many messages per LLM call.
+
+Smart mode needs an importance score for every incoming group message and
+auto-tagging needs tags; one request per message spends most of its time
+and tokens on the prompt itself. :class:`MessageAnalysisBatcher` collects
+messages per chat for up to ``BATCH_WINDOW_SECONDS`` (or until
+``BATCH_MAX_MESSAGES`` are waiting), sends them in one JSON-mode request
+(``TECH-001_message_analysis_batch``) and resolves each caller's future
+with its own ``(tags, importance)``.
+
+- Batches are per chat, so the model judges each message among its
+  neighbours and one busy chat cannot delay another.
+- A message the model skipped or garbled gets the neutral ``([], 0.5)``.
+- If the request itself fails, every waiting caller sees the exception.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Set, Tuple
+
+from .openai_service import OpenAIService
+from .prompts import load_prompt
+
+logger = logging.getLogger(__name__)
+
+BATCH_WINDOW_SECONDS = 1.5
+BATCH_MAX_MESSAGES = 20
+# Per-message cut in the batch prompt; importance is decided by the opening.
+MESSAGE_MAX_CHARS = 1000
+
+Analysis = Tuple[List[str], float]
+NEUTRAL: Analysis = ([], 0.5)
+
+
+@dataclass
+class _Batch:
+    texts: List[str] = field(default_factory=list)
+    futures: List["asyncio.Future[Analysis]"] = field(default_factory=list)
+    timer: Optional["asyncio.Task[None]"] = None
+
+
+def _analysis_from(row: Any) -> Analysis:
+    if not isinstance(row, dict):
+        return NEUTRAL
+    tags = [str(t).strip().lstrip("#") for t in row.get("tags") or [] if str(t).strip()]
+    try:
+        importance = float(row.get("importance"))
+    except (TypeError, ValueError):
+        importance = 0.5
+    return tags, max(0.0, min(1.0, importance))
+
+
+async def analyze_batch(texts: Sequence[str]) -> List[Analysis]:
+    """One JSON-mode request for ``texts``; results in input order."""
+    prompt = load_prompt("TECH-001_message_analysis_batch")
+    rendered = prompt.format(
+        message_count=len(texts),
+        messages_text="\n".join(
+            f"[m{i}] {text[:MESSAGE_MAX_CHARS]}" for i, text in enumerate(texts, 1)
+        ),
+    )
+    parsed = await OpenAIService.complete_json(prompt, rendered)
+    by_key: Dict[str, Any] = {}
+    for row in parsed.get("results") or []:
+        if isinstance(row, dict) and isinstance(row.get("key"), str):
+            by_key[row["key"]] = row
+    return [_analysis_from(by_key.get(f"m{i}")) for i in range(1, len(texts) + 1)]
+
+
+class MessageAnalysisBatcher:
+    """Collect messages per chat and analyze each group in one request."""
+
+    def __init__(
+        self,
+        *,
+        window: float = BATCH_WINDOW_SECONDS,
+        max_messages: int = BATCH_MAX_MESSAGES,
+    ) -> None:
+        self.window = window
+        self.max_messages = max_messages
+        self._batches: Dict[Hashable, _Batch] = {}
+        self._running: Set["asyncio.Task[None]"] = set()
+        self.requests = 0
+        self.messages = 0
+
+    async def analyze(self, chat_key: Hashable, text: str) -> Analysis:
+        """Return ``(tags, importance)`` for ``text`` once its batch is analyzed."""
+        future: "asyncio.Future[Analysis]" = asyncio.get_running_loop().create_future()
+        batch = self._batches.setdefault(chat_key, _Batch())
+        batch.texts.append(text)
+        batch.futures.append(future)
+        if len(batch.texts) >= self.max_messages:
+            self._flush(chat_key)
+        elif batch.timer is None:
+            batch.timer = asyncio.create_task(self._flush_later(chat_key))
+        return await future
+
+    async def _flush_later(self, chat_key: Hashable) -> None:
+        await asyncio.sleep(self.window)
+        self._flush(chat_key)
+
+    def _flush(self, chat_key: Hashable) -> None:
+        batch = self._batches.pop(chat_key, None)
+        if batch is None:
+            return
+        if batch.timer is not None and batch.timer is not asyncio.current_task():
+            batch.timer.cancel()
+        task = asyncio.create_task(self._run(batch))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: _Batch) -> None:
+        self.requests += 1
+        self.messages += len(batch.texts)
+        try:
+            results = await analyze_batch(batch.texts)
+        except Exception as exc:  # noqa: BLE001 — отдаём ошибку ждущим вызовам
+            logger.warning(
+                "Batched message analysis failed (%s messages): %s", len(batch.texts), exc
+            )
+            for future in batch.futures:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for future, result in zip(batch.futures, results):
+            if not future.done():
+                future.set_result(result)
+
+
+# Shared by every handler in the process, so concurrent updates of one chat
+# land in the same batch.
+message_analyzer = MessageAnalysisBatcher()
@@ -156,23 +156,6 @@ class OpenAIService:
             return 0.0
         return float(np.dot(vec1, vec2) / denom)
 
-    @staticmethod
-    async def analyze_message_importance(message: str) -> float:
-        """Return importance score in [0.0, 1.0]; default to 0.5 on parse failure."""
-        prompt = load_prompt("TECH-001_message_importance")
-        rendered = prompt.format(message=message)
-        text = await OpenAIService._complete(
-            prompt,
-            rendered,
-            system="You are a message importance analyzer. Respond only with a number between 0 and 1.",
-        )
-        try:
-            score = float(text)
-        except ValueError:
-            logger.warning("Could not parse importance score: %r", text)
-            return 0.5
-        return max(0.0, min(1.0, score))
-
     async def refresh_style(
         self,
         chat_type: str,
@@ -0,0 +1,249 @@
+"""Rate-aware outbound Telegram sender for owner-facing bulk sends.
+
+Digest blocks, classification cards and the ``/commits`` / ``/events``
+listings used to call ``bot.send_message`` in tight loops. On busy days
+that hits Telegram's flood limits (``429 Too Many Requests``) and the first
+failed send aborted the rest of the loop.
+
+:class:`Outbox` sits between those call sites and the Bot API:
+
+- a global token bucket (Telegram: ~30 msg/s per bot) and a per-chat one
+  (~1 msg/s in a private chat, ~20 msg/min in a group) throttle sends
+  before they reach Telegram;
+- ``TelegramRetryAfter`` is honoured: we sleep ``retry_after`` seconds and
+  try again (bounded number of attempts);
+- a ``TelegramBadRequest`` on a formatted message (MarkdownV2 parse error)
+  is retried once as plain text;
+- a send that still fails is logged and counted, never raised, so one bad
+  chunk doesn't swallow the rest of a digest. Callers that must know
+  whether anything arrived check the result (``None`` / delivered count).
+
+Use :func:`outbox_for` to get the process-wide outbox of a bot — buckets
+only work if every bulk sender shares them.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import weakref
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import Message
+
+from .md import SAFE_LIMIT, chunk_md
+
+logger = logging.getLogger(__name__)
+
+# Telegram Bot API limits (https://core.telegram.org/bots/faq#my-bot-is-hitting-limits-how-do-i-avoid-this).
+GLOBAL_RATE_PER_SECOND = 30.0
+PRIVATE_CHAT_RATE_PER_SECOND = 1.0
+GROUP_CHAT_RATE_PER_SECOND = 20.0 / 60.0
+# Short bursts are tolerated by Telegram; keep them small.
+GLOBAL_BURST = 30
+CHAT_BURST = 3
+# How many ``retry_after`` sleeps a single message may take before we give up.
+MAX_RETRY_AFTER_ATTEMPTS = 3
+
+
+class TokenBucket:
+    """Classic token bucket: ``rate`` tokens/second, at most ``capacity`` banked.
+
+    ``acquire`` is FIFO-fair: waiters queue on an ``asyncio.Lock``.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = float(capacity)
+        self._updated = clock()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        elapsed = max(0.0, now - self._updated)
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        """Take one token, sleeping until one is available."""
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self._tokens) / self.rate)
+
+
+@dataclass
+class OutboxMetrics:
+    """Counters exposed for logging / ``/status``-style introspection."""
+
+    sent: int = 0
+    failed: int = 0
+    retry_after_sleeps: int = 0
+    plain_fallbacks: int = 0
+    queue_depth: int = 0  # sends currently waiting for a token or a retry
+    max_queue_depth: int = 0
+    latency_total: float = 0.0  # seconds, enqueue → delivered
+    latency_max: float = 0.0
+
+    @property
+    def avg_latency(self) -> float:
+        return self.latency_total / self.sent if self.sent else 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "retry_after_sleeps": self.retry_after_sleeps,
+            "plain_fallbacks": self.plain_fallbacks,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "avg_latency": round(self.avg_latency, 3),
+            "max_latency": round(self.latency_max, 3),
+        }
+
+
+class Outbox:
+    """Throttled, retrying wrapper around ``Bot.send_message``."""
+
+    def __init__(
+        self,
+        bot: Bot,
+        *,
+        global_rate: float = GLOBAL_RATE_PER_SECOND,
+        private_rate: float = PRIVATE_CHAT_RATE_PER_SECOND,
+        group_rate: float = GROUP_CHAT_RATE_PER_SECOND,
+        max_retry_after: int = MAX_RETRY_AFTER_ATTEMPTS,
+        throttle: bool = True,
+    ) -> None:
+        self.bot = bot
+        self.throttle = throttle
+        self.metrics = OutboxMetrics()
+        self._global = TokenBucket(global_rate, GLOBAL_BURST)
+        self._private_rate = private_rate
+        self._group_rate = group_rate
+        self._max_retry_after = max_retry_after
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+
+    def _bucket_for(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            # Negative Telegram ids are groups/supergroups/channels.
+            rate = self._group_rate if chat_id < 0 else self._private_rate
+            bucket = TokenBucket(rate, CHAT_BURST)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    async def send(
+        self,
+        chat_id: int,
+        text: str,
+        *,
+        parse_mode: Optional[str] = None,
+        plain_text: Optional[str] = None,
+        **kwargs: Any,
+    ) -> Optional[Message]:
+        """Send one message; return it, or ``None`` if delivery finally failed.
+
+        ``plain_text`` is what to send if Telegram rejects the formatted
+        ``text`` (defaults to ``text`` itself). Extra ``kwargs`` go straight
+        to ``Bot.send_message`` (``reply_markup``, ``disable_web_page_preview``…).
+        """
+        started = time.monotonic()
+        self.metrics.queue_depth += 1
+        self.metrics.max_queue_depth = max(self.metrics.max_queue_depth, self.metrics.queue_depth)
+        try:
+            sent = await self._deliver(chat_id, text, parse_mode, plain_text, kwargs)
+        finally:
+            self.metrics.queue_depth -= 1
+
+        if sent is None:
+            self.metrics.failed += 1
+            return None
+        latency = time.monotonic() - started
+        self.metrics.sent += 1
+        self.metrics.latency_total += latency
+        self.metrics.latency_max = max(self.metrics.latency_max, latency)
+        return sent
+
+    async def send_md(
+        self, chat_id: int, text: str, *, limit: int = SAFE_LIMIT, **kwargs: Any
+    ) -> int:
+        """Send MarkdownV2 ``text`` chunked on blank lines; return chunks delivered."""
+        kwargs.setdefault("disable_web_page_preview", True)
+        delivered = 0
+        for chunk in chunk_md(text, limit=limit):
+            if await self.send(chat_id, chunk, parse_mode="MarkdownV2", **kwargs) is not None:
+                delivered += 1
+        return delivered
+
+    async def _deliver(
+        self,
+        chat_id: int,
+        text: str,
+        parse_mode: Optional[str],
+        plain_text: Optional[str],
+        kwargs: Dict[str, Any],
+    ) -> Optional[Message]:
+        retries = 0
+        while True:
+            if self.throttle:
+                await self._global.acquire()
+                await self._bucket_for(chat_id).acquire()
+            try:
+                return await self.bot.send_message(chat_id, text, parse_mode=parse_mode, **kwargs)
+            except TelegramRetryAfter as exc:
+                if retries >= self._max_retry_after:
+                    logger.error(
+                        "Outbox: giving up on chat %s after %s retry-after sleeps",
+                        chat_id,
+                        retries,
+                    )
+                    return None
+                retries += 1
+                self.metrics.retry_after_sleeps += 1
+                logger.warning(
+                    "Outbox: flood limit for chat %s, sleeping %ss", chat_id, exc.retry_after
+                )
+                await asyncio.sleep(exc.retry_after)
+            except TelegramBadRequest as exc:
+                if parse_mode is None:
+                    logger.error("Outbox: send to %s rejected: %s", chat_id, exc)
+                    return None
+                logger.warning("%s send failed (%s); retrying as plain text", parse_mode, exc)
+                self.metrics.plain_fallbacks += 1
+                parse_mode = None
+                text = plain_text if plain_text is not None else text
+            except Exception as exc:  # noqa: BLE001 — один сбой не должен валить всю рассылку
+                logger.error("Outbox: send to %s failed: %s", chat_id, exc, exc_info=True)
+                return None
+
+
+_outboxes: "weakref.WeakKeyDictionary[Bot, Outbox]" = weakref.WeakKeyDictionary()
+
+
+def outbox_for(bot: Bot, **options: Any) -> Outbox:
+    """Return the shared :class:`Outbox` for ``bot`` (created on first use).
+
+    ``options`` are passed to the :class:`Outbox` constructor and only take
+    effect on that first call (e.g. ``throttle=False`` in benchmarks).
+    """
+    outbox = _outboxes.get(bot)
+    if outbox is None:
+        outbox = Outbox(bot, **options)
+        _outboxes[bot] = outbox
+    return outbox
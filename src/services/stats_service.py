@@ -1,26 +1,82 @@
-"""Background statistics service: collects per-chat metrics for /status etc."""
+"""Background statistics service: collects per-chat metrics for /status etc.
+
+Weekly ``MessageStats`` are assembled from per-hour rollups
+(``chat_hourly_stats``) that are maintained incrementally: each pass only
+re-reads messages from the chat's latest rolled hour onwards. Topics (an
+LLM call) are cached per chat and only recomputed once enough new text
+arrived or the sampled input changed. Each chat keeps one ``message_stats``
+row per period, updated in place, plus a compact daily history.
+
+Ingest marks chats dirty (``mark_chat_dirty``); the periodic job only
+refreshes those, so idle chats cost nothing.
+"""
 
 from __future__ import annotations
 
 import asyncio
+import hashlib
 import logging
 import re
-from collections import Counter
-from datetime import datetime, timedelta, timezone
+import time
+from collections import Counter, OrderedDict, defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Generic, Iterable, List, Optional, Sequence, Tuple, TypeVar
 from uuid import UUID
 
 import emoji
-from sqlalchemy import select
+from sqlalchemy import distinct, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..database.database import get_session
-from ..database.models import Chat, DBMessage, MessageStats
+from ..config import settings
+from ..database.database import async_session
+from ..database.models import (
+    ChatHourlyStats,
+    DBMessage,
+    MessageStats,
+    MessageStatsDaily,
+)
+from .executors import run_in_process
 from .openai_service import OpenAIService
 
 logger = logging.getLogger(__name__)
 
 CACHE_DURATION = timedelta(minutes=5)
 PERIODIC_INTERVAL_SECONDS = 300
+# Shared stats cache. Dirty chats are re-put by every periodic pass; the
+# TTL bounds how long an idle chat's week (which still slides) is served.
+STATS_CACHE_SIZE = 256
+STATS_CACHE_TTL = timedelta(minutes=30)
+# Chats refreshed in parallel by one periodic pass (each with its own session).
+STATS_CONCURRENCY = 4
+# Hourly rollups (``chat_hourly_stats``): the week view needs 7 days; a day
+# of slack is kept before ``CleanupService`` drops older rows.
+ROLLUP_WINDOW = timedelta(days=7)
+ROLLUP_RETENTION = timedelta(days=8)
+# Per-hour word counters are truncated to their heavy hitters; the weekly
+# top-10 is computed from these.
+ROLLUP_WORDS_PER_HOUR = 100
+# Rows per chunk when streaming message texts for tokenisation.
+ROLLUP_STREAM_CHUNK = 5000
+_ROLLUP_COLUMNS = (
+    "message_count",
+    "total_length",
+    "user_ids",
+    "emoji_count",
+    "emojis",
+    "words",
+    "updated_at",
+)
+# Fields copied into the compact daily history (``message_stats_daily``).
+_HISTORY_COLUMNS = ("message_count", "user_count", "avg_length", "emoji_count", "top_topics")
+# Topic analysis (one LLM call) is redone only after this much new text ...
+TOPICS_MIN_NEW_CHARS = 2000
+# ... or once the cached result is this old.
+TOPICS_MAX_AGE = timedelta(hours=24)
+# Input cap for one analysis: roughly 4k tokens of Russian text.
+TOPICS_INPUT_MAX_CHARS = 12000
+TOPICS_MESSAGE_MAX_CHARS = 500
 
 # Стоп-слова русского языка для подсчёта top_words.
 RUSSIAN_STOP_WORDS = {
@@ -148,127 +204,456 @@ RUSSIAN_STOP_WORDS = {
 }
 
 
-class StatsService:
-    """Caches and computes ``MessageStats`` rows."""
+def _char_class(chars: Iterable[str]) -> str:
+    """Regex character class for ``chars``, with consecutive code points as ranges."""
+    ranges: List[List[int]] = []
+    for cp in sorted(map(ord, chars)):
+        if ranges and ranges[-1][1] == cp - 1:
+            ranges[-1][1] = cp
+        else:
+            ranges.append([cp, cp])
+    return (
+        "["
+        + "".join(
+            re.escape(chr(lo)) if lo == hi else f"{re.escape(chr(lo))}-{re.escape(chr(hi))}"
+            for lo, hi in ranges
+        )
+        + "]"
+    )
+
+
+# ``emoji.is_emoji(char)`` for single characters, as one precompiled class.
+# The few emoji that are also ``\w`` (e.g. "ℹ") end up inside word tokens
+# and are counted by a separate, rarely matching pattern.
+_EMOJI_CHARS = frozenset(e for e in emoji.EMOJI_DATA if len(e) == 1)
+_WORD_EMOJI_CHARS = frozenset(c for c in _EMOJI_CHARS if re.match(r"\w", c))
+_SYMBOL_EMOJI_CHARS = _EMOJI_CHARS - _WORD_EMOJI_CHARS
+_TOKEN_RE = re.compile(r"\w+|" + _char_class(_SYMBOL_EMOJI_CHARS))
+_WORD_EMOJI_RE = re.compile(_char_class(_WORD_EMOJI_CHARS)) if _WORD_EMOJI_CHARS else None
+
+
+def _text_counters(texts: Iterable[str]) -> Tuple[int, Counter[str], Counter[str]]:
+    """Emoji total, emoji counter and word counter (stop words dropped).
+
+    One tokenizer pass over all texts at once: every token is an emoji
+    character or a run of word characters. Lower-casing and stop-word
+    filtering happen once per distinct token, not per occurrence.
+    """
+    joined = "\n".join(texts)
+    tokens = Counter(_TOKEN_RE.findall(joined))
+
+    emoji_counter: Counter[str] = Counter()
+    word_counter: Counter[str] = Counter()
+    for token, count in tokens.items():
+        if token in _SYMBOL_EMOJI_CHARS:
+            emoji_counter[token] += count
+        elif len(token) > 1:
+            word = token.lower()
+            if word not in RUSSIAN_STOP_WORDS:
+                word_counter[word] += count
+    if _WORD_EMOJI_RE is not None and _WORD_EMOJI_RE.search(joined):
+        emoji_counter.update(_WORD_EMOJI_RE.findall(joined))
+
+    return sum(emoji_counter.values()), emoji_counter, word_counter
+
+
+def _hour_floor(ts: datetime) -> datetime:
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def _hourly_text_counters(
+    rows: List[Tuple[datetime, str]],
+) -> Dict[datetime, Tuple[int, Dict[str, int], Dict[str, int]]]:
+    """Emoji total, emoji and word counters per UTC hour of ``(created_at, text)`` rows.
+
+    Module-level and plain-data in/out so it can run in a process pool.
+    """
+    by_hour: Dict[int, List[str]] = defaultdict(list)
+    for created_at, text in rows:
+        by_hour[int(created_at.timestamp()) // 3600].append(text)
+    out = {}
+    for hour, texts in by_hour.items():
+        emoji_total, emojis, words = _text_counters(texts)
+        hour_start = datetime.fromtimestamp(hour * 3600, tz=timezone.utc)
+        out[hour_start] = (emoji_total, dict(emojis), dict(words))
+    return out
+
+
+def _week_from_rollups(rollups: Sequence[ChatHourlyStats], now: datetime) -> Dict[str, Any]:
+    """Sum hourly rollups into the ``MessageStats`` fields of the week view."""
+    message_count = sum(r.message_count for r in rollups)
+    users: set[int] = set()
+    emojis: Counter[str] = Counter()
+    words: Counter[str] = Counter()
+    by_hour_of_day: Counter[int] = Counter()
+    by_weekday: Counter[str] = Counter()
+    by_date: Counter[date] = Counter()
+    for r in rollups:
+        users.update(r.user_ids or [])
+        emojis.update(r.emojis or {})
+        words.update(r.words or {})
+        hour_start = r.hour_start.astimezone(timezone.utc)
+        by_hour_of_day[hour_start.hour] += r.message_count
+        by_weekday[hour_start.strftime("%A")] += r.message_count
+        by_date[hour_start.date()] += r.message_count
+
+    activity_trend = []
+    for offset in range(7):
+        target = (now - timedelta(days=offset)).date()
+        activity_trend.append({"date": target.strftime("%Y-%m-%d"), "count": by_date[target]})
+
+    return {
+        "message_count": message_count,
+        "user_count": len(users),
+        "avg_length": (
+            sum(r.total_length for r in rollups) / message_count if message_count else 0.0
+        ),
+        "emoji_count": sum(r.emoji_count for r in rollups),
+        "top_emojis": dict(emojis.most_common(10)),
+        "top_words": dict(words.most_common(10)),
+        "most_active_hour": (by_hour_of_day.most_common(1)[0][0] if by_hour_of_day else None),
+        "most_active_day": by_weekday.most_common(1)[0][0] if by_weekday else None,
+        "activity_trend": activity_trend,
+    }
+
+
+def _topics_sample(
+    texts: Sequence[str],
+    *,
+    max_chars: int = TOPICS_INPUT_MAX_CHARS,
+    message_chars: int = TOPICS_MESSAGE_MAX_CHARS,
+) -> List[str]:
+    """Evenly spaced, order-preserving sample of ``texts`` within ``max_chars``.
+
+    Long messages are clipped to ``message_chars``. Deterministic, so the
+    same week of text always yields the same sample (and hash).
+    """
+    clipped = [text[:message_chars] for text in texts]
+    total = sum(len(text) + 1 for text in clipped)
+    if total <= max_chars:
+        return clipped
+    step = total / max_chars
+    sample: List[str] = []
+    used = 0
+    position = 0.0
+    while position < len(clipped):
+        text = clipped[int(position)]
+        if used + len(text) + 1 > max_chars:
+            break
+        sample.append(text)
+        used += len(text) + 1
+        position += step
+    return sample
+
+
+@dataclass
+class _TopicsEntry:
+    topics: List[Dict[str, object]]
+    digest: str
+    analyzed_at: datetime
+
+
+@dataclass
+class TopicsCacheStats:
+    """Counters for the topic cache (LLM calls made vs. avoided)."""
+
+    analyzed: int = 0
+    skipped: int = 0  # too little new text since the last analysis
+    unchanged: int = 0  # sampled input hashed the same
+
+    def snapshot(self) -> Dict[str, int]:
+        return {"analyzed": self.analyzed, "skipped": self.skipped, "unchanged": self.unchanged}
+
+
+topics_cache_stats = TopicsCacheStats()
+
+# Chats that received messages since their stats were last refreshed.
+_dirty_chats: set[UUID] = set()
+
+
+def mark_chat_dirty(chat_id: UUID) -> None:
+    """Queue ``chat_id`` for the next periodic stats pass (called on ingest)."""
+    _dirty_chats.add(chat_id)
+
+
+def take_dirty_chats() -> set[UUID]:
+    """Return and clear the set of chats waiting for a stats refresh."""
+    global _dirty_chats
+    taken, _dirty_chats = _dirty_chats, set()
+    return taken
+
+
+_V = TypeVar("_V")
+
+
+class StatsCache(Generic[_V]):
+    """Bounded per-chat LRU with a time-to-live.
+
+    One instance (``stats_cache``) of ``MessageStats`` is shared by every
+    ``StatsService``: the periodic job fills it and ``/status`` reads from
+    it. ``_topics_cache`` keeps the last topic analysis per chat.
+    """
+
+    def __init__(self, *, max_entries: int, ttl: timedelta) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[UUID, Tuple[float, _V]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, chat_id: UUID) -> Optional[_V]:
+        entry = self._entries.get(chat_id)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl.total_seconds():
+            self._entries.move_to_end(chat_id)
+            self.hits += 1
+            return entry[1]
+        if entry is not None:
+            del self._entries[chat_id]
+        self.misses += 1
+        return None
+
+    def put(self, chat_id: UUID, value: _V) -> None:
+        self._entries[chat_id] = (time.monotonic(), value)
+        self._entries.move_to_end(chat_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def snapshot(self) -> Dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
 
-    def __init__(self) -> None:
-        self._cache: dict[UUID, MessageStats] = {}
+stats_cache: StatsCache[MessageStats] = StatsCache(
+    max_entries=STATS_CACHE_SIZE, ttl=STATS_CACHE_TTL
+)
+# Process-wide, so ``/status`` callbacks and the periodic job share it.
+# Bounded like ``stats_cache``; entries expire once the new-text shortcut in
+# ``_week_topics`` stops applying (``TOPICS_MAX_AGE``).
+_topics_cache: StatsCache[_TopicsEntry] = StatsCache(
+    max_entries=STATS_CACHE_SIZE, ttl=TOPICS_MAX_AGE
+)
+
+
+class StatsService:
+    """Computes ``MessageStats`` rows; reads go through the shared ``stats_cache``."""
 
     async def get_stats(self, chat_id: UUID, session: AsyncSession) -> MessageStats:
         """Return the latest cached or freshly computed stats for ``chat_id``."""
-        cached = self._cache.get(chat_id)
-        if cached is not None and self._is_fresh(cached):
+        cached = stats_cache.get(chat_id)
+        if cached is not None:
             return cached
 
         result = await session.execute(
-            select(MessageStats)
-            .where(MessageStats.chat_id == chat_id, MessageStats.period == "week")
-            .order_by(MessageStats.timestamp.desc())
-            .limit(1)
+            select(MessageStats).where(
+                MessageStats.chat_id == chat_id, MessageStats.period == "week"
+            )
         )
         stats = result.scalar_one_or_none()
         if stats is None or not self._is_fresh(stats):
-            stats = await self._calculate_stats(chat_id, session)
+            return await self._calculate_stats(chat_id, session)
 
-        self._cache[chat_id] = stats
+        stats_cache.put(chat_id, stats)
         return stats
 
-    async def _calculate_stats(self, chat_id: UUID, session: AsyncSession) -> MessageStats:
-        now = datetime.now(timezone.utc)
-        week_ago = now - timedelta(days=7)
+    async def _refresh_rollups(self, chat_id: UUID, session: AsyncSession, *, now: datetime) -> int:
+        """Recompute ``chat_hourly_stats`` from the latest rolled hour onwards.
+
+        The latest stored hour may have been partial, so it is rebuilt in
+        full together with any newer hours; older hours are final. Messages
+        that arrive with a ``created_at`` before that hour are not re-rolled.
+        Returns the number of hourly rows written.
+        """
+        last = await session.scalar(
+            select(func.max(ChatHourlyStats.hour_start)).where(ChatHourlyStats.chat_id == chat_id)
+        )
+        floor = _hour_floor(now - ROLLUP_WINDOW)
+        since = floor if last is None else max(floor, min(last, _hour_floor(now)))
 
+        in_range = (DBMessage.chat_id == chat_id, DBMessage.created_at >= since)
+        # Counts, lengths and distinct users are aggregated by Postgres.
+        hour = func.date_trunc("hour", DBMessage.created_at).label("hour_start")
         result = await session.execute(
-            select(DBMessage)
-            .where(DBMessage.chat_id == chat_id, DBMessage.created_at >= week_ago)
-            .order_by(DBMessage.created_at)
+            select(
+                hour,
+                func.count().label("message_count"),
+                func.coalesce(func.sum(func.length(DBMessage.text)), 0).label("total_length"),
+                func.jsonb_agg(distinct(DBMessage.user_id)).label("user_ids"),
+            )
+            .where(*in_range)
+            .group_by(hour)
         )
-        messages = list(result.scalars().all())
-
-        if not messages:
-            stats = MessageStats(
-                chat_id=chat_id,
-                period="week",
-                timestamp=now.replace(tzinfo=None),
-                message_count=0,
-                user_count=0,
-                avg_length=0.0,
-                emoji_count=0,
-                sticker_count=0,
-                top_emojis={},
-                top_stickers={},
-                top_words={},
-                top_topics=[],
-                most_active_hour=None,
-                most_active_day=None,
-                activity_trend=[],
+        hours = {
+            row.hour_start.astimezone(timezone.utc): {
+                "message_count": int(row.message_count),
+                "total_length": int(row.total_length),
+                "user_ids": sorted(row.user_ids or []),
+            }
+            for row in result.all()
+        }
+        if not hours:
+            return 0
+
+        # Only emoji/word tokenisation is left to Python: stream the texts
+        # in chunks rather than materialising every row at once.
+        emoji_totals: Counter[datetime] = Counter()
+        emojis: Dict[datetime, Counter[str]] = defaultdict(Counter)
+        words: Dict[datetime, Counter[str]] = defaultdict(Counter)
+        stream = await session.stream(
+            select(DBMessage.created_at, DBMessage.text)
+            .where(*in_range, DBMessage.text.isnot(None))
+            .execution_options(yield_per=ROLLUP_STREAM_CHUNK)
+        )
+        async for chunk in stream.partitions():
+            rows = [(created_at, text) for created_at, text in chunk if text]
+            counters = await run_in_process(
+                _hourly_text_counters, rows, size_hint=sum(len(text) for _, text in rows)
             )
-            session.add(stats)
-            await session.commit()
-            return stats
-
-        message_count = len(messages)
-        user_count = len({msg.user_id for msg in messages})
-        avg_length = sum(len(msg.text or "") for msg in messages) / message_count
-
-        emoji_counter: Counter[str] = Counter()
-        emoji_total = 0
-        for msg in messages:
-            if not msg.text:
-                continue
-            chars = [c for c in msg.text if emoji.is_emoji(c)]
-            emoji_total += len(chars)
-            emoji_counter.update(chars)
-
-        word_counter: Counter[str] = Counter()
-        for msg in messages:
-            if not msg.text:
-                continue
-            words = [
-                w.lower()
-                for w in re.findall(r"\b\w+\b", msg.text)
-                if w.lower() not in RUSSIAN_STOP_WORDS and len(w) > 1
-            ]
-            word_counter.update(words)
-
-        hours = [msg.created_at.hour for msg in messages]
-        most_active_hour = max(set(hours), key=hours.count) if hours else None
-
-        days = [msg.created_at.strftime("%A") for msg in messages]
-        most_active_day = max(set(days), key=days.count) if days else None
-
-        activity_trend = []
-        for offset in range(7):
-            target = (now - timedelta(days=offset)).date()
-            count = sum(1 for msg in messages if msg.created_at.date() == target)
-            activity_trend.append({"date": target.strftime("%Y-%m-%d"), "count": count})
+            for hour_start, (emoji_total, hour_emojis, hour_words) in counters.items():
+                emoji_totals[hour_start] += emoji_total
+                emojis[hour_start].update(hour_emojis)
+                words[hour_start].update(hour_words)
 
-        try:
-            top_topics = await OpenAIService.analyze_topics(
-                [msg.text for msg in messages if msg.text]
+        rollups = [
+            {
+                **aggregates,
+                "hour_start": hour_start,
+                "emoji_count": emoji_totals[hour_start],
+                "emojis": dict(emojis[hour_start]),
+                "words": dict(words[hour_start].most_common(ROLLUP_WORDS_PER_HOUR)),
+            }
+            for hour_start, aggregates in sorted(hours.items())
+        ]
+        stmt = pg_insert(ChatHourlyStats).values(
+            [{**r, "chat_id": chat_id, "updated_at": now} for r in rollups]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ChatHourlyStats.chat_id, ChatHourlyStats.hour_start],
+            set_={col: stmt.excluded[col] for col in _ROLLUP_COLUMNS},
+        )
+        await session.execute(stmt)
+        return len(rollups)
+
+    async def _week_topics(
+        self, chat_id: UUID, session: AsyncSession, *, now: datetime
+    ) -> List[Dict[str, object]]:
+        """Topics for the week, re-asking the LLM only when the chat changed.
+
+        The cached result is reused while fewer than ``TOPICS_MIN_NEW_CHARS``
+        of new text arrived since the last analysis (and it is younger than
+        ``TOPICS_MAX_AGE``, so the sliding window eventually catches up), or
+        when the sampled input hashes the same as last time.
+        """
+        cached = _topics_cache.get(chat_id)
+        if cached is not None and now - cached.analyzed_at < TOPICS_MAX_AGE:
+            new_chars = await session.scalar(
+                select(func.coalesce(func.sum(func.length(DBMessage.text)), 0)).where(
+                    DBMessage.chat_id == chat_id,
+                    DBMessage.created_at > cached.analyzed_at,
+                )
+            )
+            if int(new_chars or 0) < TOPICS_MIN_NEW_CHARS:
+                topics_cache_stats.skipped += 1
+                return cached.topics
+
+        result = await session.execute(
+            select(DBMessage.text)
+            .where(
+                DBMessage.chat_id == chat_id,
+                DBMessage.created_at >= now - ROLLUP_WINDOW,
+                DBMessage.text.isnot(None),
+            )
+            .order_by(DBMessage.created_at)
+        )
+        sample = _topics_sample([text for text in result.scalars().all() if text])
+        digest = hashlib.sha1("\n".join(sample).encode("utf-8")).hexdigest()
+        if cached is not None and cached.digest == digest:
+            topics_cache_stats.unchanged += 1
+            cached.analyzed_at = now
+            _topics_cache.put(chat_id, cached)
+            return cached.topics
+
+        topics = await OpenAIService.analyze_topics(sample)
+        topics_cache_stats.analyzed += 1
+        _topics_cache.put(chat_id, _TopicsEntry(topics=topics, digest=digest, analyzed_at=now))
+        return topics
+
+    async def _calculate_stats(self, chat_id: UUID, session: AsyncSession) -> MessageStats:
+        now = datetime.now(timezone.utc)
+        week_ago = now - timedelta(days=7)
+
+        await self._refresh_rollups(chat_id, session, now=now)
+        result = await session.execute(
+            select(ChatHourlyStats).where(
+                ChatHourlyStats.chat_id == chat_id,
+                ChatHourlyStats.hour_start >= _hour_floor(week_ago),
             )
-        except Exception as exc:  # noqa: BLE001 — OpenAI errors vary
-            logger.warning("Could not analyze topics for chat %s: %s", chat_id, exc)
-            top_topics = []
-
-        stats = MessageStats(
-            chat_id=chat_id,
-            period="week",
-            timestamp=now.replace(tzinfo=None),
-            message_count=message_count,
-            user_count=user_count,
-            avg_length=avg_length,
-            emoji_count=emoji_total,
-            sticker_count=0,
-            top_emojis=dict(emoji_counter.most_common(10)),
-            top_stickers={},
-            top_words=dict(word_counter.most_common(10)),
-            top_topics=top_topics,
-            most_active_hour=most_active_hour,
-            most_active_day=most_active_day,
-            activity_trend=activity_trend,
         )
-        session.add(stats)
+        rollups = list(result.scalars().all())
+
+        if not rollups:
+            values: Dict[str, Any] = {
+                "message_count": 0,
+                "user_count": 0,
+                "avg_length": 0.0,
+                "emoji_count": 0,
+                "top_emojis": {},
+                "top_words": {},
+                "top_topics": [],
+                "most_active_hour": None,
+                "most_active_day": None,
+                "activity_trend": [],
+            }
+        else:
+            values = _week_from_rollups(rollups, now)
+            try:
+                values["top_topics"] = await self._week_topics(chat_id, session, now=now)
+            except Exception as exc:  # noqa: BLE001 — OpenAI errors vary
+                logger.warning("Could not analyze topics for chat %s: %s", chat_id, exc)
+                cached = _topics_cache.get(chat_id)
+                values["top_topics"] = cached.topics if cached is not None else []
+
+        stats = await self._store_stats(chat_id, session, values, now=now)
         await session.commit()
+        stats_cache.put(chat_id, stats)
+        return stats
+
+    async def _store_stats(
+        self, chat_id: UUID, session: AsyncSession, values: Dict[str, Any], *, now: datetime
+    ) -> MessageStats:
+        """Upsert the chat's single ``week`` row and today's history snapshot."""
+        values = {
+            **values,
+            "timestamp": now.replace(tzinfo=None),
+            "sticker_count": 0,
+            "top_stickers": {},
+        }
+        stmt = pg_insert(MessageStats).values(chat_id=chat_id, period="week", **values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[MessageStats.chat_id, MessageStats.period],
+            set_={col: stmt.excluded[col] for col in values},
+        ).returning(MessageStats)
+        result = await session.execute(stmt, execution_options={"populate_existing": True})
+        stats = result.scalar_one()
+
+        if settings.STATS_HISTORY_DAYS > 0:
+            snapshot = {col: values[col] for col in _HISTORY_COLUMNS}
+            history = pg_insert(MessageStatsDaily).values(
+                chat_id=chat_id, day=now.date(), updated_at=now, **snapshot
+            )
+            history = history.on_conflict_do_update(
+                index_elements=[MessageStatsDaily.chat_id, MessageStatsDaily.day],
+                set_={col: history.excluded[col] for col in (*_HISTORY_COLUMNS, "updated_at")},
+            )
+            await session.execute(history)
         return stats
 
     @staticmethod
@@ -280,22 +665,59 @@ class StatsService:
             ts = ts.replace(tzinfo=timezone.utc)
         return datetime.now(timezone.utc) - ts < CACHE_DURATION
 
+    async def refresh_dirty_chats(self) -> int:
+        """Recalculate stats for the chats marked dirty since the last pass.
+
+        Up to ``STATS_CONCURRENCY`` chats run at once, each in its own
+        session. A chat that fails is marked dirty again for the next pass.
+        Returns the number of chats refreshed.
+        """
+        chat_ids = take_dirty_chats()
+        if not chat_ids:
+            return 0
+        semaphore = asyncio.Semaphore(STATS_CONCURRENCY)
+
+        async def _refresh(chat_id: UUID) -> bool:
+            async with semaphore, async_session() as session:
+                try:
+                    await self._calculate_stats(chat_id, session)
+                    return True
+                except Exception as exc:  # noqa: BLE001 — продолжаем по другим чатам
+                    logger.warning("Stats update failed for chat %s: %s", chat_id, exc)
+                    await session.rollback()
+                    mark_chat_dirty(chat_id)
+                    return False
+
+        results = await asyncio.gather(*(_refresh(chat_id) for chat_id in chat_ids))
+        return sum(results)
+
     async def start_periodic_update(self) -> None:
-        """Background loop: refresh stats for every chat every 5 minutes."""
+        """Background loop: every 5 minutes refresh the chats that got messages.
+
+        The dirty set lives in memory, so on start it is seeded with every
+        chat that has messages inside the stats window.
+        """
+        try:
+            async with async_session() as session:
+                result = await session.execute(
+                    select(DBMessage.chat_id)
+                    .where(DBMessage.created_at >= datetime.now(timezone.utc) - ROLLUP_WINDOW)
+                    .distinct()
+                )
+                for chat_id in result.scalars().all():
+                    mark_chat_dirty(chat_id)
+        except Exception as exc:  # noqa: BLE001 — без посева просто ждём новых сообщений
+            logger.warning("Could not seed dirty chats for stats: %s", exc)
+
         while True:
             try:
-                async for session in get_session():
-                    try:
-                        result = await session.execute(select(Chat))
-                        chats = list(result.scalars().all())
-                        for chat in chats:
-                            try:
-                                await self._calculate_stats(chat.id, session)
-                            except Exception as exc:  # noqa: BLE001 — продолжаем по другим чатам
-                                logger.warning("Stats update failed for chat %s: %s", chat.id, exc)
-                                await session.rollback()
-                    finally:
-                        await session.close()
+                refreshed = await self.refresh_dirty_chats()
+                logger.debug(
+                    "Stats pass done: %s chats, cache: %s, topics: %s",
+                    refreshed,
+                    stats_cache.snapshot(),
+                    topics_cache_stats.snapshot(),
+                )
             except asyncio.CancelledError:
                 logger.info("Stats periodic update cancelled")
                 raise
@@ -0,0 +1,157 @@
+"""Participant display names for summaries, cached in ``user_profiles``.
+
+Names come from two places:
+
+- ingest — every saved message carries ``message.from_user``;
+  :func:`remember_user` upserts it (skipped while the same name was written
+  recently by this process, so a busy chat costs one write per
+  ``PROFILE_WRITE_INTERVAL``, not one per message). The handler calls
+  :func:`mark_user_written` once its commit succeeded, so a rolled-back
+  upsert is retried on the next message;
+- :func:`resolve_user_names` — rows younger than ``PROFILE_TTL`` are used
+  as is; the rest are fetched with ``get_chat_member``, at most
+  ``RESOLVE_CONCURRENCY`` at a time, and written back in one upsert.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from aiogram import Bot
+from sqlalchemy import BigInteger, any_, bindparam, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database.models import UserProfile
+
+logger = logging.getLogger(__name__)
+
+PROFILE_TTL = timedelta(days=7)
+PROFILE_WRITE_INTERVAL = timedelta(hours=1)
+RESOLVE_CONCURRENCY = 8
+# Bound on the "recently written" memo used by ``remember_user``.
+RECENT_WRITES_SIZE = 10_000
+
+_Name = Tuple[Optional[str], Optional[str], Optional[str]]
+_recent_writes: Dict[Tuple[int, int], Tuple[float, _Name]] = {}
+
+
+def display_name(
+    user_id: int,
+    first_name: Optional[str],
+    last_name: Optional[str],
+    username: Optional[str] = None,
+) -> str:
+    full = " ".join(p for p in (first_name, last_name) if p).strip()
+    if full:
+        return full
+    return f"@{username}" if username else f"User {user_id}"
+
+
+def _upsert(rows: List[Dict[str, Any]]):
+    stmt = pg_insert(UserProfile).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[UserProfile.chat_telegram_id, UserProfile.user_id],
+        set_={
+            "first_name": stmt.excluded.first_name,
+            "last_name": stmt.excluded.last_name,
+            "username": stmt.excluded.username,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+
+
+def _row(chat_telegram_id: int, user: Any, now: datetime) -> Dict[str, Any]:
+    return {
+        "chat_telegram_id": chat_telegram_id,
+        "user_id": user.id,
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+        "username": user.username,
+        "updated_at": now,
+    }
+
+
+def _name(user: Any) -> _Name:
+    return (user.first_name, user.last_name, user.username)
+
+
+async def remember_user(session: AsyncSession, chat_telegram_id: int, user: Any) -> bool:
+    """Stage an upsert of ``user``'s name (committed with the caller's transaction).
+
+    Returns ``False`` when the same name was written less than
+    ``PROFILE_WRITE_INTERVAL`` ago and nothing was staged. After committing,
+    the caller reports the write with :func:`mark_user_written`.
+    """
+    seen = _recent_writes.get((chat_telegram_id, user.id))
+    if (
+        seen
+        and seen[1] == _name(user)
+        and time.monotonic() - seen[0] < PROFILE_WRITE_INTERVAL.total_seconds()
+    ):
+        return False
+    await session.execute(_upsert([_row(chat_telegram_id, user, datetime.now(timezone.utc))]))
+    return True
+
+
+def mark_user_written(chat_telegram_id: int, user: Any) -> None:
+    """Record that ``user``'s name is committed; call only after ``session.commit()``."""
+    if len(_recent_writes) >= RECENT_WRITES_SIZE:
+        _recent_writes.clear()
+    _recent_writes[(chat_telegram_id, user.id)] = (time.monotonic(), _name(user))
+
+
+async def resolve_user_names(
+    session: AsyncSession,
+    bot: Bot,
+    chat_telegram_id: int,
+    user_ids: Iterable[int],
+) -> Dict[int, str]:
+    """Display names for ``user_ids`` in a chat; unknown users become ``User <id>``."""
+    wanted = sorted(set(user_ids))
+    if not wanted:
+        return {}
+    fresh_after = datetime.now(timezone.utc) - PROFILE_TTL
+    result = await session.execute(
+        select(UserProfile).where(
+            UserProfile.chat_telegram_id == chat_telegram_id,
+            UserProfile.user_id == any_(bindparam("user_ids", wanted, type_=ARRAY(BigInteger))),
+            UserProfile.updated_at >= fresh_after,
+        )
+    )
+    names = {
+        p.user_id: display_name(p.user_id, p.first_name, p.last_name, p.username)
+        for p in result.scalars().all()
+    }
+    missing = [user_id for user_id in wanted if user_id not in names]
+    if not missing:
+        return names
+
+    semaphore = asyncio.Semaphore(RESOLVE_CONCURRENCY)
+
+    async def _fetch(user_id: int) -> Optional[Any]:
+        async with semaphore:
+            try:
+                member = await bot.get_chat_member(chat_telegram_id, user_id)
+            except Exception as exc:  # noqa: BLE001 — TG API может отдать что угодно
+                logger.warning("Could not resolve user %s: %s", user_id, exc)
+                return None
+            return member.user if member else None
+
+    users = await asyncio.gather(*(_fetch(user_id) for user_id in missing))
+    now = datetime.now(timezone.utc)
+    rows = [_row(chat_telegram_id, user, now) for user in users if user is not None]
+    if rows:
+        await session.execute(_upsert(rows))
+        await session.commit()
+    for user_id, user in zip(missing, users):
+        if user is None:
+            names[user_id] = f"User {user_id}"
+        else:
+            names[user_id] = display_name(user_id, user.first_name, user.last_name, user.username)
+    return names
@@ -0,0 +1,63 @@
+"""Tests for the gzip JSONL cold archive."""
+
+from __future__ import annotations
+
+import gzip
+from datetime import date, datetime, timezone
+from uuid import uuid4
+
+from src.services.archive_service import archive_path, iter_archived_messages, write_archive
+
+
+def _row(created_at, chat_id=None, text="hi"):
+    return {
+        "id": uuid4(),
+        "chat_id": chat_id or uuid4(),
+        "message_id": 1,
+        "user_id": 42,
+        "text": text,
+        "created_at": created_at,
+        "thread_id": None,
+    }
+
+
+def test_write_archive_groups_by_moscow_day(tmp_path):
+    # 22:30 UTC May 9 is already May 10 in Moscow.
+    late = _row(datetime(2026, 5, 9, 22, 30, tzinfo=timezone.utc))
+    early = _row(datetime(2026, 5, 9, 8, 0, tzinfo=timezone.utc))
+
+    written = write_archive(tmp_path, [late, early])
+
+    assert written == {date(2026, 5, 10): 1, date(2026, 5, 9): 1}
+    assert archive_path(tmp_path, date(2026, 5, 10)).exists()
+    assert archive_path(tmp_path, date(2026, 5, 9)).parent.name == "2026"
+
+
+def test_roundtrip_restores_types_and_skips_repeats(tmp_path):
+    at = datetime(2026, 5, 9, 8, 0, tzinfo=timezone.utc)
+    first, second = _row(at, text="привет 🙂"), _row(at)
+    write_archive(tmp_path, [first])
+    # A second pass (e.g. a retried purge) appends another gzip member.
+    write_archive(tmp_path, [first, second])
+    with gzip.open(archive_path(tmp_path, date(2026, 5, 9)), "rt", encoding="utf-8") as fh:
+        assert len(fh.readlines()) == 3
+
+    out = list(iter_archived_messages(tmp_path, date(2026, 5, 9), date(2026, 5, 9)))
+
+    assert [r["id"] for r in out] == [first["id"], second["id"]]
+    assert out[0]["text"] == "привет 🙂"
+    assert out[0]["chat_id"] == first["chat_id"]
+    assert out[0]["created_at"] == at
+
+
+def test_iter_archived_messages_filters_chat_and_days(tmp_path):
+    chat = uuid4()
+    mine = _row(datetime(2026, 5, 9, 8, 0, tzinfo=timezone.utc), chat_id=chat)
+    other = _row(datetime(2026, 5, 9, 9, 0, tzinfo=timezone.utc))
+    outside = _row(datetime(2026, 5, 12, 8, 0, tzinfo=timezone.utc), chat_id=chat)
+    write_archive(tmp_path, [mine, other, outside])
+    archive_path(tmp_path, date(2026, 5, 10)).touch()  # empty file is skipped
+
+    out = list(iter_archived_messages(tmp_path, date(2026, 5, 8), date(2026, 5, 11), chat_id=chat))
+
+    assert [r["id"] for r in out] == [mine["id"]]
@@ -142,7 +142,9 @@ def _make_business_message(
     msg.chat.first_name = "Иван"
     msg.chat.last_name = "Петров"
     msg.chat.username = "ivan_p"
-    msg.from_user = SimpleNamespace(id=user_id, is_bot=False)
+    msg.from_user = SimpleNamespace(
+        id=user_id, is_bot=False, first_name="Client", last_name=None, username=None
+    )
     msg.text = text
     msg.caption = None
     msg.date = datetime(2026, 5, 8, 12, 0, tzinfo=timezone.utc)
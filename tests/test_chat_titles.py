@@ -0,0 +1,129 @@
+"""Tests for the background chat-title refresher."""
+
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+from uuid import uuid4
+
+import pytest
+
+from src.database.models import Chat
+from src.services import chat_titles
+from src.services.chat_titles import (
+    TITLE_ERROR_RETRY,
+    TITLE_TTL,
+    refresh_chat_title,
+    refresh_stale_titles,
+)
+
+
+def _chat(name="Old", telegram_id=42) -> Chat:
+    chat = Chat(name=name, telegram_id=telegram_id, type="MIXED", tg_type="group")
+    chat.id = uuid4()
+    return chat
+
+
+@pytest.mark.asyncio
+async def test_refresh_chat_title_stamps_check_time_even_if_unchanged():
+    chat = _chat(name="Same")
+    bot = AsyncMock()
+    bot.get_chat = AsyncMock(return_value=SimpleNamespace(title="Same"))
+    session = AsyncMock()
+
+    assert await refresh_chat_title(bot, session, chat) is True
+
+    assert chat.name == "Same"
+    assert chat.title_checked_at.tzinfo is not None
+    assert chat.updated_at is None  # naive column left to onupdate (BUG-005)
+    session.commit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_refresh_chat_title_stamps_check_time_when_chat_not_found():
+    chat = _chat()
+    bot = AsyncMock()
+    bot.get_chat = AsyncMock(side_effect=Exception("Bad Request: chat not found"))
+    session = AsyncMock()
+    before = datetime.now(timezone.utc)
+
+    assert await refresh_chat_title(bot, session, chat) is False
+
+    assert chat.title_checked_at >= before  # skipped for a full TITLE_TTL
+    assert chat.name == "Old"
+    session.delete.assert_not_awaited()
+    session.commit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_refresh_stale_titles_selects_by_ttl_and_caps_concurrency(monkeypatch):
+    monkeypatch.setattr(chat_titles, "TITLE_CONCURRENCY", 2)
+    chats = {c.id: c for c in (_chat(telegram_id=i) for i in range(5))}
+    list_session = AsyncMock()
+    ids = MagicMock()
+    ids.scalars.return_value.all.return_value = list(chats)
+    list_session.execute = AsyncMock(return_value=ids)
+    chat_session = AsyncMock(get=AsyncMock(side_effect=lambda model, chat_id: chats[chat_id]))
+    queued = iter([list_session] + [chat_session] * 5)
+    opened = []
+
+    def fake_async_session():
+        session = next(queued)
+        session.__aenter__.return_value = session
+        opened.append(session)
+        return session
+
+    running = peak = 0
+
+    async def get_chat(telegram_id):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0)
+        running -= 1
+        if telegram_id == 3:
+            raise RuntimeError("flood wait")
+        return SimpleNamespace(title=f"Chat #{telegram_id}")
+
+    monkeypatch.setattr(chat_titles, "async_session", fake_async_session)
+    now = datetime(2026, 5, 11, 12, 0, tzinfo=timezone.utc)
+
+    refreshed = await refresh_stale_titles(SimpleNamespace(get_chat=get_chat), now=now)
+
+    assert refreshed == 4
+    assert peak == 2
+    assert {c.name for c in chats.values()} == {"Chat #0", "Chat #1", "Chat #2", "Old", "Chat #4"}
+    failed = next(c for c in chats.values() if c.telegram_id == 3)
+    assert failed.title_checked_at <= datetime.now(timezone.utc) - TITLE_TTL + TITLE_ERROR_RETRY
+    assert len(opened) == 6
+    assert list_session.__aexit__.await_count == 1
+    assert chat_session.__aexit__.await_count == 5
+    query = list_session.execute.await_args.args[0]
+    assert "chats.title_checked_at IS NULL OR chats.title_checked_at <" in str(query)
+    assert now - TITLE_TTL in query.compile().params.values()
+
+
+@pytest.mark.asyncio
+async def test_status_command_renders_without_telegram_calls(monkeypatch):
+    from src.config import settings as app_settings
+    from src.handlers.command_handler import status_command
+
+    monkeypatch.setattr(app_settings, "OWNER_ID", 1)
+    chat = _chat(name="Рабочий чат")
+    result = MagicMock()
+    result.scalars.return_value.all.return_value = [chat]
+    session = AsyncMock()
+    session.execute = AsyncMock(return_value=result)
+    msg = MagicMock()
+    msg.from_user.id = 1
+    msg.chat.type = "private"
+    msg.answer = AsyncMock()
+    msg.bot = AsyncMock()
+
+    await status_command(msg, session)
+
+    msg.bot.get_chat.assert_not_awaited()
+    keyboard = msg.answer.await_args.kwargs["reply_markup"].inline_keyboard
+    assert keyboard[0][0].text == "📱 Рабочий чат"
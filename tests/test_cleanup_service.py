@@ -4,11 +4,15 @@ from __future__ import annotations
 
 from datetime import datetime, timedelta, timezone
 from unittest.mock import AsyncMock, MagicMock
+from uuid import uuid4
 
 import pytest
 
 from src.config import settings
+from src.services import cleanup_service
+from src.services.archive_service import iter_archived_messages
 from src.services.cleanup_service import CleanupService, seconds_until_next_cleanup
+from src.services.stats_service import ROLLUP_RETENTION
 
 
 def test_seconds_until_next_cleanup_morning_msk():
@@ -25,16 +29,77 @@ def test_seconds_until_next_cleanup_after_trigger_msk():
     assert 82700 <= secs <= 83000  # ~23 hours
 
 
+def _purge_session(id_batches):
+    """Session whose SELECTs return ``id_batches`` in turn; DELETEs report their size."""
+    batches = iter(id_batches)
+    statements = []
+
+    async def fake_execute(stmt):
+        statements.append(stmt)
+        result = MagicMock()
+        if str(stmt).lower().startswith("select"):
+            result.scalars.return_value.all.return_value = next(batches)
+        else:
+            result.rowcount = 1 if "message_tags" in str(stmt) else 2
+        return result
+
+    session = AsyncMock()
+    session.execute = AsyncMock(side_effect=fake_execute)
+    return session, statements
+
+
 @pytest.mark.asyncio
-async def test_purge_old_messages_uses_ttl(monkeypatch):
+async def test_purge_old_messages_uses_ttl_and_batches(monkeypatch):
     monkeypatch.setattr(settings, "MESSAGE_TTL_DAYS", 30)
+    session, statements = _purge_session([[uuid4(), uuid4()], [uuid4()]])
 
-    captured = {}
+    svc = CleanupService(session)
+    fixed = datetime(2026, 5, 8, 12, 0, tzinfo=timezone.utc)
+    deleted = await svc.purge_old_messages(now_utc=fixed, batch_size=2, pause=0)
+
+    assert deleted == 4
+    assert session.commit.await_count == 2  # one short transaction per batch
+    assert svc.last_purge.snapshot() | {"seconds": 0} == {
+        "batches": 2,
+        "messages": 4,
+        "tags": 2,
+        "contexts": 4,
+        "archived": 0,
+        "seconds": 0,
+        "finished": True,
+    }
+    # Oldest ids first, capped by the batch size, cutoff = ``fixed - 30 days``.
+    select_sql = str(statements[0]).lower()
+    assert "order by messages.created_at" in select_sql and "limit" in select_sql
+    bound = statements[0].compile().params  # type: ignore[attr-defined]
+    assert fixed - timedelta(days=30) in bound.values() and 2 in bound.values()
+    # Dependent rows go before the messages themselves.
+    tables = [str(stmt).split()[2] for stmt in statements[1:4]]
+    assert tables == ["message_tags", "message_contexts", "messages"]
+
+
+@pytest.mark.asyncio
+async def test_purge_old_messages_archives_before_delete(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "MESSAGE_TTL_DAYS", 30)
+    monkeypatch.setattr(settings, "MESSAGE_ARCHIVE_DIR", str(tmp_path))
+    at = datetime(2026, 4, 1, 10, 0, tzinfo=timezone.utc)
+    rows = [
+        {"id": uuid4(), "chat_id": uuid4(), "message_id": n, "user_id": 7, "text": f"m{n}"}
+        | {"created_at": at, "thread_id": None}
+        for n in range(2)
+    ]
+    statements = []
 
     async def fake_execute(stmt):
-        captured["stmt"] = stmt
+        statements.append(stmt)
         result = MagicMock()
-        result.rowcount = 7
+        if str(stmt).lower().startswith("select"):
+            # The archive file must exist before anything is deleted.
+            assert not list(tmp_path.rglob("*.gz"))
+            result.mappings.return_value.all.return_value = rows
+        else:
+            assert list(tmp_path.rglob("*.gz"))
+            result.rowcount = 2
         return result
 
     session = AsyncMock()
@@ -42,18 +107,24 @@ async def test_purge_old_messages_uses_ttl(monkeypatch):
 
     svc = CleanupService(session)
     fixed = datetime(2026, 5, 8, 12, 0, tzinfo=timezone.utc)
-    deleted = await svc.purge_old_messages(now_utc=fixed)
+    await svc.purge_old_messages(now_utc=fixed, batch_size=5, pause=0)
 
-    assert deleted == 7
-    session.commit.assert_awaited()
-    # The compiled SQL must reference the ``messages`` table and the cutoff
-    # parameter must be ``fixed - 30 days``.
-    sql = str(captured["stmt"]).lower()
-    assert "delete" in sql and "messages" in sql
-    expected_threshold = fixed - timedelta(days=30)
-    bound = captured["stmt"].compile().params  # type: ignore[attr-defined]
-    cutoff_value = next(iter(bound.values()))
-    assert cutoff_value == expected_threshold
+    assert svc.last_purge.archived == 2
+    assert "messages.text" in str(statements[0])
+    archived = list(iter_archived_messages(tmp_path, at.date(), at.date()))
+    assert [r["id"] for r in archived] == [r["id"] for r in rows]
+
+
+@pytest.mark.asyncio
+async def test_purge_old_messages_stops_at_time_budget(monkeypatch):
+    monkeypatch.setattr(settings, "MESSAGE_TTL_DAYS", 30)
+    session, _ = _purge_session([[uuid4(), uuid4()]] * 5)
+
+    svc = CleanupService(session)
+    deleted = await svc.purge_old_messages(batch_size=2, time_budget=0, pause=0)
+
+    assert deleted == 2
+    assert svc.last_purge.batches == 1 and not svc.last_purge.finished
 
 
 @pytest.mark.asyncio
@@ -94,3 +165,132 @@ async def test_mark_past_events_emits_update_against_events_table():
     # The cutoff bound parameter must equal ``fixed`` (status='upcoming' AND when_at < cutoff).
     bound = stmt.compile().params  # type: ignore[attr-defined]
     assert fixed in bound.values()
+
+
+@pytest.mark.asyncio
+async def test_purge_old_rollups_uses_retention():
+    session = AsyncMock()
+    result = MagicMock()
+    result.rowcount = 24
+    session.execute = AsyncMock(return_value=result)
+
+    svc = CleanupService(session)
+    fixed = datetime(2026, 5, 8, 12, 0, tzinfo=timezone.utc)
+    deleted = await svc.purge_old_rollups(now_utc=fixed)
+
+    assert deleted == 24
+    session.commit.assert_awaited()
+    stmt = session.execute.call_args.args[0]
+    sql = str(stmt).lower()
+    assert "delete" in sql and "chat_hourly_stats" in sql
+    bound = stmt.compile().params  # type: ignore[attr-defined]
+    assert next(iter(bound.values())) == fixed - ROLLUP_RETENTION
+
+
+@pytest.mark.asyncio
+async def test_purge_old_stats_history_uses_retention(monkeypatch):
+    monkeypatch.setattr(settings, "STATS_HISTORY_DAYS", 90)
+    session = AsyncMock()
+    result = MagicMock()
+    result.rowcount = 5
+    session.execute = AsyncMock(return_value=result)
+
+    svc = CleanupService(session)
+    fixed = datetime(2026, 5, 8, 12, 0, tzinfo=timezone.utc)
+    deleted = await svc.purge_old_stats_history(now_utc=fixed)
+
+    assert deleted == 5
+    session.commit.assert_awaited()
+    stmt = session.execute.call_args.args[0]
+    assert "message_stats_daily" in str(stmt).lower()
+    bound = stmt.compile().params  # type: ignore[attr-defined]
+    assert next(iter(bound.values())) == fixed.date() - timedelta(days=90)
+
+
+def _partition_session(partitioned, names):
+    statements = []
+
+    async def fake_execute(stmt):
+        statements.append(str(stmt))
+        result = MagicMock()
+        result.scalars.return_value.all.return_value = names
+        return result
+
+    session = AsyncMock()
+    session.scalar = AsyncMock(return_value=partitioned)
+    session.execute = AsyncMock(side_effect=fake_execute)
+    return session, statements
+
+
+@pytest.mark.asyncio
+async def test_maintain_partitions_creates_ahead_and_drops_expired(monkeypatch):
+    monkeypatch.setattr(settings, "MESSAGE_TTL_DAYS", 30)
+    monkeypatch.setattr(cleanup_service, "PARTITION_AHEAD_DAYS", 2)
+    # 2026-05-08 12:00 UTC = 15:00 MSK; TTL cutoff = 2026-04-08 15:00 MSK.
+    fixed = datetime(2026, 5, 8, 12, 0, tzinfo=timezone.utc)
+    names = [
+        "messages_p20260407",  # whole day past the cutoff → dropped
+        "messages_p20260408",  # straddles the cutoff → kept for the row purge
+        "messages_p20260508",
+        "messages_p20260509",
+        "messages_default",
+    ]
+    session, statements = _partition_session(True, names)
+
+    created, dropped = await CleanupService(session).maintain_partitions(now_utc=fixed)
+
+    assert (created, dropped) == (1, 1)
+    creates = [s for s in statements if s.startswith("CREATE TABLE")]
+    assert creates == [
+        'CREATE TABLE IF NOT EXISTS "messages_p20260510" PARTITION OF messages '
+        "FOR VALUES FROM ('2026-05-10T00:00:00+03:00') TO ('2026-05-11T00:00:00+03:00')"
+    ]
+    drops = [s for s in statements if not s.startswith(("SELECT", "CREATE"))]
+    assert drops == [
+        'DELETE FROM message_tags WHERE message_id IN (SELECT id FROM "messages_p20260407")',
+        'DELETE FROM message_contexts WHERE message_id IN (SELECT id FROM "messages_p20260407")',
+        'ALTER TABLE messages DETACH PARTITION "messages_p20260407"',
+        'DROP TABLE "messages_p20260407"',
+    ]
+
+
+@pytest.mark.asyncio
+async def test_maintain_partitions_purges_in_batches_when_table_is_not_partitioned(monkeypatch):
+    monkeypatch.setattr(settings, "MESSAGE_TTL_DAYS", 30)
+    session, statements = _purge_session([[uuid4()]])
+    session.scalar = AsyncMock(return_value=False)  # e.g. a DB built by create_all
+    fixed = datetime(2026, 5, 8, 12, 0, tzinfo=timezone.utc)
+
+    svc = CleanupService(session)
+    assert await svc.maintain_partitions(now_utc=fixed) == (0, 0)
+
+    assert svc.partitioned is False
+    assert svc.last_purge.finished and svc.last_purge.batches == 1
+    assert not any("PARTITION" in str(stmt) for stmt in statements)
+    bound = statements[0].compile().params  # type: ignore[attr-defined]
+    assert fixed - timedelta(days=30) in bound.values()
+
+
+@pytest.mark.asyncio
+async def test_maintain_partitions_archives_partition_before_drop(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "MESSAGE_TTL_DAYS", 30)
+    monkeypatch.setattr(settings, "MESSAGE_ARCHIVE_DIR", str(tmp_path))
+    monkeypatch.setattr(cleanup_service, "PARTITION_AHEAD_DAYS", 0)
+    fixed = datetime(2026, 5, 8, 12, 0, tzinfo=timezone.utc)
+    at = datetime(2026, 4, 7, 9, 0, tzinfo=timezone.utc)
+    row = {"id": uuid4(), "chat_id": uuid4(), "message_id": 1, "user_id": 7, "text": "hi"}
+    row |= {"created_at": at, "thread_id": None}
+    session, statements = _partition_session(True, ["messages_p20260407", "messages_p20260508"])
+
+    async def chunks():
+        assert not any(s.startswith("DELETE") for s in statements)
+        yield [row]
+
+    streamed = MagicMock()
+    streamed.mappings.return_value.partitions.return_value = chunks()
+    session.stream = AsyncMock(return_value=streamed)
+
+    assert await CleanupService(session).maintain_partitions(now_utc=fixed) == (0, 1)
+    assert 'FROM "messages_p20260407"' in str(session.stream.await_args.args[0])
+    archived = list(iter_archived_messages(tmp_path, at.date(), at.date()))
+    assert [r["id"] for r in archived] == [row["id"]]
@@ -84,7 +84,8 @@ async def test_update_chat_title_keeps_chat_on_chat_not_found():
     await update_chat_title(message, chat.id, session)
 
     session.delete.assert_not_awaited()
-    session.commit.assert_not_awaited()
+    assert chat.title_checked_at is not None  # not asked again until TITLE_TTL
+    session.commit.assert_awaited_once()
 
 
 def test_format_chat_name_falls_back_to_telegram_id():
@@ -453,3 +454,80 @@ async def test_glossary_suggest_skips_chats_without_recent_messages(monkeypatch)
     msg.answer.assert_awaited_once()
     args, _ = msg.answer.await_args
     assert "ни в одном нет сообщений" in args[0]
+
+
+# ---------------------------------------------------------------------------
+# /digest — archived past days vs. rebuild
+# ---------------------------------------------------------------------------
+
+
+def _owner_digest_message(monkeypatch):
+    from src.config import settings as app_settings
+
+    monkeypatch.setattr(app_settings, "OWNER_ID", 1)
+    msg = MagicMock()
+    msg.from_user.id = 1
+    msg.chat.type = "private"
+    msg.answer = AsyncMock()
+    msg.bot = AsyncMock()
+    return msg
+
+
+@pytest.mark.asyncio
+async def test_digest_command_serves_past_day_from_archive(monkeypatch):
+    from src.handlers.command_handler import digest_command
+    from src.services.digest_service import DigestService
+
+    msg = _owner_digest_message(monkeypatch)
+    command = MagicMock()
+    command.args = "2026-05-08"
+    send_stored = AsyncMock(return_value=4)
+    send_for_day = AsyncMock()
+    monkeypatch.setattr(DigestService, "send_stored", send_stored)
+    monkeypatch.setattr(DigestService, "send_for_day", send_for_day)
+
+    await digest_command(msg, command, AsyncMock())
+
+    send_stored.assert_awaited_once()
+    send_for_day.assert_not_awaited()
+    assert "архива" in msg.answer.await_args.args[0]
+
+
+@pytest.mark.asyncio
+async def test_digest_command_rebuild_skips_archive(monkeypatch):
+    from datetime import date
+
+    from src.handlers.command_handler import digest_command
+    from src.services.digest_service import DigestService
+
+    msg = _owner_digest_message(monkeypatch)
+    command = MagicMock()
+    command.args = "2026-05-08 rebuild"
+    send_stored = AsyncMock(return_value=4)
+    send_for_day = AsyncMock(return_value=2)
+    monkeypatch.setattr(DigestService, "send_stored", send_stored)
+    monkeypatch.setattr(DigestService, "send_for_day", send_for_day)
+
+    await digest_command(msg, command, AsyncMock())
+
+    send_stored.assert_not_awaited()
+    send_for_day.assert_awaited_once()
+    assert send_for_day.await_args.args[0] == date(2026, 5, 8)
+    assert send_for_day.await_args.kwargs == {"record": False}
+
+
+@pytest.mark.asyncio
+async def test_digest_command_rebuilds_when_archive_is_empty(monkeypatch):
+    from src.handlers.command_handler import digest_command
+    from src.services.digest_service import DigestService
+
+    msg = _owner_digest_message(monkeypatch)
+    command = MagicMock()
+    command.args = "2026-05-08"
+    monkeypatch.setattr(DigestService, "send_stored", AsyncMock(return_value=None))
+    send_for_day = AsyncMock(return_value=1)
+    monkeypatch.setattr(DigestService, "send_for_day", send_for_day)
+
+    await digest_command(msg, command, AsyncMock())
+
+    send_for_day.assert_awaited_once()
@@ -2,14 +2,24 @@
 
 from __future__ import annotations
 
+import asyncio
 from datetime import datetime, timedelta, timezone
+from decimal import Decimal
 from unittest.mock import AsyncMock, MagicMock
 from uuid import uuid4
 
 import pytest
+from sqlalchemy.dialects import postgresql
 
-from src.database.models import DBMessage, MessageContext, MessageTag, MessageThread, Tag
-from src.services.context_service import ContextService, _parse_message_analysis
+from src.database.models import DBMessage, MessageContext, MessageThread
+from src.services import context_service as context_service_module
+from src.services.context_service import (
+    SUMMARY_QUIET,
+    ContextService,
+    note_thread_message,
+    summarize_due_threads,
+    take_due_threads,
+)
 
 
 @pytest.fixture
@@ -66,61 +76,234 @@ async def test_get_or_create_thread_new(context_service):
 
 
 @pytest.mark.asyncio
-async def test_analyze_message_parses_tags_and_importance(context_service):
-    msg = DBMessage(text="Test message about technology")
+async def test_analyze_message_goes_through_the_chat_batcher(context_service, monkeypatch):
+    analyzer = AsyncMock()
+    analyzer.analyze = AsyncMock(return_value=(["tech", "question"], 0.7))
+    monkeypatch.setattr(context_service_module, "message_analyzer", analyzer)
+    msg = DBMessage(chat_id=uuid4(), text="Test message about technology")
+
     tags, importance = await context_service.analyze_message(msg)
 
     assert tags == ["tech", "question"]
     assert importance == 0.7
-    context_service.openai.chat_completion.assert_awaited_once()
+    analyzer.analyze.assert_awaited_once_with(msg.chat_id, "Test message about technology")
+
+
+@pytest.fixture(autouse=True)
+def _empty_tag_cache(monkeypatch):
+    monkeypatch.setattr(context_service_module, "_tag_ids", {})
+
+
+def _result_with_rows(rows):
+    result = MagicMock()
+    result.all = MagicMock(return_value=rows)
+    return result
+
+
+@pytest.mark.asyncio
+async def test_resolve_tag_ids_existing_single_select(context_service):
+    tag_id = uuid4()
+    context_service.session.execute = AsyncMock(return_value=_result_with_rows([("tech", tag_id)]))
+
+    result = await context_service.resolve_tag_ids(["tech", "#tech"])
+
+    assert result == [tag_id]
+    context_service.session.execute.assert_awaited_once()
+    sql = str(
+        context_service.session.execute.await_args.args[0].compile(dialect=postgresql.dialect())
+    )
+    assert "tags.name = ANY (%(names)s::VARCHAR[])" in sql
+    context_service.session.commit.assert_not_awaited()
+
+    # Second lookup comes from the in-process cache.
+    assert await context_service.resolve_tag_ids(["tech"]) == [tag_id]
+    context_service.session.execute.assert_awaited_once()
 
 
 @pytest.mark.asyncio
-async def test_get_or_create_tags_existing(context_service):
-    tag = Tag(id=uuid4(), name="tech")
-    context_service.session.execute = AsyncMock(return_value=_result_with_scalar(tag))
+async def test_resolve_tag_ids_inserts_missing_in_one_statement(context_service):
+    known, new_a, new_b = uuid4(), uuid4(), uuid4()
+    context_service.session.execute = AsyncMock(
+        side_effect=[
+            _result_with_rows([("tech", known)]),
+            _result_with_rows([("a", new_a), ("b", new_b)]),
+        ]
+    )
 
-    result = await context_service.get_or_create_tags(["tech"])
+    result = await context_service.resolve_tag_ids(["#b", "tech", " ", "a"])
 
-    assert result == [tag]
+    assert result == [new_b, known, new_a]
+    insert = context_service.session.execute.await_args_list[1].args[0]
+    sql = str(insert.compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT (name) DO NOTHING RETURNING tags.name, tags.id" in sql
+    context_service.session.commit.assert_awaited_once()
     context_service.session.add.assert_not_called()
 
 
 @pytest.mark.asyncio
-async def test_get_or_create_tags_new(context_service):
-    context_service.session.execute = AsyncMock(return_value=_result_with_scalar(None))
+async def test_resolve_tag_ids_picks_up_concurrently_created_tag(context_service):
+    tag_id = uuid4()
+    context_service.session.execute = AsyncMock(
+        side_effect=[
+            _result_with_rows([]),
+            _result_with_rows([]),  # lost the race: ON CONFLICT returned nothing
+            _result_with_rows([("newtag", tag_id)]),
+        ]
+    )
 
-    result = await context_service.get_or_create_tags(["#newtag"])
+    assert await context_service.resolve_tag_ids(["#newtag"]) == [tag_id]
 
-    assert len(result) == 1
-    assert result[0].name == "newtag"
-    context_service.session.add.assert_called_once()
-    context_service.session.commit.assert_awaited()
+
+@pytest.mark.asyncio
+async def test_resolve_tag_ids_keeps_cache_hits_when_cache_overflows(context_service, monkeypatch):
+    monkeypatch.setattr(context_service_module, "TAG_CACHE_SIZE", 2)
+    cached, other, new = uuid4(), uuid4(), uuid4()
+    context_service_module._tag_ids.update({"tech": cached, "old": other})
+    context_service.session.execute = AsyncMock(return_value=_result_with_rows([("idea", new)]))
+
+    result = await context_service.resolve_tag_ids(["tech", "idea"])
+
+    assert result == [cached, new]
+    assert context_service_module._tag_ids == {"tech": cached, "idea": new}
+
+
+@pytest.mark.asyncio
+async def test_add_tags_to_message_by_id(context_service):
+    msg = DBMessage(id=uuid4())
+    tag_ids = [uuid4(), uuid4()]
+
+    await context_service.add_tags_to_message(msg, tag_ids, is_auto=False)
+
+    added = [call.args[0] for call in context_service.session.add.call_args_list]
+    assert [(mt.message_id, mt.tag_id, mt.is_auto) for mt in added] == [
+        (msg.id, tag_ids[0], False),
+        (msg.id, tag_ids[1], False),
+    ]
+    context_service.session.commit.assert_awaited_once()
 
 
 @pytest.mark.asyncio
 async def test_update_thread_context_creates_new(context_service):
-    thread = MessageThread(id=uuid4(), chat_id=uuid4())
+    thread_id = uuid4()
+    now = datetime.now(timezone.utc)
+    # Newest first, as the delta query returns them.
     messages = [
-        DBMessage(text="First", created_at=datetime.now(timezone.utc) - timedelta(minutes=2)),
-        DBMessage(text="Second", created_at=datetime.now(timezone.utc) - timedelta(minutes=1)),
+        DBMessage(text="Second", created_at=now - timedelta(minutes=1)),
+        DBMessage(text="First", created_at=now - timedelta(minutes=2)),
     ]
 
     context_service.openai.chat_completion = AsyncMock(return_value="Brief summary.")
     context_service.session.execute = AsyncMock(
         side_effect=[
-            _result_with_scalars(messages),
             _result_with_scalar(None),
+            _result_with_scalars(messages),
         ]
     )
 
-    await context_service.update_thread_context(thread)
+    assert await context_service.update_thread_context(thread_id) is True
 
     context_service.session.add.assert_called_once()
     added = context_service.session.add.call_args[0][0]
     assert isinstance(added, MessageContext)
-    assert added.thread_id == thread.id
+    assert added.thread_id == thread_id
     assert added.context_summary == "Brief summary."
+    assert added.summary_through == messages[0].created_at
+    prompt = context_service.openai.chat_completion.await_args.args[0]
+    assert prompt.index("- First") < prompt.index("- Second")
+
+
+@pytest.mark.asyncio
+async def test_update_thread_context_folds_delta_into_previous_summary(context_service):
+    thread_id = uuid4()
+    through = datetime.now(timezone.utc) - timedelta(hours=1)
+    context = MessageContext(
+        thread_id=thread_id, context_summary="Old summary.", summary_through=through
+    )
+    new = DBMessage(text="Fresh news", created_at=through + timedelta(minutes=5))
+
+    context_service.openai.chat_completion = AsyncMock(return_value="Updated summary.")
+    context_service.session.execute = AsyncMock(
+        side_effect=[_result_with_scalar(context), _result_with_scalars([new])]
+    )
+
+    assert await context_service.update_thread_context(thread_id) is True
+
+    delta_query = context_service.session.execute.await_args_list[1].args[0]
+    assert "messages.created_at > " in str(delta_query)
+    prompt = context_service.openai.chat_completion.await_args.args[0]
+    assert "Old summary." in prompt and "- Fresh news" in prompt
+    assert context.context_summary == "Updated summary."
+    assert context.summary_through == new.created_at
+    context_service.session.add.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_update_thread_context_without_new_messages_skips_llm(context_service):
+    context = MessageContext(context_summary="Old", summary_through=datetime.now(timezone.utc))
+    context_service.session.execute = AsyncMock(
+        side_effect=[_result_with_scalar(context), _result_with_scalars([])]
+    )
+
+    assert await context_service.update_thread_context(uuid4()) is False
+    context_service.openai.chat_completion.assert_not_awaited()
+    context_service.session.commit.assert_not_awaited()
+
+
+def test_take_due_threads_debounces(monkeypatch):
+    monkeypatch.setattr(context_service_module, "_pending_threads", {})
+    monkeypatch.setattr(context_service_module, "SUMMARY_MIN_MESSAGES", 3)
+    busy, quiet, active = uuid4(), uuid4(), uuid4()
+    monkeypatch.setattr(context_service_module.time, "monotonic", lambda: 1000.0)
+    note_thread_message(busy, count=3)
+    note_thread_message(quiet)
+    monkeypatch.setattr(context_service_module.time, "monotonic", lambda: 1500.0)
+    note_thread_message(active)
+
+    # 10 minutes after ``quiet``'s last message, 100 s after ``active``'s.
+    due = take_due_threads(now=1000.0 + SUMMARY_QUIET.total_seconds())
+
+    assert due == {busy: 3, quiet: 1}
+    assert take_due_threads(now=1000.0 + SUMMARY_QUIET.total_seconds()) == {}
+    assert set(context_service_module._pending_threads) == {active}
+
+
+@pytest.mark.asyncio
+async def test_summarize_due_threads_caps_concurrency_and_requeues_failures(monkeypatch):
+    monkeypatch.setattr(context_service_module, "_pending_threads", {})
+    monkeypatch.setattr(context_service_module, "SUMMARY_CONCURRENCY", 2)
+    threads = [uuid4() for _ in range(5)]
+    for thread_id in threads:
+        note_thread_message(thread_id, count=context_service_module.SUMMARY_MIN_MESSAGES)
+    running = peak = 0
+
+    async def fake_update(self, thread_id):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0)
+        running -= 1
+        if thread_id == threads[0]:
+            raise RuntimeError("LLM down")
+        return True
+
+    sessions: list = []
+
+    def fake_async_session():
+        session = AsyncMock()
+        session.__aenter__.return_value = session
+        sessions.append(session)
+        return session
+
+    monkeypatch.setattr(ContextService, "update_thread_context", fake_update)
+    monkeypatch.setattr(context_service_module, "async_session", fake_async_session)
+    monkeypatch.setattr(context_service_module, "OpenAIService", MagicMock)
+
+    assert await summarize_due_threads() == 4
+    assert peak == 2
+    assert all(session.__aexit__.await_count == 1 for session in sessions)  # closed
+    pending = context_service_module._pending_threads
+    assert set(pending) == {threads[0]}
+    assert pending[threads[0]].new_messages == context_service_module.SUMMARY_MIN_MESSAGES
 
 
 @pytest.mark.asyncio
@@ -148,40 +331,44 @@ async def test_find_related_threads_by_similarity(context_service):
 async def test_get_thread_stats_returns_dict(context_service):
     thread = MessageThread(id=uuid4(), chat_id=uuid4())
     now = datetime.now(timezone.utc)
-    messages = [
-        DBMessage(
-            id=uuid4(),
-            text="First",
-            created_at=now - timedelta(hours=1),
-            user_id=1,
-            tags=[
-                MessageTag(tag=Tag(name="tech")),
-                MessageTag(tag=Tag(name="question")),
-            ],
-        ),
-        DBMessage(
-            id=uuid4(),
-            text="Second message",
-            created_at=now,
-            user_id=2,
-            tags=[MessageTag(tag=Tag(name="tech"))],
-        ),
-    ]
-    context_service.session.execute = AsyncMock(return_value=_result_with_scalars(messages))
+    row = (thread.id, 2, 2, now - timedelta(hours=1), now, Decimal("9.5"), ["tech", "question"])
+    context_service.session.execute = AsyncMock(return_value=_result_with_rows([row]))
 
     stats = await context_service.get_thread_stats(thread)
 
     assert stats["message_count"] == 2
     assert stats["unique_users"] == 2
-    assert "tech" in stats["top_tags"]
+    assert stats["top_tags"] == ["tech", "question"]
     assert stats["duration_hours"] == pytest.approx(1.0, rel=0.1)
+    assert stats["avg_message_length"] == 9.5
+    assert stats["messages_per_hour"] == pytest.approx(2.0, rel=0.1)
+
 
+@pytest.mark.asyncio
+async def test_get_threads_stats_is_one_aggregate_query(context_service):
+    busy, quiet, empty = uuid4(), uuid4(), uuid4()
+    now = datetime.now(timezone.utc)
+    rows = [
+        (busy, 10, 3, now - timedelta(hours=2), now, Decimal("12"), ["tech"]),
+        (quiet, 1, 1, now, now, Decimal("4"), None),
+    ]
+    context_service.session.execute = AsyncMock(return_value=_result_with_rows(rows))
 
-def test_parse_message_analysis_handles_messy_input():
-    tags, importance = _parse_message_analysis("tags: a , b ,c\nimportance: 1.5\nextra noise")
-    assert tags == ["a", "b", "c"]
-    assert importance == 1.0  # clamped
+    stats = await context_service.get_threads_stats([busy, quiet, empty])
 
-    tags, importance = _parse_message_analysis("nothing useful")
-    assert tags == []
-    assert importance == 0.5
+    assert set(stats) == {busy, quiet}
+    assert stats[quiet]["top_tags"] == [] and stats[quiet]["messages_per_hour"] == 1.0
+    context_service.session.execute.assert_awaited_once()
+    sql = str(
+        context_service.session.execute.await_args.args[0].compile(dialect=postgresql.dialect())
+    )
+    assert "WITH tag_ranks AS" in sql
+    assert "row_number() OVER (PARTITION BY messages.thread_id" in sql
+    assert "GROUP BY messages.thread_id" in sql
+    assert "count(DISTINCT messages.user_id)" in sql
+
+
+@pytest.mark.asyncio
+async def test_get_threads_stats_empty_input_skips_query(context_service):
+    assert await context_service.get_threads_stats([]) == {}
+    context_service.session.execute.assert_not_awaited()
@@ -11,6 +11,7 @@ import pytest
 from src.services.digest_service import (
     DigestService,
     _ChatDigestItem,
+    _classification_batches,
     _format_messages,
     _partner_label_for,
     is_within_24h,
@@ -186,6 +187,129 @@ def test_has_urgency_keyword_ignores_non_urgent(raw):
     assert has_urgency_keyword(raw) is False, f"expected not-urgent for {raw!r}"
 
 
+# Phrases from the cases above plus the shapes the fast path targets.
+_DEADLINE_CORPUS = [
+    "до пятницы",
+    "к пятнице",
+    "в следующую пятницу",
+    "до 12.05",
+    "12.05.2026",
+    "до 12 мая",
+    "сегодня",
+    "завтра",
+    "до завтра",
+    "послезавтра",
+    "до конца дня",
+    "к концу дня",
+    "до конца недели",
+    "к выходным",
+    "на выходных",
+    "до выходных",
+    "в пн утром",
+    "в среду вечером",
+    "пт 15:00",
+    "в четверг 12:30",
+    "18:00",
+    "в 9:05",
+    "вечером",
+    "2026-05-12 18:00",
+    "завтра 10:00",
+    "29.02.2027",
+]
+_DEADLINE_BASES = [
+    datetime(2026, 5, 8, 23, 50),  # _NOW in МСК is 02:50 Sat
+    datetime(2026, 5, 15, 10, 0),  # Friday, before 18:00
+    datetime(2026, 5, 15, 17, 30),  # dateparser's UTC-offset quirk window
+    datetime(2026, 5, 15, 23, 59, 30),
+    datetime(2026, 7, 31, 20, 0),  # month-end roll-over → dateparser
+    datetime(2026, 12, 31, 22, 0),
+]
+
+
+@pytest.mark.parametrize("base", _DEADLINE_BASES, ids=lambda b: b.isoformat())
+def test_fast_parse_deadline_matches_dateparser_on_corpus(base):
+    from src.services.digest_service import (
+        _dateparser_deadline,
+        _fast_parse_deadline,
+        _normalize_deadline_phrase,
+    )
+
+    fast_hits = 0
+    for raw in _DEADLINE_CORPUS:
+        normalised = _normalize_deadline_phrase(raw)
+        fast = _fast_parse_deadline(normalised, base)
+        if fast is None:
+            continue
+        fast_hits += 1
+        slow = _dateparser_deadline(normalised, base)
+        assert slow is not None, f"{raw!r}: fast path answered, dateparser did not"
+        assert fast == slow and fast.utcoffset() == slow.utcoffset(), f"{raw!r}: {fast} != {slow}"
+    # Weekdays, сегодня/завтра, ISO dates and times never reach dateparser.
+    assert fast_hits >= 20
+
+
+@pytest.mark.parametrize("raw", ["до 12 мая", "29.02.2027", "через неделю"])
+def test_fast_parse_deadline_defers_unknown_shapes(raw):
+    from src.services.digest_service import _fast_parse_deadline, _normalize_deadline_phrase
+
+    assert _fast_parse_deadline(_normalize_deadline_phrase(raw), datetime(2026, 5, 9)) is None
+
+
+def test_parse_deadline_memo_hits_same_phrase_same_day():
+    from src.services import digest_service as ds
+
+    ds.clear_deadline_memo()
+    with patch.object(ds, "_dateparser_deadline", wraps=ds._dateparser_deadline) as slow:
+        first = parse_deadline("до 12 мая", now_utc=_NOW)
+        again = parse_deadline("До 12 мая ", now_utc=_NOW + timedelta(minutes=5))
+    assert first == again
+    slow.assert_called_once()
+    assert ds.deadline_memo_stats.hits == 1
+    assert ds.deadline_memo_stats.misses == 1
+
+
+def test_parse_deadline_memo_keys_on_reference_day_and_hour():
+    from src.services import digest_service as ds
+
+    ds.clear_deadline_memo()
+    # Date-anchored fast-path shape: same day, other hour → still a hit.
+    parse_deadline("до пятницы", now_utc=_NOW)
+    parse_deadline("к пятнице", now_utc=_NOW + timedelta(hours=3))
+    assert ds.deadline_memo_stats.hits == 1
+    # Next day → miss, and the answer moves with the reference day.
+    sat = parse_deadline("до пятницы", now_utc=_NOW)
+    fri = parse_deadline("до пятницы", now_utc=_NOW + timedelta(days=6))
+    assert fri != sat
+    # dateparser fallback is cached per hour.
+    parse_deadline("до 12 мая", now_utc=_NOW)
+    parse_deadline("до 12 мая", now_utc=_NOW + timedelta(hours=1))
+    assert ds.deadline_memo_stats.snapshot()["misses"] == 4
+
+
+def test_parse_deadline_fast_shape_falling_back_to_dateparser_keys_on_hour():
+    from src.services import digest_service as ds
+
+    ds.clear_deadline_memo()
+    # "в пятницу" matches the fast regex but needs dateparser (no time given).
+    with patch.object(ds, "_dateparser_deadline", wraps=ds._dateparser_deadline) as slow:
+        parse_deadline("в пятницу", now_utc=_NOW)
+        parse_deadline("в пятницу", now_utc=_NOW + timedelta(minutes=5))
+        parse_deadline("в пятницу", now_utc=_NOW + timedelta(hours=1))
+    assert slow.call_count == 2
+    stats = ds.deadline_memo_stats.snapshot()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+
+
+def test_parse_deadline_bare_time_bypasses_memo():
+    from src.services import digest_service as ds
+
+    ds.clear_deadline_memo()
+    parse_deadline("18:00", now_utc=_NOW)
+    parse_deadline("18:00", now_utc=_NOW)
+    stats = ds.deadline_memo_stats.snapshot()
+    assert (stats["hits"], stats["misses"], stats["bypassed"]) == (0, 0, 2)
+
+
 def test_is_within_24h_true_for_near_future():
     now = datetime(2026, 5, 8, 12, 0, tzinfo=timezone.utc)
     soon = now + timedelta(hours=10)
@@ -349,6 +473,44 @@ def test_sanitize_resolves_commit_event_overlap():
     assert len(out_b["events"]) == 0
 
 
+def test_message_index_matches_substring_semantics():
+    """The index must answer exactly what ``x in transcript`` used to."""
+    import random
+
+    from src.services.digest_service import _build_message_index
+
+    rng = random.Random(7)
+    for _ in range(200):
+        transcript = "\n".join(
+            f"Я: встреча {rng.randint(0, 40)}.{rng.randint(1, 12):02d} в "
+            f"{rng.randint(0, 29)}:{rng.randint(0, 599):02d}, код {rng.randint(0, 99999)}"
+            for _ in range(3)
+        )
+        index = _build_message_index(transcript)
+        for hh in map(str, range(0, 30)):
+            for mm in ("00", "05", "30", "59"):
+                old = f"{hh}:{mm}" in transcript or f"{int(hh):02d}:{mm}" in transcript
+                assert index.has_time(hh, mm) is old, (transcript, hh, mm)
+        for day in map(str, range(0, 100)):
+            assert index.has_day(day) is (day in transcript), (transcript, day)
+
+
+def test_message_index_memoises_urgency_and_keys():
+    from src.services.digest_service import _build_message_index
+
+    index = _build_message_index("Я: пришлю срочно. Маша: ок, жду!\nМаша: отчёт до пятницы")
+    assert index.sentences["пришлю срочно"] is True
+    with patch("src.services.digest_service.has_urgency_keyword") as check:
+        # Source sentences and repeats answer from the index.
+        assert index.is_urgent("Пришлю  срочно") is True
+        assert index.is_urgent("отчёт до пятницы") is False
+        check.return_value = True
+        assert index.is_urgent("ASAP нужен ответ") is True
+        assert index.is_urgent("asap нужен ответ") is True
+    check.assert_called_once()
+    assert index.key("  Открытие  офиса ") == "открытие офиса"
+
+
 # ---------------------------------------------------------------------------
 # Author normalisation in messages
 # ---------------------------------------------------------------------------
@@ -497,6 +659,41 @@ async def test_send_for_day_processes_each_chat():
     assert "My Chat" in digest_entry.body_md  # chat block
 
 
+@pytest.mark.asyncio
+async def test_send_for_day_does_not_record_when_nothing_was_delivered():
+    """A Telegram outage must leave the day unrecorded so the catch-up retries it."""
+    chat = SimpleNamespace(
+        id="chat-uuid",
+        telegram_id=-100123,
+        name="My Chat",
+        tg_type="supergroup",
+        business_connection_id=None,
+        classification="business",
+    )
+    items = [_ChatDigestItem(chat=chat, messages=[SimpleNamespace(text="hello", user_id=42)])]
+    session = AsyncMock()
+    session.execute = AsyncMock(return_value=_result_returning(scalar=None))
+    session.add = MagicMock()
+    bot = AsyncMock()
+    bot.send_message = AsyncMock(side_effect=ConnectionError("telegram is down"))
+
+    svc = DigestService(session, bot)
+    with patch.object(DigestService, "collect", AsyncMock(return_value=items)):
+        with patch.object(
+            DigestService,
+            "_extract",
+            AsyncMock(return_value={"summary_md": "Sample.", "commitments": []}),
+        ):
+            with patch.object(DigestService, "_persist", AsyncMock()):
+                with pytest.raises(RuntimeError, match="not delivered"):
+                    await svc.send_for_day(date(2026, 5, 8), record=True)
+
+    assert bot.send_message.await_count == 2  # header + block, both failed
+    session.add.assert_not_called()
+    session.commit.assert_not_awaited()
+    session.rollback.assert_awaited_once()
+
+
 @pytest.mark.asyncio
 async def test_send_for_day_records_body_on_quiet_day():
     """TECH-010: even on a silent day, the canned message goes into body_md."""
@@ -630,3 +827,201 @@ def test_render_block_unclassified_uses_question_badge():
     block = _new_svc()._render_block(item, {"summary_md": ""})
 
     assert block.startswith("❓ ")
+
+
+# ---------------------------------------------------------------------------
+# _persist — bulk INSERT / UPDATE inside a per-chat SAVEPOINT
+# ---------------------------------------------------------------------------
+
+
+def _bulk_session():
+    session = AsyncMock()
+    nested = MagicMock()
+    nested.__aenter__ = AsyncMock(return_value=None)
+    nested.__aexit__ = AsyncMock(return_value=False)
+    session.begin_nested = MagicMock(return_value=nested)
+    return session
+
+
+@pytest.mark.asyncio
+async def test_persist_issues_one_insert_per_table_and_one_closure_update():
+    from uuid import uuid4
+
+    from sqlalchemy.dialects import postgresql
+
+    chat = SimpleNamespace(id=uuid4())
+    closed_done, closed_cancelled = uuid4(), uuid4()
+    extracted = {
+        "commitments": [
+            {"direction": "from_me", "text": "пришлю отчёт", "deadline_raw": "до пятницы"},
+            {"direction": "to_me", "text": "позвонит завтра утром"},
+            {"direction": "sideways", "text": "ignored"},
+        ],
+        "events": [{"description": "ужин с командой", "when_raw": None}],
+        "closed_commitments": [
+            {"id": str(closed_done), "reason": "completed"},
+            {"id": str(closed_cancelled), "reason": "cancelled"},
+            {"id": "not-a-uuid", "reason": "completed"},
+        ],
+    }
+    session = _bulk_session()
+
+    await DigestService(session, MagicMock())._persist(chat, extracted)
+
+    session.begin_nested.assert_called_once()
+    session.get.assert_not_called()
+    session.commit.assert_not_awaited()  # committed once per run by send_for_day
+    stmts = [c.args[0] for c in session.execute.await_args_list]
+    assert len(stmts) == 3
+
+    dialect = postgresql.asyncpg.dialect()
+    commits_sql = str(stmts[0].compile(dialect=dialect))
+    assert commits_sql.startswith("INSERT INTO commitments")
+    assert commits_sql.count("), (") == 1  # two VALUES tuples, one statement
+    assert str(stmts[1].compile(dialect=dialect)).startswith("INSERT INTO events")
+
+    update_compiled = stmts[2].compile(dialect=dialect)
+    update_sql = str(update_compiled)
+    assert update_sql.startswith("UPDATE commitments")
+    assert "= ANY (" in update_sql and "commitments.chat_id =" in update_sql
+    assert set(update_compiled.params["ids"]) == {closed_done, closed_cancelled}
+
+
+@pytest.mark.asyncio
+async def test_persist_is_noop_when_nothing_extracted():
+    session = _bulk_session()
+    await DigestService(session, MagicMock())._persist(
+        SimpleNamespace(id="chat"), {"commitments": [], "events": []}
+    )
+
+    session.begin_nested.assert_not_called()
+    session.execute.assert_not_awaited()
+
+
+# ---------------------------------------------------------------------------
+# send_stored — historical /digest served from daily_digests.body_md
+# ---------------------------------------------------------------------------
+
+
+@pytest.mark.asyncio
+async def test_send_stored_resends_recorded_body_without_llm():
+    entry = SimpleNamespace(body_md="📊 *Дайджест*\n\n💼 *Маша*", chat_count=3)
+    session = AsyncMock()
+    session.execute = AsyncMock(return_value=_result_returning(scalar=entry))
+    bot = AsyncMock()
+
+    svc = DigestService(session, bot)
+    with patch.object(DigestService, "_extract", AsyncMock()) as extract:
+        n = await svc.send_stored(date(2026, 5, 8))
+
+    assert n == 3
+    extract.assert_not_awaited()
+    bot.send_message.assert_awaited_once()
+    assert bot.send_message.await_args.args[1] == entry.body_md
+    session.commit.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_send_stored_returns_none_without_body():
+    session = AsyncMock()
+    session.execute = AsyncMock(
+        return_value=_result_returning(scalar=SimpleNamespace(body_md=None, chat_count=2))
+    )
+    bot = AsyncMock()
+
+    assert await DigestService(session, bot).send_stored(date(2026, 5, 8)) is None
+    bot.send_message.assert_not_awaited()
+
+
+# ---------------------------------------------------------------------------
+# Batched classification suggestions
+# ---------------------------------------------------------------------------
+
+
+def _classify_items(n):
+    return [
+        _ChatDigestItem(
+            chat=SimpleNamespace(
+                id=f"chat-{i}", telegram_id=100 + i, name=f"Контакт {i}", classification=None
+            ),
+            messages=[SimpleNamespace(text=f"привет {i}", user_id=100 + i)],
+        )
+        for i in range(n)
+    ]
+
+
+def test_classification_batches_respect_size_and_keys():
+    batches = _classification_batches(_classify_items(5), size=2)
+    assert [len(b) for b in batches] == [2, 2, 1]
+    assert [k for b in batches for k, _ in b] == ["c1", "c2", "c3", "c4", "c5"]
+
+
+@pytest.mark.asyncio
+async def test_classify_and_send_cards_uses_one_call_per_batch():
+    items = _classify_items(3)
+    answer = {
+        "results": [
+            {"key": f"c{i}", "classification": "business", "confidence": 0.9, "reason": "ok"}
+            for i in (1, 2, 3)
+        ]
+    }
+    svc = DigestService(AsyncMock(), AsyncMock())
+    with (
+        patch(
+            "src.services.digest_service.OpenAIService.complete_json",
+            AsyncMock(return_value=answer),
+        ) as llm,
+        patch.object(DigestService, "_classify_chat", AsyncMock()) as single,
+        patch.object(DigestService, "_send_classification_card", AsyncMock()) as card,
+    ):
+        sent, failed = await svc.classify_and_send_cards(items)
+
+    assert (sent, failed) == (3, 0)
+    llm.assert_awaited_once()
+    single.assert_not_awaited()
+    assert {c.args[0].chat.telegram_id for c in card.await_args_list} == {100, 101, 102}
+
+
+@pytest.mark.asyncio
+async def test_classify_and_send_cards_falls_back_for_missing_keys():
+    items = _classify_items(3)
+    answer = {"results": [{"key": "c2", "classification": "private", "confidence": 0.8}]}
+    svc = DigestService(AsyncMock(), AsyncMock())
+    with (
+        patch(
+            "src.services.digest_service.OpenAIService.complete_json",
+            AsyncMock(return_value=answer),
+        ),
+        patch.object(
+            DigestService,
+            "_classify_chat",
+            AsyncMock(side_effect=[{"classification": "mixed"}, RuntimeError("boom")]),
+        ) as single,
+        patch.object(DigestService, "_send_classification_card", AsyncMock()) as card,
+    ):
+        sent, failed = await svc.classify_and_send_cards(items)
+
+    assert (sent, failed) == (2, 1)
+    assert single.await_count == 2
+    assert card.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_classify_and_send_cards_batch_error_retries_each_chat():
+    items = _classify_items(2)
+    svc = DigestService(AsyncMock(), AsyncMock())
+    with (
+        patch(
+            "src.services.digest_service.OpenAIService.complete_json",
+            AsyncMock(side_effect=RuntimeError("timeout")),
+        ),
+        patch.object(
+            DigestService, "_classify_chat", AsyncMock(return_value={"classification": "business"})
+        ) as single,
+        patch.object(DigestService, "_send_classification_card", AsyncMock()) as card,
+    ):
+        sent, failed = await svc.classify_and_send_cards(items)
+
+    assert (sent, failed) == (2, 0)
+    assert single.await_count == 2
+    assert card.await_count == 2
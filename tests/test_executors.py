@@ -0,0 +1,88 @@
+"""Tests for the thread/process executor layer and its call sites."""
+
+from __future__ import annotations
+
+import threading
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+
+import pytest
+
+from src.handlers.command_handler import _json_dump_to_text, _parse_dump
+from src.services import executors
+from src.services.stats_service import _hourly_text_counters
+
+
+@pytest.fixture(autouse=True)
+def _fresh_pools():
+    yield
+    executors.shutdown_executors()
+
+
+@pytest.mark.asyncio
+async def test_run_in_thread_runs_off_the_loop_thread():
+    main = threading.get_ident()
+    ident = await executors.run_in_thread(threading.get_ident)
+    assert ident != main
+
+
+@pytest.mark.asyncio
+async def test_run_in_process_small_input_stays_on_threads(monkeypatch):
+    monkeypatch.setattr(executors, "_processes", lambda: pytest.fail("process pool used"))
+    out = await executors.run_in_process(_parse_dump, "[1] A: hi", None, size_hint=9)
+    assert out == ["A: hi"]
+
+
+@pytest.mark.asyncio
+async def test_run_in_process_uses_a_worker_process():
+    at = datetime(2026, 5, 10, 9, 15, tzinfo=timezone.utc)
+    rows = [(at, "привет 🙂 мир"), (at, "мир 🙂")]
+    out = await executors.run_in_process(
+        _hourly_text_counters, rows, size_hint=executors.PROCESS_MIN_SIZE
+    )
+    assert out == {at.replace(minute=0): (2, {"🙂": 2}, {"мир": 2, "привет": 1})}
+
+
+@pytest.mark.asyncio
+async def test_run_in_process_falls_back_when_pool_breaks(monkeypatch):
+    class _Broken:
+        def submit(self, *args, **kwargs):
+            raise BrokenProcessPool("worker died")
+
+        def shutdown(self, **kwargs):
+            pass
+
+    monkeypatch.setattr(executors, "_processes", lambda: _Broken())
+    raw = '{"messages": [{"from": "Маша", "text": ["при", {"text": "вет"}]}]}'
+    out = await executors.run_in_process(_json_dump_to_text, raw, owner_name=None, size_hint=None)
+    assert out == "Маша: привет"
+
+
+@pytest.mark.asyncio
+async def test_run_in_process_falls_back_when_workers_cannot_start(monkeypatch):
+    class _NoWorkers:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def submit(self, *args, **kwargs):
+            raise OSError(24, "Too many open files")
+
+        def shutdown(self, **kwargs):
+            pass
+
+    monkeypatch.setattr(executors, "ProcessPoolExecutor", _NoWorkers)
+    out = await executors.run_in_process(_parse_dump, "[1] A: hi", None, size_hint=None)
+    assert out == ["A: hi"]
+    assert executors._process_pool is None  # dropped, recreated on next use
+
+
+@pytest.mark.asyncio
+async def test_run_in_process_runs_unpicklable_call_in_a_thread():
+    main = threading.get_ident()
+
+    def _local():  # local functions can't be pickled for a worker process
+        return threading.get_ident()
+
+    ident = await executors.run_in_process(_local, size_hint=None)
+    assert ident != main
+    assert executors._process_pool is not None  # the pool itself stays up
@@ -0,0 +1,85 @@
+"""Tests for the micro-batched message analyzer."""
+
+from __future__ import annotations
+
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+
+from src.services import message_analysis
+from src.services.message_analysis import MessageAnalysisBatcher, analyze_batch
+
+
+@pytest.fixture
+def fake_batch(monkeypatch):
+    calls = []
+
+    async def fake(texts):
+        calls.append(list(texts))
+        return [([t], len(t) / 10) for t in texts]
+
+    monkeypatch.setattr(message_analysis, "analyze_batch", fake)
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_messages_in_one_window_share_a_request(fake_batch):
+    batcher = MessageAnalysisBatcher(window=0.01, max_messages=20)
+
+    results = await asyncio.gather(
+        batcher.analyze("chat", "a"),
+        batcher.analyze("chat", "bbb"),
+        batcher.analyze("other", "cc"),
+    )
+
+    assert results == [(["a"], 0.1), (["bbb"], 0.3), (["cc"], 0.2)]
+    assert sorted(fake_batch) == [["a", "bbb"], ["cc"]]  # one request per chat
+    assert (batcher.requests, batcher.messages) == (2, 3)
+
+
+@pytest.mark.asyncio
+async def test_full_batch_flushes_without_waiting_for_the_window(fake_batch):
+    batcher = MessageAnalysisBatcher(window=60, max_messages=2)
+
+    results = await asyncio.wait_for(
+        asyncio.gather(batcher.analyze(1, "x"), batcher.analyze(1, "yy")), timeout=1
+    )
+
+    assert results == [(["x"], 0.1), (["yy"], 0.2)]
+    assert fake_batch == [["x", "yy"]]
+
+
+@pytest.mark.asyncio
+async def test_failed_request_reaches_every_caller(monkeypatch):
+    monkeypatch.setattr(
+        message_analysis, "analyze_batch", AsyncMock(side_effect=RuntimeError("down"))
+    )
+    batcher = MessageAnalysisBatcher(window=0.01)
+
+    results = await asyncio.gather(
+        batcher.analyze(1, "a"), batcher.analyze(1, "b"), return_exceptions=True
+    )
+
+    assert [type(r) for r in results] == [RuntimeError, RuntimeError]
+
+
+@pytest.mark.asyncio
+async def test_analyze_batch_routes_results_by_key(monkeypatch):
+    complete_json = AsyncMock(
+        return_value={
+            "results": [
+                {"key": "m2", "tags": ["#deadline", " "], "importance": 1.4},
+                {"key": "m1", "tags": ["chat"], "importance": "0.4"},
+                {"key": "m9", "tags": ["stray"], "importance": 0.9},
+            ]
+        }
+    )
+    monkeypatch.setattr(message_analysis.OpenAIService, "complete_json", complete_json)
+
+    out = await analyze_batch(["привет", "сдаём отчёт завтра?", "🙂"])
+
+    assert out == [(["chat"], 0.4), (["deadline"], 1.0), ([], 0.5)]
+    rendered = complete_json.await_args.args[1]
+    assert "[m1] привет" in rendered and "[m3] 🙂" in rendered
+    assert "3 recent messages" in rendered
@@ -0,0 +1,109 @@
+"""Tests for the rate-aware Telegram outbox (digest / cards / listings)."""
+
+from __future__ import annotations
+
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+
+from src.services.outbox_service import Outbox, TokenBucket, outbox_for
+
+
+def _retry_after(seconds: int) -> TelegramRetryAfter:
+    return TelegramRetryAfter(method=MagicMock(), message="flood", retry_after=seconds)
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    sleeps: list[float] = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+
+    monkeypatch.setattr("src.services.outbox_service.asyncio.sleep", fake_sleep)
+    return sleeps
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_waits_when_empty(monkeypatch):
+    now = [0.0]
+    sleeps: list[float] = []
+
+    async def advancing_sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    monkeypatch.setattr("src.services.outbox_service.asyncio.sleep", advancing_sleep)
+    bucket = TokenBucket(rate=2.0, capacity=1, clock=lambda: now[0])
+
+    await bucket.acquire()
+    assert sleeps == []
+
+    # Bucket is empty: the next acquire must sleep ~1/rate before succeeding.
+    await bucket.acquire()
+    assert sleeps == [pytest.approx(0.5)]
+
+
+@pytest.mark.asyncio
+async def test_send_sleeps_on_retry_after_then_delivers(no_sleep):
+    bot = AsyncMock()
+    sent = MagicMock()
+    bot.send_message = AsyncMock(side_effect=[_retry_after(7), sent])
+    outbox = Outbox(bot)
+
+    result = await outbox.send(1, "hello")
+
+    assert result is sent
+    assert 7 in no_sleep
+    assert outbox.metrics.retry_after_sleeps == 1
+    assert outbox.metrics.sent == 1
+    assert outbox.metrics.queue_depth == 0
+
+
+@pytest.mark.asyncio
+async def test_send_gives_up_after_max_retry_after(no_sleep):
+    bot = AsyncMock()
+    bot.send_message = AsyncMock(side_effect=_retry_after(1))
+    outbox = Outbox(bot, max_retry_after=2)
+
+    assert await outbox.send(1, "hello") is None
+    assert bot.send_message.await_count == 3
+    assert outbox.metrics.failed == 1
+
+
+@pytest.mark.asyncio
+async def test_send_falls_back_to_plain_text_on_bad_markdown(no_sleep):
+    bot = AsyncMock()
+    bot.send_message = AsyncMock(
+        side_effect=[TelegramBadRequest(method=MagicMock(), message="can't parse"), MagicMock()]
+    )
+    outbox = Outbox(bot)
+
+    await outbox.send(1, "*bold", parse_mode="MarkdownV2", plain_text="bold", reply_markup="kb")
+
+    second = bot.send_message.await_args_list[1]
+    assert second.args == (1, "bold")
+    assert second.kwargs["parse_mode"] is None
+    assert second.kwargs["reply_markup"] == "kb"
+    assert outbox.metrics.plain_fallbacks == 1
+
+
+@pytest.mark.asyncio
+async def test_send_md_keeps_going_after_a_failed_chunk(no_sleep):
+    bot = AsyncMock()
+    bot.send_message = AsyncMock(side_effect=[RuntimeError("boom"), MagicMock()])
+    outbox = Outbox(bot)
+
+    delivered = await outbox.send_md(1, "a" * 30 + "\n\n" + "b" * 30, limit=40)
+
+    assert delivered == 1
+    assert bot.send_message.await_count == 2
+    assert outbox.metrics.failed == 1
+    assert outbox.metrics.snapshot()["sent"] == 1
+
+
+def test_outbox_for_is_shared_per_bot():
+    bot_a, bot_b = AsyncMock(), AsyncMock()
+    assert outbox_for(bot_a) is outbox_for(bot_a)
+    assert outbox_for(bot_a) is not outbox_for(bot_b)
@@ -0,0 +1,380 @@
+"""Tests for the hourly stats rollups and topic cache behind ``StatsService``."""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import re
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+from uuid import uuid4
+
+import emoji
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from src.config import settings
+from src.database.models import MessageStats
+from src.services import stats_service
+from src.services.openai_service import OpenAIService
+from src.services.stats_service import (
+    RUSSIAN_STOP_WORDS,
+    TOPICS_MIN_NEW_CHARS,
+    StatsCache,
+    StatsService,
+    _hourly_text_counters,
+    _text_counters,
+    _topics_sample,
+    _week_from_rollups,
+)
+
+NOW = datetime(2026, 5, 10, 12, 30, tzinfo=timezone.utc)
+
+
+def _rollup(row: dict) -> SimpleNamespace:
+    return SimpleNamespace(**row)
+
+
+class _Stream:
+    def __init__(self, rows):
+        self._rows = rows
+
+    async def partitions(self):
+        for i in range(0, len(self._rows), 2):
+            yield self._rows[i : i + 2]
+
+
+async def _refresh(rows) -> tuple[list[dict], list]:
+    """Run ``_refresh_rollups`` over ``(user_id, text, created_at)`` rows.
+
+    The session fakes what Postgres would return for the hourly GROUP BY
+    and the text stream; returns the upserted rollups and the statements.
+    """
+    by_hour: dict = {}
+    for user_id, text, created_at in rows:
+        agg = by_hour.setdefault(
+            created_at.replace(minute=0, second=0, microsecond=0),
+            {"message_count": 0, "total_length": 0, "user_ids": set()},
+        )
+        agg["message_count"] += 1
+        agg["total_length"] += len(text or "")
+        agg["user_ids"].add(user_id)
+    aggregated = MagicMock()
+    aggregated.all.return_value = [
+        SimpleNamespace(hour_start=hour, **{**agg, "user_ids": list(agg["user_ids"])})
+        for hour, agg in by_hour.items()
+    ]
+
+    session = AsyncMock()
+    session.scalar = AsyncMock(return_value=None)
+    session.execute = AsyncMock(side_effect=[aggregated, MagicMock()])
+    session.stream = AsyncMock(
+        return_value=_Stream([(created_at, text) for _, text, created_at in rows if text])
+    )
+
+    written = await StatsService()._refresh_rollups(uuid4(), session, now=NOW)
+
+    statements = [call.args[0] for call in session.execute.await_args_list]
+    upsert = statements[-1].compile(dialect=postgresql.dialect())
+    rollups = [
+        {
+            col: upsert.params[f"{col}_m{i}"]
+            for col in ("hour_start", "message_count", "total_length", "user_ids")
+            + ("emoji_count", "emojis", "words")
+        }
+        for i in range(written)
+    ]
+    return rollups, statements
+
+
+@pytest.mark.asyncio
+async def test_refresh_rollups_aggregates_in_sql_and_tokenises_texts():
+    rows = [
+        (1, "привет мир 🙂", NOW.replace(hour=9, minute=5)),
+        (2, "мир", NOW.replace(hour=9, minute=55)),
+        (1, None, NOW.replace(hour=9, minute=59)),
+        (3, "кот 🐱🐱", NOW.replace(hour=10, minute=0)),
+    ]
+
+    hours, statements = await _refresh(rows)
+
+    aggregate_sql = str(statements[0].compile(dialect=postgresql.dialect())).lower()
+    assert "date_trunc" in aggregate_sql and "group by" in aggregate_sql
+    assert "count(*)" in aggregate_sql and "jsonb_agg(distinct" in aggregate_sql
+    assert "on conflict" in str(statements[1].compile(dialect=postgresql.dialect())).lower()
+
+    assert [h["hour_start"] for h in hours] == [
+        NOW.replace(hour=9, minute=0),
+        NOW.replace(hour=10, minute=0),
+    ]
+    nine, ten = hours
+    assert nine["message_count"] == 3
+    assert nine["total_length"] == len("привет мир 🙂") + len("мир")
+    assert nine["user_ids"] == [1, 2]
+    assert nine["emoji_count"] == 1 and nine["emojis"] == {"🙂": 1}
+    assert nine["words"] == {"мир": 2, "привет": 1}
+    assert ten["emojis"] == {"🐱": 2} and ten["user_ids"] == [3]
+
+
+@pytest.mark.asyncio
+async def test_week_from_rollups_matches_a_direct_scan():
+    rows = [
+        (1, "привет мир", NOW - timedelta(days=2, hours=1)),
+        (2, "мир 🙂", NOW - timedelta(days=2, minutes=50)),
+        (1, "мир кот", NOW - timedelta(hours=3)),
+        (3, "🙂🙂", NOW - timedelta(minutes=10)),
+    ]
+
+    hours, _ = await _refresh(rows)
+    week = _week_from_rollups([_rollup(h) for h in hours], NOW)
+
+    texts = [text for _, text, _ in rows]
+    assert week["message_count"] == 4
+    assert week["user_count"] == 3
+    assert week["avg_length"] == sum(map(len, texts)) / 4
+    assert week["emoji_count"] == 3
+    assert week["top_emojis"] == {"🙂": 3}
+    assert week["top_words"] == {"мир": 3, "привет": 1, "кот": 1}
+    assert week["most_active_hour"] == (NOW - timedelta(days=2, hours=1)).hour
+    assert week["most_active_day"] == (NOW - timedelta(days=2)).strftime("%A")
+    trend = {p["date"]: p["count"] for p in week["activity_trend"]}
+    assert len(trend) == 7
+    assert trend[NOW.strftime("%Y-%m-%d")] == 2
+    assert trend[(NOW - timedelta(days=2)).strftime("%Y-%m-%d")] == 2
+
+
+def test_week_from_rollups_empty():
+    week = _week_from_rollups([], NOW)
+    assert week["message_count"] == 0 and week["avg_length"] == 0.0
+    assert week["most_active_hour"] is None and week["most_active_day"] is None
+
+
+def test_topics_sample_caps_input_and_is_deterministic():
+    texts = [f"сообщение номер {i} " + "х" * 80 for i in range(1000)]
+
+    sample = _topics_sample(texts, max_chars=5000, message_chars=60)
+
+    assert sum(len(t) + 1 for t in sample) <= 5000
+    assert all(len(t) <= 60 for t in sample)
+    assert sample[0].startswith("сообщение номер 0 ")
+    # Spread over the whole week, not just its head.
+    assert any(t.startswith("сообщение номер 9") and len(t.split()[2]) == 3 for t in sample)
+    assert sample == _topics_sample(texts, max_chars=5000, message_chars=60)
+    assert _topics_sample(["a", "b"]) == ["a", "b"]
+
+
+def _topics_session(*, new_chars: int, texts: list[str]) -> AsyncMock:
+    session = AsyncMock()
+    session.scalar = AsyncMock(return_value=new_chars)
+    result = MagicMock()
+    result.scalars.return_value.all.return_value = texts
+    session.execute = AsyncMock(return_value=result)
+    return session
+
+
+@pytest.mark.asyncio
+async def test_week_topics_reuses_cache_until_chat_changes(monkeypatch):
+    chat_id = uuid4()
+    analyze = AsyncMock(return_value=[{"topic": "кот", "count": 3}])
+    monkeypatch.setattr(OpenAIService, "analyze_topics", analyze)
+    monkeypatch.setattr(
+        stats_service,
+        "_topics_cache",
+        StatsCache(max_entries=2, ttl=stats_service.TOPICS_MAX_AGE),
+    )
+    svc = StatsService()
+
+    first = await svc._week_topics(chat_id, _topics_session(new_chars=0, texts=["кот"]), now=NOW)
+    assert first == [{"topic": "кот", "count": 3}]
+    assert analyze.await_count == 1
+
+    # Little new text: no query for texts, no LLM call.
+    quiet = _topics_session(new_chars=10, texts=["кот"])
+    later = NOW + timedelta(minutes=5)
+    assert await svc._week_topics(chat_id, quiet, now=later) == first
+    quiet.execute.assert_not_awaited()
+
+    # Past the threshold but identical sampled input: still cached.
+    same = _topics_session(new_chars=TOPICS_MIN_NEW_CHARS, texts=["кот"])
+    assert await svc._week_topics(chat_id, same, now=later) == first
+    assert analyze.await_count == 1
+
+    changed = _topics_session(new_chars=TOPICS_MIN_NEW_CHARS, texts=["кот", "пёс"])
+    await svc._week_topics(chat_id, changed, now=later)
+    assert analyze.await_count == 2
+    analyze.assert_awaited_with(["кот", "пёс"])
+
+
+@pytest.mark.asyncio
+async def test_store_stats_upserts_one_row_per_chat_and_period(monkeypatch):
+    monkeypatch.setattr(settings, "STATS_HISTORY_DAYS", 90)
+    stored = MessageStats(period="week")
+    result = MagicMock()
+    result.scalar_one.return_value = stored
+    session = AsyncMock()
+    session.execute = AsyncMock(return_value=result)
+    values = {**_week_from_rollups([], NOW), "top_topics": [{"topic": "кот", "count": 1}]}
+
+    out = await StatsService()._store_stats(uuid4(), session, values, now=NOW)
+
+    assert out is stored
+    week_stmt, history_stmt = (call.args[0] for call in session.execute.await_args_list)
+    week_sql = str(week_stmt.compile(dialect=postgresql.dialect())).lower()
+    assert "insert into message_stats " in week_sql
+    assert "on conflict (chat_id, period) do update" in week_sql
+    assert "returning" in week_sql
+    history = history_stmt.compile(dialect=postgresql.dialect())
+    assert "on conflict (chat_id, day) do update" in str(history).lower()
+    assert history.params["day"] == NOW.date()
+    assert history.params["top_topics"] == [{"topic": "кот", "count": 1}]
+
+
+def test_message_stats_model_declares_the_upsert_conflict_target():
+    from sqlalchemy.schema import CreateTable
+
+    ddl = str(CreateTable(MessageStats.__table__).compile(dialect=postgresql.dialect()))
+    assert "CONSTRAINT uq_message_stats_chat_period UNIQUE (chat_id, period)" in ddl
+
+
+@pytest.mark.asyncio
+async def test_store_stats_skips_history_when_disabled(monkeypatch):
+    monkeypatch.setattr(settings, "STATS_HISTORY_DAYS", 0)
+    session = AsyncMock()
+    session.execute = AsyncMock(return_value=MagicMock())
+
+    await StatsService()._store_stats(uuid4(), session, _week_from_rollups([], NOW), now=NOW)
+
+    assert session.execute.await_count == 1
+
+
+def _legacy_text_counters(texts):
+    """The two-pass implementation the fused kernel replaced (golden reference)."""
+    emoji_counter, word_counter = Counter(), Counter()
+    for text in texts:
+        emoji_counter.update(c for c in text if emoji.is_emoji(c))
+    for text in texts:
+        word_counter.update(
+            w.lower()
+            for w in re.findall(r"\b\w+\b", text)
+            if w.lower() not in RUSSIAN_STOP_WORDS and len(w) > 1
+        )
+    return sum(emoji_counter.values()), emoji_counter, word_counter
+
+
+def _synthetic_texts(count: int, seed: int) -> list[str]:
+    rnd = random.Random(seed)
+    vocab = ["Привет", "проект", "дедлайн", "ДЕПЛОЙ", "ёлка", "snake_case", "42", "x2", "İstanbul"]
+    vocab += sorted(RUSSIAN_STOP_WORDS)[:20]
+    extras = ["🙂", "👍🏻", "❤️", "ℹ", "ℹℹ", "a©b", "🇷🇺", "#1", "...", "—", "\n"]
+    return [
+        " ".join(
+            rnd.choice(vocab if rnd.random() < 0.8 else extras) for _ in range(rnd.randint(0, 12))
+        )
+        for _ in range(count)
+    ]
+
+
+def test_text_counters_match_the_legacy_implementation():
+    texts = _synthetic_texts(2000, seed=7)
+
+    assert _text_counters(texts) == _legacy_text_counters(texts)
+    for text in texts[:200]:
+        assert _text_counters([text]) == _legacy_text_counters([text])
+
+
+def test_hourly_text_counters_match_per_hour_legacy_counters():
+    texts = _synthetic_texts(500, seed=11)
+    rows = [(NOW - timedelta(minutes=17 * i), text) for i, text in enumerate(texts)]
+
+    out = _hourly_text_counters(rows)
+
+    expected: dict = {}
+    for created_at, text in rows:
+        expected.setdefault(created_at.replace(minute=0, second=0, microsecond=0), []).append(text)
+    assert set(out) == set(expected)
+    for hour, hour_texts in expected.items():
+        total, emojis, words = _legacy_text_counters(hour_texts)
+        assert out[hour] == (total, dict(emojis), dict(words))
+
+
+@pytest.mark.asyncio
+async def test_refresh_dirty_chats_only_touches_dirty_chats(monkeypatch):
+    monkeypatch.setattr(stats_service, "_dirty_chats", set())
+    monkeypatch.setattr(stats_service, "STATS_CONCURRENCY", 2)
+    ok, broken = uuid4(), uuid4()
+    sessions: list = []
+    running = peak = 0
+
+    def fake_async_session():
+        session = AsyncMock()
+        session.__aenter__.return_value = session
+        sessions.append(session)
+        return session
+
+    async def fake_calculate(self, chat_id, session):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0)
+        running -= 1
+        if chat_id == broken:
+            raise RuntimeError("db down")
+
+    monkeypatch.setattr(stats_service, "async_session", fake_async_session)
+    monkeypatch.setattr(StatsService, "_calculate_stats", fake_calculate)
+    svc = StatsService()
+
+    assert await svc.refresh_dirty_chats() == 0  # idle: no sessions, no work
+    assert sessions == []
+
+    stats_service.mark_chat_dirty(ok)
+    stats_service.mark_chat_dirty(broken)
+    for _ in range(3):
+        stats_service.mark_chat_dirty(uuid4())
+
+    assert await svc.refresh_dirty_chats() == 4
+    assert len(sessions) == 5 and peak == 2
+    assert all(session.__aexit__.await_count == 1 for session in sessions)  # closed
+    # The failed chat is retried on the next pass, the rest are clean.
+    assert stats_service.take_dirty_chats() == {broken}
+
+
+def test_stats_cache_is_lru_with_ttl(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(stats_service.time, "monotonic", lambda: clock[0])
+    cache = StatsCache(max_entries=2, ttl=timedelta(minutes=30))
+    a, b, c = uuid4(), uuid4(), uuid4()
+
+    cache.put(a, MessageStats(period="week"))
+    cache.put(b, MessageStats(period="week"))
+    assert cache.get(a) is not None  # ``a`` is now the most recent
+    cache.put(c, MessageStats(period="week"))
+    assert cache.get(b) is None and cache.evictions == 1
+
+    clock[0] += 30 * 60
+    assert cache.get(a) is None and cache.get(c) is None
+    assert cache.snapshot() == {"size": 0, "hits": 1, "misses": 3, "evictions": 1}
+
+
+@pytest.mark.asyncio
+async def test_get_stats_reads_what_another_instance_cached(monkeypatch):
+    monkeypatch.setattr(
+        stats_service,
+        "stats_cache",
+        StatsCache(max_entries=8, ttl=stats_service.STATS_CACHE_TTL),
+    )
+    chat_id = uuid4()
+    stored = MessageStats(chat_id=chat_id, period="week")
+    monkeypatch.setattr(StatsService, "_store_stats", AsyncMock(return_value=stored))
+    empty = MagicMock()
+    empty.scalars.return_value.all.return_value = []
+    writer = AsyncMock()
+    writer.scalar = AsyncMock(return_value=None)
+    writer.execute = AsyncMock(return_value=empty)
+    await StatsService()._calculate_stats(chat_id, writer)  # the periodic job
+
+    reader = AsyncMock()
+    assert await StatsService().get_stats(chat_id, reader) is stored  # ``/status``
+    reader.execute.assert_not_awaited()
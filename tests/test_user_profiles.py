@@ -0,0 +1,123 @@
+"""Tests for the participant-name cache used by chat summaries."""
+
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from src.database.models import UserProfile
+from src.services import user_profiles
+from src.services.user_profiles import (
+    display_name,
+    mark_user_written,
+    remember_user,
+    resolve_user_names,
+)
+
+
+@pytest.fixture(autouse=True)
+def _fresh_memo(monkeypatch):
+    monkeypatch.setattr(user_profiles, "_recent_writes", {})
+
+
+def _user(user_id, first="Маша", last=None, username=None):
+    return SimpleNamespace(id=user_id, first_name=first, last_name=last, username=username)
+
+
+def _session(profiles):
+    result = MagicMock()
+    result.scalars.return_value.all.return_value = profiles
+    session = AsyncMock()
+    session.execute = AsyncMock(return_value=result)
+    return session
+
+
+def test_display_name_fallbacks():
+    assert display_name(1, "Маша", "Петрова") == "Маша Петрова"
+    assert display_name(1, None, None, "masha") == "@masha"
+    assert display_name(1, None, None) == "User 1"
+
+
+@pytest.mark.asyncio
+async def test_remember_user_upserts_once_per_interval():
+    session = AsyncMock()
+
+    assert await remember_user(session, -100, _user(7)) is True
+    assert await remember_user(session, -100, _user(7)) is True  # not committed yet
+    mark_user_written(-100, _user(7))
+    assert await remember_user(session, -100, _user(7)) is False  # same name, just written
+    assert await remember_user(session, -100, _user(7, first="Мария")) is True  # renamed
+
+    assert session.execute.await_count == 3
+    sql = str(session.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT (chat_telegram_id, user_id) DO UPDATE" in sql
+    session.commit.assert_not_awaited()  # rides on the caller's transaction
+
+
+@pytest.mark.asyncio
+async def test_resolve_user_names_uses_fresh_rows_without_telegram():
+    profile = UserProfile(chat_telegram_id=-100, user_id=7, first_name="Маша", last_name="П")
+    session = _session([profile])
+    bot = AsyncMock()
+
+    assert await resolve_user_names(session, bot, -100, [7, 7]) == {7: "Маша П"}
+    bot.get_chat_member.assert_not_awaited()
+    sql = str(session.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert "user_profiles.user_id = ANY" in sql and "user_profiles.updated_at >=" in sql
+
+
+@pytest.mark.asyncio
+async def test_resolve_user_names_fetches_misses_concurrently_with_a_cap(monkeypatch):
+    monkeypatch.setattr(user_profiles, "RESOLVE_CONCURRENCY", 3)
+    session = _session([])
+    running = peak = 0
+
+    async def get_chat_member(chat_id, user_id):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0)
+        running -= 1
+        if user_id == 5:
+            raise RuntimeError("user left")
+        return SimpleNamespace(user=_user(user_id, first=f"U{user_id}"))
+
+    bot = SimpleNamespace(get_chat_member=get_chat_member)
+
+    names = await resolve_user_names(session, bot, -100, range(10))
+
+    assert peak == 3
+    assert names[5] == "User 5"
+    assert names[9] == "U9"
+    # One SELECT for the cache, one upsert for the nine fetched profiles.
+    assert session.execute.await_count == 2
+    upsert = session.execute.await_args.args[0]
+    assert len(upsert.compile().params) >= 9 * 6
+    session.commit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_generate_chat_summary_names_authors_from_cache(monkeypatch):
+    from src.database.models import DBMessage
+    from src.services import context_service
+    from src.services.context_service import ContextService
+
+    resolve = AsyncMock(return_value={7: "Маша"})
+    monkeypatch.setattr(context_service, "resolve_user_names", resolve)
+    service = ContextService(AsyncMock())
+    service.openai = AsyncMock()
+    service.openai.chat_completion = AsyncMock(return_value="summary")
+    at = datetime(2026, 5, 10, 9, 0, tzinfo=timezone.utc)
+    messages = [DBMessage(user_id=7, text="привет", created_at=at)]
+
+    bot = object()
+    assert (
+        await service.generate_chat_summary(messages, bot=bot, chat_telegram_id=-100) == "summary"
+    )
+    assert resolve.await_args.args[1:3] == (bot, -100)
+    assert "Маша: привет" in service.openai.chat_completion.await_args.args[0]